@@ -0,0 +1,58 @@
+"""
+Timeline compilation and simulation of French plans on the samples in data/ and synthetic lattices.
+Compile time is excluded, setup parses a plan once, see bench_startup for compile and cache load times.
+Runs with asv or as a script: python benchmarks/bench_frontend.py
+"""
+
+from copy import deepcopy
+from uas import Frontend, Simulator
+from uas.strategy import French
+try:
+    from .common import SHAPES, lattices, run
+except ImportError:
+    # run as a script
+    from common import SHAPES, lattices, run
+
+
+def french_plan(shape: tuple):
+    start, target = lattices(shape)
+    plan, end_state = French(deepcopy(start), target, mode="bucketed").run()
+    return start, plan
+
+
+class FrontendParsePlan:
+    params = SHAPES
+    param_names = ["shape"]
+    timeout = 600
+
+    def setup(self, shape):
+        start, self.plan = french_plan(shape)
+        self.spacing = start.spacing
+        Frontend(spacing=self.spacing, plan=self.plan).parse_plan()
+
+    def time_parse_plan(self, shape):
+        Frontend(spacing=self.spacing, plan=self.plan).parse_plan()
+
+    def peakmem_parse_plan(self, shape):
+        Frontend(spacing=self.spacing, plan=self.plan).parse_plan()
+
+
+class SimulatorParsePlan:
+    params = SHAPES
+    param_names = ["shape"]
+    timeout = 600
+
+    def setup(self, shape):
+        self.start, self.plan = french_plan(shape)
+        Simulator(lattice=deepcopy(self.start), plan=self.plan).parse_plan()
+
+    def time_parse_plan(self, shape):
+        Simulator(lattice=deepcopy(self.start), plan=self.plan).parse_plan()
+
+    def peakmem_parse_plan(self, shape):
+        Simulator(lattice=deepcopy(self.start), plan=self.plan).parse_plan()
+
+
+if __name__ == "__main__":
+    for cls in (FrontendParsePlan, SimulatorParsePlan):
+        run(cls)
@@ -0,0 +1,50 @@
+"""
+Lattice operations.
+Runs with asv or as a script: python benchmarks/bench_lattice.py
+"""
+
+import timeit
+import numpy as np
+from uas import Lattice
+
+
+class InterleavedMoveRead:
+    """
+    Moves single atoms and reads the coordinates in between, as strategies working on the current state do
+    """
+    params = [(100, 100), (200, 200)]
+    param_names = ["shape"]
+    n_moves = 1000
+
+    def setup(self, shape):
+        rng = np.random.default_rng(0)
+        self.array = rng.random(shape) < 0.5
+        empty = np.argwhere(np.logical_not(self.array)).astype(np.int16)
+        occupied = np.argwhere(self.array).astype(np.int16)
+        self.origins = occupied[rng.permutation(len(occupied))[:self.n_moves]]
+        self.targets = empty[rng.permutation(len(empty))[:self.n_moves]]
+        self.lattice = Lattice(np.copy(self.array))
+        self.lattice.coordinates
+
+    def time_incremental(self, shape):
+        lattice = self.lattice
+        for origin, target in zip(self.origins, self.targets):
+            lattice.move(origin, target)
+            lattice.coordinates
+
+    def time_recalculate(self, shape):
+        lattice = self.lattice
+        for origin, target in zip(self.origins, self.targets):
+            lattice.move(origin, target)
+            # previous behaviour: every move invalidates the cache
+            lattice._coordinates_cached = False
+            lattice.coordinates
+
+
+if __name__ == "__main__":
+    for shape in InterleavedMoveRead.params:
+        bench = InterleavedMoveRead()
+        for name in ("time_incremental", "time_recalculate"):
+            bench.setup(shape)
+            t = timeit.timeit(lambda: getattr(bench, name)(shape), number=1)
+            print(f"{shape} {name}: {t * 1e3:.1f}ms for {bench.n_moves} moves")
@@ -0,0 +1,41 @@
+"""
+Repeated image, sort and move cycles with loss of atoms: time per 1000 trials and fill time.
+Runs with asv or as a script: python benchmarks/bench_montecarlo.py
+"""
+
+import numpy as np
+from uas import Lattice, MonteCarlo
+try:
+    from .common import load_states, run
+except ImportError:
+    # run as a script
+    from common import load_states, run
+
+
+class Cycles:
+    """
+    MonteCarlo.run_cycles on lattices loaded with 60%, compile time is excluded
+    """
+    params = [[(20, 20), (50, 50)], [1., 0.99, 0.95]]
+    param_names = ["shape", "p_move"]
+
+    def setup(self, shape, p_move):
+        self.monte_carlo = MonteCarlo(Lattice(load_states(shape)[1]))
+        self.monte_carlo.p_move = p_move
+        self.monte_carlo.run_cycles(n_trials=16, p_loading=0.6, seed=0)
+
+    def time_run_cycles(self, shape, p_move):
+        self.monte_carlo.run_cycles(n_trials=1000, p_loading=0.6, seed=0)
+
+    def track_median_fill_time(self, shape, p_move):
+        """[µs]"""
+        result = self.monte_carlo.run_cycles(n_trials=1000, p_loading=0.6, seed=0)
+        return float(np.nanmedian(result["fill-time"]))
+
+    def track_mean_cycles(self, shape, p_move):
+        result = self.monte_carlo.run_cycles(n_trials=1000, p_loading=0.6, seed=0)
+        return float(np.mean(result["cycles"]))
+
+
+if __name__ == "__main__":
+    run(Cycles)
@@ -0,0 +1,104 @@
+"""
+Resampling and rendering of lattices on the samples in data/ and synthetic lattices.
+Runs with asv or as a script: python benchmarks/bench_plot.py
+"""
+
+from copy import deepcopy
+import numpy as np
+from uas.helper.plot import plot_lattice, LatticeRenderer
+try:
+    from .common import SHAPES, lattices, run
+except ImportError:
+    # run as a script
+    from common import SHAPES, lattices, run
+
+
+class Resample:
+    params = SHAPES
+    param_names = ["shape"]
+
+    def setup(self, shape):
+        self.lattice = lattices(shape)[0]
+        # rescaling to 200nm as plot_lattice does
+        self.factor = self.lattice.spacing / np.array((200e-9, 200e-9))
+        deepcopy(self.lattice).resample(self.factor)
+
+    def time_resample(self, shape):
+        deepcopy(self.lattice).resample(self.factor)
+
+    def peakmem_resample(self, shape):
+        deepcopy(self.lattice).resample(self.factor)
+
+
+class Upsample:
+    """
+    100x100 to 2500x2500 sites, integer, non-integer and anisotropic factors
+    """
+    params = [(25., 25.), (24.5, 24.5), (25., 12.5)]
+    param_names = ["factor"]
+
+    def setup(self, factor):
+        self.lattice = lattices((100, 100))[0]
+        self.factor = np.array(factor)
+        self.out = np.zeros(tuple(np.around(np.array((100, 100)) * self.factor).astype(int)), dtype=bool)
+        deepcopy(self.lattice).resample(self.factor, out=self.out)
+
+    def time_resample(self, factor):
+        deepcopy(self.lattice).resample(self.factor)
+
+    def time_resample_out(self, factor):
+        deepcopy(self.lattice).resample(self.factor, out=self.out)
+
+    def peakmem_resample_out(self, factor):
+        deepcopy(self.lattice).resample(self.factor, out=self.out)
+
+
+class PlotLattice:
+    params = SHAPES
+    param_names = ["shape"]
+    timeout = 600
+
+    def setup(self, shape):
+        self.lattice = lattices(shape)[0]
+        self.image = plot_lattice(deepcopy(self.lattice))
+
+    def time_plot_lattice(self, shape):
+        plot_lattice(deepcopy(self.lattice))
+
+    def time_plot_lattice_reuse(self, shape):
+        plot_lattice(deepcopy(self.lattice), image=self.image)
+
+    def peakmem_plot_lattice(self, shape):
+        plot_lattice(deepcopy(self.lattice))
+
+
+class RenderSingleMove:
+    """
+    Renders consecutive states which differ by one move, as animating a simulation does
+    """
+    params = SHAPES
+    param_names = ["shape"]
+    n_moves = 100
+
+    def setup(self, shape):
+        rng = np.random.default_rng(0)
+        self.lattice = lattices(shape)[0]
+        occupied = np.argwhere(self.lattice.value)
+        empty = np.argwhere(np.logical_not(self.lattice.value))
+        self.origins = occupied[rng.permutation(len(occupied))[:self.n_moves]]
+        self.targets = empty[rng.permutation(len(empty))[:self.n_moves]]
+        self.renderer = LatticeRenderer()
+        self.renderer.render(self.lattice)
+
+    def time_render(self, shape):
+        for origin, target in zip(self.origins, self.targets):
+            self.lattice.move(origin, target)
+            self.renderer.render(self.lattice)
+        # back to the start state
+        for origin, target in zip(self.origins[::-1], self.targets[::-1]):
+            self.lattice.move(target, origin)
+
+
+if __name__ == "__main__":
+    for cls in (Resample, Upsample, PlotLattice, RenderSingleMove):
+        run(cls)
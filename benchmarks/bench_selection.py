@@ -0,0 +1,84 @@
+"""
+Automatic strategy selection: calibration of the cost model and predicted versus actual times.
+Run as a script to fit the coefficients of uas.strategy.auto.DEFAULT_COEFFICIENTS:
+python benchmarks/bench_selection.py
+"""
+
+import math
+import numpy as np
+from uas import Lattice
+from uas.helper import Sample
+from uas.strategy import STRATEGIES
+from uas.strategy.auto import Auto, CostModel
+try:
+    from .common import SHAPES, load_states, run
+except ImportError:
+    # run as a script
+    from common import SHAPES, load_states, run
+
+# packed squares in lattices of twice their number of sites loaded with 60%, see bench_strategy.Scaling
+SIZES = [8, 12, 16, 24, 32, 48, 64]
+# strategies calibrated on the larger lattices
+MAX_SITES = {"hungarian": 100 * 100, "french": 100 * 100}
+
+
+def calibration_samples(seed: int = 0):
+    """
+    :param seed: (int) random seed
+    :return: (list) of (start, target) bool arrays
+    """
+    rng = np.random.default_rng(seed)
+    samples = [load_states(shape) for shape in SHAPES if shape[0] * shape[1] <= 100 * 100]
+    for size in SIZES:
+        shape = math.ceil(math.sqrt(2) * size)
+        sample = Sample((shape, shape))
+        sample.add_rect(origin=((shape - size) // 2, (shape - size) // 2), size=(size, size))
+        samples.append((rng.random((shape, shape)) < 0.6, sample.value))
+    return samples
+
+
+def calibrate(seed: int = 0):
+    """
+    :param seed: (int) random seed
+    :return: (CostModel) fitted to all registered strategies
+    """
+    samples = calibration_samples(seed)
+    model = CostModel()
+    for name in STRATEGIES:
+        model.calibrate([_ for _ in samples if _[0].size <= MAX_SITES.get(name, np.inf)], names=[name])
+    return model
+
+
+class Selection:
+    """
+    Relative error of the predicted completion time and the choice of Auto on fresh loadings
+    """
+    params = [8, 16, 32, 64]
+    param_names = ["size"]
+
+    def setup(self, size):
+        shape = math.ceil(math.sqrt(2) * size)
+        self.start = np.random.default_rng(1).random((shape, shape)) < 0.6
+        sample = Sample((shape, shape))
+        sample.add_rect(origin=((shape - size) // 2, (shape - size) // 2), size=(size, size))
+        self.target = sample.value
+        self.auto = Auto(Lattice(np.copy(self.start)), Lattice(self.target))
+        self.auto.run()
+
+    def time_run(self, size):
+        Auto(Lattice(np.copy(self.start)), Lattice(self.target), monitor=False).run()
+
+    def track_completion_error(self, size):
+        report = self.auto.report
+        return abs(report["predicted-completion-time"] / report["completion-time"] - 1)
+
+
+if __name__ == "__main__":
+    model = calibrate()
+    print("DEFAULT_COEFFICIENTS = {")
+    for name, coefficients in model.coefficients.items():
+        print(f'    "{name}": {{"compute": [{coefficients["compute"][0]:.3g}, {coefficients["compute"][1]:.3g}], '
+              f'"operations": [{", ".join(f"{_:.3g}" for _ in coefficients["operations"])}], '
+              f'"path": [{", ".join(f"{_:.3g}" for _ in coefficients["path"])}]}},')
+    print("}")
+    run(Selection)
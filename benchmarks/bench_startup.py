@@ -0,0 +1,136 @@
+"""
+Startup time of short lived processes: import uas and sort a first 20x20 lattice in a fresh interpreter.
+Compile (empty numba cache) and cache load time (filled cache) of the first call of single components.
+Runs with asv or as a script: python benchmarks/bench_startup.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+SCRIPT = """
+import time
+t_0 = time.perf_counter()
+import numpy as np
+import uas
+t_1 = time.perf_counter()
+from uas import Lattice
+from uas.helper import Sample
+from uas.strategy import French
+start_state = Lattice(np.random.default_rng(0).random((20, 20)) < 0.5)
+sample = Sample((20, 20))
+sample.add_rect(origin=(2, 2), size=(10, 10))
+plan, end_state = French(start=start_state, target=Lattice(sample.value)).run()
+t_2 = time.perf_counter()
+print(t_1 - t_0, t_2 - t_1)
+"""
+
+FIRST_CALL = """
+import time
+from copy import deepcopy
+import numpy as np
+from uas import Lattice, Frontend, Simulator
+from uas.helper import Sample
+from uas.helper.plot import plot_lattice
+from uas.strategy import French
+start_state = Lattice(np.random.default_rng(0).random((20, 20)) < 0.5)
+sample = Sample((20, 20))
+sample.add_rect(origin=(2, 2), size=(10, 10))
+target_state = Lattice(sample.value)
+calls = {{
+    "french": lambda: French(start=deepcopy(start_state), target=target_state).run(),
+    "frontend": lambda: Frontend(spacing=start_state.spacing, plan=plan).parse_plan(),
+    "simulator": lambda: Simulator(lattice=deepcopy(start_state), plan=plan).parse_plan(),
+    "plot": lambda: plot_lattice(deepcopy(start_state)),
+}}
+if "{component}" != "french":
+    plan, end_state = French(start=deepcopy(start_state), target=target_state).run()
+t_0 = time.perf_counter()
+calls["{component}"]()
+t_1 = time.perf_counter()
+calls["{component}"]()
+t_2 = time.perf_counter()
+print(t_1 - t_0, t_2 - t_1)
+"""
+COMPONENTS = ["french", "frontend", "simulator", "plot"]
+
+
+def measure(cache_dir: str):
+    """
+    Runs SCRIPT in a fresh interpreter with the numba cache in cache_dir
+    :param cache_dir: (str) numba cache directory
+    :return: (tuple) import time [s], time of the first sort [s]
+    """
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+    out = subprocess.run([sys.executable, "-c", SCRIPT], env=env, capture_output=True, text=True, check=True)
+    t_import, t_sort = (float(_) for _ in out.stdout.split())
+    return t_import, t_sort
+
+
+def measure_first_call(component: str, cache_dir: str):
+    """
+    Runs FIRST_CALL for a component in a fresh interpreter with the numba cache in cache_dir
+    :param component: (str) one of COMPONENTS
+    :param cache_dir: (str) numba cache directory
+    :return: (tuple) time of the first call [s], time of the second call [s]
+    """
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+    out = subprocess.run([sys.executable, "-c", FIRST_CALL.format(component=component)], env=env,
+                         capture_output=True, text=True, check=True)
+    t_first, t_second = (float(_) for _ in out.stdout.split())
+    return t_first, t_second
+
+
+class Startup:
+    timeout = 600
+    unit = "s"
+
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        # fill the cache
+        measure(self.cache_dir)
+
+    def track_import_cached(self):
+        return measure(self.cache_dir)[0]
+
+    def track_first_sort_cached(self):
+        return measure(self.cache_dir)[1]
+
+    def track_import_compile(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            return measure(cache_dir)[0]
+
+
+class FirstCall:
+    """
+    Extra time of the first call over the steady state second call, with an empty (compile) or filled numba cache.
+    Kernels with explicit signatures compile while importing uas (see Startup), only the rest is compiled here.
+    """
+    params = COMPONENTS
+    param_names = ["component"]
+    timeout = 600
+    unit = "s"
+
+    def setup(self, component):
+        self.cache_dir = tempfile.mkdtemp()
+        measure_first_call(component, self.cache_dir)
+
+    def track_compile(self, component):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            t_first, t_second = measure_first_call(component, cache_dir)
+        return t_first - t_second
+
+    def track_cache_load(self, component):
+        t_first, t_second = measure_first_call(component, self.cache_dir)
+        return t_first - t_second
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ("cold cache", "warm cache"):
+            t_import, t_sort = measure(cache_dir)
+            print(f"{label}: import uas {t_import:.3f}s, first 20x20 French sort {t_sort * 1e3:.1f}ms")
+        for component in COMPONENTS:
+            t_first, t_second = measure_first_call(component, cache_dir)
+            print(f"{component}: first call {t_first * 1e3:.1f}ms (warm cache), steady state {t_second * 1e3:.1f}ms")
@@ -0,0 +1,168 @@
+"""
+Strategies on the samples in data/ and synthetic 200x200 and 500x500 lattices, scaling of French and Tetris to
+packed squares of up to 64x64 sites, repair of a plan after atom loss against a new plan.
+Compile time is excluded, setup runs every strategy once, see bench_startup for compile and cache load times.
+Runs with asv or as a script: python benchmarks/bench_strategy.py
+"""
+
+import math
+import time
+import numpy as np
+from uas import Lattice, Frontend
+from uas.helper import Sample
+from uas.strategy import French, Hungarian, Tetris, Replanner
+try:
+    from .common import SHAPES, MAX_DENSE, lattices, run
+except ImportError:
+    # run as a script
+    from common import SHAPES, MAX_DENSE, lattices, run
+
+
+class FrenchRun:
+    params = [SHAPES, list(French.modes)]
+    param_names = ["shape", "mode"]
+    timeout = 600
+
+    def setup(self, shape, mode):
+        if mode == "dense" and shape[0] * shape[1] > MAX_DENSE:
+            # distance matrix does not fit into memory
+            raise NotImplementedError
+        French(*lattices((10, 10)), mode=mode).run()
+
+    def time_run(self, shape, mode):
+        French(*lattices(shape), mode=mode).run()
+
+    def peakmem_run(self, shape, mode):
+        French(*lattices(shape), mode=mode).run()
+
+
+class CalculateDistances:
+    params = [_ for _ in SHAPES if _[0] * _[1] <= MAX_DENSE]
+    param_names = ["shape"]
+
+    def setup(self, shape):
+        start, target = lattices(shape)
+        self.start_coordinates = start.coordinates
+        self.target_coordinates = target.coordinates
+
+    def time_calculate_distances(self, shape):
+        French.calculate_distances(self.start_coordinates, self.target_coordinates)
+
+    def peakmem_calculate_distances(self, shape):
+        French.calculate_distances(self.start_coordinates, self.target_coordinates)
+
+
+class HungarianRun:
+    params = [_ for _ in SHAPES if _[0] <= 200]
+    param_names = ["shape"]
+    timeout = 600
+
+    def setup(self, shape):
+        Hungarian(*lattices((10, 10))).run()
+
+    def time_run(self, shape):
+        Hungarian(*lattices(shape)).run()
+
+
+class TetrisRun:
+    params = SHAPES
+    param_names = ["shape"]
+
+    def setup(self, shape):
+        Tetris(*lattices((10, 10))).run()
+
+    def time_run(self, shape):
+        Tetris(*lattices(shape)).run()
+
+    def peakmem_run(self, shape):
+        Tetris(*lattices(shape)).run()
+
+
+class Scaling:
+    """
+    Packed square targets in lattices of twice their number of sites as in examples/packed_square_scaling.py,
+    loaded with 60% to be solvable for every size. Compute time of the strategy and assembly time of its plan
+    (Frontend).
+    """
+    params = [[8, 16, 32, 64], ["french", "tetris"]]
+    param_names = ["size", "strategy"]
+    strategies = {"french": lambda start, target: French(start, target, mode="bucketed"), "tetris": Tetris}
+    unit = "µs"
+
+    def setup(self, size, strategy):
+        shape = math.ceil(math.sqrt(2) * size)
+        self.start = np.random.default_rng(0).random((shape, shape)) < 0.6
+        sample = Sample((shape, shape))
+        sample.add_rect(origin=((shape - size) // 2, (shape - size) // 2), size=(size, size))
+        self.target = sample.value
+        self.strategies[strategy](*self.lattices()).run()
+
+    def lattices(self):
+        return Lattice(np.copy(self.start)), Lattice(self.target)
+
+    def time_run(self, size, strategy):
+        self.strategies[strategy](*self.lattices()).run()
+
+    def track_assembly_time(self, size, strategy):
+        start, target = self.lattices()
+        plan, end_state = self.strategies[strategy](start, target).run()
+        return float(Frontend(spacing=start.spacing, plan=plan).parse_plan()[-1, 0])
+
+
+class Deadline:
+    """
+    French.run with a compute budget, gap of the path length to the lower bound and fraction of the budget used
+    """
+    params = [[(100, 100), (200, 200)], [1e-3, 5e-3, 20e-3]]
+    param_names = ["shape", "budget"]
+
+    def setup(self, shape, budget):
+        French(*lattices((10, 10))).run(deadline=time.perf_counter() + budget)
+
+    def track_gap(self, shape, budget):
+        strategy = French(*lattices(shape))
+        strategy.run(deadline=time.perf_counter() + budget)
+        return strategy.report["gap"]
+
+    def track_budget_used(self, shape, budget):
+        strategy = French(*lattices(shape))
+        strategy.run(deadline=time.perf_counter() + budget)
+        return strategy.report["budget-used"]
+
+
+class Replan:
+    """
+    Five atoms are lost halfway through the moves of French: Replanner.repair against French.run on the state
+    """
+    params = [[(100, 100), (200, 200)], list(French.modes)]
+    param_names = ["shape", "mode"]
+
+    def setup(self, shape, mode):
+        if mode == "dense" and shape[0] * shape[1] > MAX_DENSE:
+            raise NotImplementedError
+        strategy = French(*lattices((10, 10)), mode=mode, cache=True)
+        strategy.run()
+        Replanner(strategy).repair(0, lost=np.argwhere(strategy.start_value)[:1])
+        start, self.target = lattices(shape)
+        array = np.copy(start.value)
+        self.strategy = French(start, self.target, mode=mode, cache=True)
+        plan, _ = self.strategy.run()
+        self.progress = self.strategy.report["site-moves"] // 2
+        for move in plan[:self.progress]:
+            array[tuple(move.origin)] = 0
+            array[tuple(move.target)] = 1
+        atoms = np.argwhere(array)
+        self.lost = atoms[np.random.default_rng(0).choice(len(atoms), 5, replace=False)]
+        array[self.lost[:, 0], self.lost[:, 1]] = 0
+        self.state = array
+
+    def time_repair(self, shape, mode):
+        Replanner(self.strategy).repair(self.progress, lost=self.lost)
+
+    def time_run(self, shape, mode):
+        French(Lattice(np.copy(self.state)), self.target, mode=mode).run()
+
+
+if __name__ == "__main__":
+    for cls in (FrenchRun, CalculateDistances, HungarianRun, TetrisRun, Scaling, Deadline, Replan):
+        run(cls)
@@ -0,0 +1,76 @@
+"""
+Shared states and a small runner to use the asv benchmark classes as plain scripts
+"""
+
+import itertools
+import os
+import timeit
+import tracemalloc
+import numpy as np
+from uas import Lattice
+from uas.helper import Sample
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+# shapes of the samples in data/ and synthetic lattices
+SHAPES = [(10, 10), (15, 15), (20, 20), (100, 100), (200, 200), (500, 500)]
+# largest lattice the dense French mode (full distance matrix) is benchmarked on
+MAX_DENSE = 100 * 100
+
+
+def load_states(shape: tuple):
+    """
+    Start state from data/ if there is a sample of this shape, a random half filled lattice otherwise,
+    target state is a centered square with 36% of the sites
+    :param shape: (tuple) lattice shape
+    :return: (tuple) start array, target array
+    """
+    path = os.path.join(DATA_DIR, f"sample_{shape[0]}_{shape[1]}.npy")
+    if os.path.exists(path):
+        start = np.load(path).astype(bool)
+    else:
+        start = np.random.default_rng(0).random(shape) < 0.5
+    size = (int(shape[0] * 0.6), int(shape[1] * 0.6))
+    sample = Sample(shape)
+    sample.add_rect(origin=((shape[0] - size[0]) // 2, (shape[1] - size[1]) // 2), size=size)
+    return start, sample.value
+
+
+def lattices(shape: tuple):
+    """
+    :param shape: (tuple) lattice shape
+    :return: (tuple) fresh start and target Lattice
+    """
+    start, target = load_states(shape)
+    return Lattice(np.copy(start)), Lattice(target)
+
+
+def run(cls):
+    """
+    Runs all time_, peakmem_ and track_ benchmarks of an asv benchmark class for all parameters and prints the results
+    :param cls: benchmark class
+    :return:
+    """
+    params = getattr(cls, "params", [()])
+    if not getattr(cls, "param_names", []) or len(cls.param_names) == 1:
+        params = [params]
+    methods = [name for name in dir(cls) if name.startswith(("time_", "peakmem_", "track_"))]
+    for combination in itertools.product(*params):
+        bench = cls()
+        try:
+            bench.setup(*combination)
+        except NotImplementedError:
+            continue
+        for name in methods:
+            method = getattr(bench, name)
+            if name.startswith("time_"):
+                number = getattr(cls, "number", 0) or 1
+                t = min(timeit.repeat(lambda: method(*combination), number=number, repeat=3)) / number
+                print(f"{cls.__name__}.{name}{combination}: {t * 1e3:.2f}ms")
+            elif name.startswith("track_"):
+                print(f"{cls.__name__}.{name}{combination}: {method(*combination):.6g}{getattr(cls, 'unit', '')}")
+            else:
+                tracemalloc.start()
+                method(*combination)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{cls.__name__}.{name}{combination}: {peak / 2 ** 20:.1f}MiB (traced)")
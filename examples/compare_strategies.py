@@ -0,0 +1,43 @@
+"""
+This short example sorts the same random loadings with French (greedy) and Hungarian (minimal total distance)
+and reports the saved path length and completion time
+"""
+
+import math
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, Frontend
+from uas.helper import Sample
+from uas.strategy import French, Hungarian
+
+
+p_loading = 0.5
+n_runs = 10
+shapes = [10, 20, 30, 50]
+
+for shape_target in shapes:
+    shape_sample = math.ceil(1 / math.sqrt(p_loading) * shape_target)
+    target_sample = Sample(shape=(shape_sample, shape_sample))
+    target_sample.add_rect(origin=(2, 2), size=(shape_target, shape_target))
+    target_state = Lattice(target_sample.value)
+    out = []
+    for i in range(n_runs):
+        start_sample = Sample(shape=target_state.value.shape)
+        start_sample.add_random(probability=p_loading)
+        start_state = Lattice(start_sample.value)
+        result = []
+        for strategy in (French, Hungarian):
+            try:
+                strat = strategy(start=deepcopy(start_state), target=target_state)
+                plan, end_state = strat.run()
+            except AssertionError:
+                break
+            timeline = Frontend(plan=plan, spacing=start_state.spacing).parse_plan()
+            result.extend([strat.report["path-length"], timeline[-1][0]])
+        if len(result) == 4:
+            out.append(result)
+    out = np.array(out)
+    saved_length = 1 - out[:, 2] / out[:, 0]
+    saved_time = out[:, 1] - out[:, 3]
+    print(f"{shape_target}x{shape_target}: path length saved {100 * np.mean(saved_length):.2f}%, "
+          f"completion time saved {np.mean(saved_time):.3g}µs ({len(out)} runs)")
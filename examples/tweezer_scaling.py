@@ -0,0 +1,37 @@
+"""
+This short example estimates how the completion time of packed square targets scales with the number of tweezers
+"""
+
+import math
+import numpy as np
+from uas import Lattice, Scheduler
+from uas.helper import Sample
+from uas.strategy import French
+
+
+p_loading = 0.5
+n_runs = 5
+shapes = [10, 20, 30]
+tweezers = [1, 2, 4, 8, 16]
+# spacing in m, i.e. 5µm between sites as the Lattice default
+spacing = np.array([5e-6, 5e-6], dtype=np.float32)
+
+for shape_target in shapes:
+    shape_sample = math.ceil(1 / math.sqrt(p_loading) * shape_target)
+    target_sample = Sample(shape=(shape_sample, shape_sample))
+    target_sample.add_rect(origin=(2, 2), size=(shape_target, shape_target))
+    target_state = Lattice(target_sample.value)
+    completion_time = np.full((n_runs, len(tweezers)), np.nan)
+    for i in range(n_runs):
+        start_sample = Sample(shape=target_state.value.shape)
+        start_sample.add_random(probability=p_loading)
+        try:
+            plan, end_state = French(start=Lattice(start_sample.value), target=target_state).run()
+        except AssertionError:
+            continue
+        for j, n_tweezers in enumerate(tweezers):
+            scheduler = Scheduler(spacing=spacing, plan=plan, n_tweezers=n_tweezers)
+            scheduler.parse_plan()
+            completion_time[i, j] = scheduler.completion_time
+    means = np.nanmean(completion_time, axis=0) * 1e-3
+    print(f"{shape_target}x{shape_target}: " + ", ".join(f"{n} tweezers {t:.1f}ms" for n, t in zip(tweezers, means)))
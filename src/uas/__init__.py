@@ -1,4 +1,8 @@
 from .lattice import Lattice
 from .move import Move, Plan
-from .trajectory import Type1, Type2, Discard
+from .trajectory import Type1, Type2, Discard, Route
 from .frontend import Frontend, Simulator
+from .scheduler import Scheduler
+from .montecarlo import MonteCarlo
+from .ordering import MoveOrder
+from .planner import PathPlanner
@@ -2,9 +2,11 @@
 
 """
 
-from copy import deepcopy
 import numpy as np
-from uas import Plan, Type1, Discard, Lattice
+from uas import Plan, Lattice
+from uas.lattice import apply_deltas
+from uas.helper import PackedArray
+from uas.trajectory import compile_timeline, compile_route_timeline, count_timeline_rows, write_timeline, move_ends
 
 
 class Frontend:
@@ -17,54 +19,193 @@ class Frontend:
         self.v_move = 100/1e3  # [µm/µs] 100µm/ms
         self.t_pick = 300  # [µs] 300µs
         self.t_place = 300  # [µs] 300µs
+        self.empty_legs = False  # add the travel of the empty tweezer between moves
         self.timeline = np.ndarray(shape=(2, 2), dtype=np.float32)
 
+    def compile_timeline(self, plan: Plan, t_start: float = 0):
+        """
+        Compiles the timeline of a whole plan at once, see uas.trajectory.compile_timeline
+        :param plan: (Plan)
+        :param t_start: start time
+        :return: (ndarray) timeline
+        """
+        return compile_timeline(plan.origins, plan.targets, plan.discards,
+                                np.asarray(self.spacing, dtype=np.float32), float(t_start),
+                                float(self.t_pick), float(self.t_place / 10), float(self.v_move), self.empty_legs)
+
     def parse_plan(self):
-        timeline = []
-        timer = 0
-        for step in self.plan.moves:
-            if step.discard:
-                trajectory = Discard(origin=step.origin, target=step.target, spacing=self.spacing,
-                                     t_start=timer, t_pick=self.t_pick, t_place=(self.t_place / 10),
-                                     v_move=self.v_move)
-            else:
-                trajectory = Type1(origin=step.origin, target=step.target, spacing=self.spacing,
-                                   t_start=timer, t_pick=self.t_pick, t_place=(self.t_place / 10),
-                                   v_move=self.v_move)
-            timeline.extend(trajectory.timeline)
-            timer = timeline[-1][0]
-        self.timeline = np.array(timeline, dtype=np.float32)
-        return timeline
+        self.timeline = self.compile_timeline(self.plan)
+        return self.timeline
+
+    def stream(self, moves=None, chunk_size: int = 4096, batch_size: int = 64):
+        """
+        Compiles the timeline while moves arrive, e.g. from French.iter_moves, and yields it in chunks.
+        The concatenated chunks equal the timeline of the whole plan.
+        :param moves: (iterable) of Move, the plan if None
+        :param chunk_size: (int) rows per chunk, only the last chunk may be shorter
+        :param batch_size: (int) moves compiled at once
+        :return: (generator) of (ndarray) (rows, 4) float32 timeline chunks
+        """
+        spacing = np.asarray(self.spacing, dtype=np.float32)
+        timer = 0.
+        previous_end = np.zeros(0, dtype=np.float32)
+        chunk = np.empty((chunk_size, 4), dtype=np.float32)
+        n_rows = 0
+        batch = Plan(capacity=batch_size)
+        moves = iter(self.plan if moves is None else moves)
+        while True:
+            for move in moves:
+                if move.discard:
+                    batch.add_discard(origin=move.origin)
+                else:
+                    batch.add_move(origin=move.origin, target=move.target)
+                if len(batch) == batch_size:
+                    break
+            if not len(batch):
+                break
+            rows = count_timeline_rows(batch.origins, batch.targets, batch.discards, self.empty_legs)
+            timeline = np.zeros((np.sum(rows) + int(self.empty_legs and previous_end.shape[0] > 0), 4),
+                                dtype=np.float32)
+            timer = write_timeline(batch.origins, batch.targets, batch.discards, spacing, timer, float(self.t_pick),
+                                   float(self.t_place / 10), float(self.v_move), self.empty_legs, previous_end,
+                                   timeline)
+            previous_end = move_ends(batch.origins[-1:], batch.targets[-1:], batch.discards[-1:])[0]
+            batch = Plan(capacity=batch_size)
+            # fill fixed size chunks
+            while timeline.shape[0]:
+                n = min(chunk_size - n_rows, timeline.shape[0])
+                chunk[n_rows:n_rows + n] = timeline[:n]
+                n_rows += n
+                timeline = timeline[n:]
+                if n_rows == chunk_size:
+                    yield chunk
+                    chunk = np.empty((chunk_size, 4), dtype=np.float32)
+                    n_rows = 0
+        if n_rows:
+            yield chunk[:n_rows]
+
+
+class History:
+    """
+    States of a simulation, stored as per step deltas (site cleared, site filled) and bit packed keyframes of the full
+    lattice every keyframe_interval steps. States are rebuilt on demand.
+    A state is a dict {"time": completion time of the step, "lattice": Lattice after the step}.
+    """
+    def __init__(self, lattice: Lattice, times: np.ndarray, cleared: np.ndarray, filled: np.ndarray,
+                 keyframe_interval: int = 256):
+        """
+
+        :param lattice: (Lattice) state before the first step, copied
+        :param times: (ndarray) (n, ) completion time of every step
+        :param cleared: (ndarray) (n, 2) site cleared by every step
+        :param filled: (ndarray) (n, 2) site filled by every step, negative for discards
+        :param keyframe_interval: (int) steps between two stored full lattices
+        """
+        self.spacing = lattice.spacing
+        self.times = times
+        self.cleared = cleared
+        self.filled = filled
+        self.keyframe_interval = keyframe_interval
+        # keyframe k holds the lattice before step k * keyframe_interval
+        array = np.copy(lattice.value)
+        self.keyframes = []
+        for start in range(0, max(len(self), 1), keyframe_interval):
+            self.keyframes.append(PackedArray.from_array(array))
+            stop = min(start + keyframe_interval, len(self))
+            apply_deltas(array, cleared[start:stop], filled[start:stop])
+
+    def __len__(self):
+        return self.times.shape[0]
+
+    def __getitem__(self, item: int):
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(f"Step {item} out of range")
+        return {
+            "time": self.times[item],
+            "lattice": Lattice(self.array_at(item), spacing=self.spacing)
+        }
+
+    def __iter__(self):
+        """
+        Replays all states in order. Only one lattice is held, the yielded lattice shares its buffer with the replay
+        and is only valid until the next step.
+        """
+        if not len(self):
+            return
+        array = self.keyframes[0].unpack()
+        for i in range(len(self)):
+            apply_deltas(array, self.cleared[i:i + 1], self.filled[i:i + 1])
+            yield {
+                "time": self.times[i],
+                "lattice": Lattice(array, spacing=self.spacing)
+            }
+
+    def array_at(self, step: int = None):
+        """
+        Rebuilds the occupation after a step from the closest keyframe
+        :param step: (int) step index, negative counts from the end, the state before the first step if None
+        :return: (ndarray) occupation
+        """
+        if step is None:
+            return self.keyframes[0].unpack()
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError(f"Step {step} out of range")
+        keyframe = step // self.keyframe_interval
+        array = self.keyframes[keyframe].unpack()
+        start = keyframe * self.keyframe_interval
+        apply_deltas(array, self.cleared[start:step + 1], self.filled[start:step + 1])
+        return array
 
 
 class Simulator(Frontend):
     """
-    Accepts a plan, simulates the lattice
+    Accepts a plan, simulates the lattice.
+    With a planner every move takes the route planned around the atoms present at its time.
     """
-    def __init__(self, lattice: Lattice, plan: Plan):
+    def __init__(self, lattice: Lattice, plan: Plan, keyframe_interval: int = 256, planner=None):
+        """
+
+        :param lattice: (Lattice) start state
+        :param plan: (Plan)
+        :param keyframe_interval: (int) steps between two stored full lattices, see History
+        :param planner: (PathPlanner) fixed Type1 and Discard trajectories if None
+        """
         super().__init__(plan=plan, spacing=lattice.spacing)
         self.lattice = lattice
-        self.state = []
+        self.keyframe_interval = keyframe_interval
+        self.planner = planner
+        self.state = History(lattice, times=np.zeros(0, dtype=np.float32), cleared=np.zeros((0, 2), dtype=np.int16),
+                             filled=np.zeros((0, 2), dtype=np.int16))
+
+    def compile_routes(self):
+        """
+        Plans the route of every move through the current occupancy, see uas.planner.PathPlanner
+        :return: (tuple) (ndarray) timeline, (ndarray) (n, ) timeline rows of every move
+        """
+        segments, offsets = self.planner.plan_routes(self.lattice.value, self.plan)
+        timeline = compile_route_timeline(segments, offsets, self.plan.origins, self.plan.targets, self.plan.discards,
+                                          np.asarray(self.spacing, dtype=np.float32), 0., float(self.t_pick),
+                                          float(self.t_place / 10), float(self.v_move), self.empty_legs)
+        rows = np.diff(offsets) + 2
+        if self.empty_legs:
+            rows[1:] += 1
+        return timeline, rows
 
     def parse_plan(self):
-        timeline = []
-        timer = 0
-        for step in self.plan.moves:
-            if step.discard:
-                self.lattice.discard(step.origin)
-                trajectory = Discard(origin=step.origin, target=step.target, spacing=self.spacing,
-                                     t_start=timer, t_pick=self.t_pick, t_place=(self.t_place / 10),
-                                     v_move=self.v_move)
-            else:
-                self.lattice.move(step.origin, step.target)
-                trajectory = Type1(origin=step.origin, target=step.target, spacing=self.spacing,
-                                   t_start=timer, t_pick=self.t_pick, t_place=(self.t_place / 10),
-                                   v_move=self.v_move)
-            timeline.extend(trajectory.timeline)
-            timer = timeline[-1][0]
-            self.state.append({
-                "time": timeline[-1][0],
-                "lattice": deepcopy(self.lattice)
-            })
-        self.timeline = np.array(timeline, dtype=np.float32)
-        return timeline
+        if self.planner is None:
+            self.timeline = self.compile_timeline(self.plan)
+            rows = count_timeline_rows(self.plan.origins, self.plan.targets, self.plan.discards, self.empty_legs)
+        else:
+            self.timeline, rows = self.compile_routes()
+        # last row of every move marks its completion
+        step_ends = np.cumsum(rows) - 1
+        filled = np.copy(self.plan.targets)
+        filled[self.plan.discards] = -1
+        self.state = History(self.lattice, times=self.timeline[step_ends, 0], cleared=self.plan.origins,
+                             filled=filled, keyframe_interval=self.keyframe_interval)
+        self.lattice.apply_deltas(self.plan.origins, filled)
+        return self.timeline
@@ -1,6 +1,8 @@
 """
 
 """
-from .builder import Sample, ArrayMixin
+from .builder import Sample, SampleBatch, ArrayMixin, random_streams
+from .bitset import PackedArray
 from .types import *
 from .plot import *
+from .video import export_animation, FFmpegWriter
@@ -0,0 +1,92 @@
+"""
+Bit packed storage of boolean 2d arrays
+"""
+
+import numpy as np
+
+# number of set bits of every byte
+POPCOUNT = np.array([bin(_).count("1") for _ in range(256)], dtype=np.uint8)
+
+
+class PackedArray:
+    """
+    Boolean 2d array packed to bits along rows (np.packbits, big bit order), 8x smaller than a bool array.
+    Padding bits at the end of every row are always zero.
+    """
+
+    def __init__(self, bits: np.ndarray, shape: tuple):
+        """
+
+        :param bits: (ndarray) (n_0, ceil(n_1 / 8)) uint8 packed rows
+        :param shape: (tuple) shape of the unpacked array
+        """
+        self.bits = bits
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray):
+        """
+        :param array: (ndarray) 2d boolean array
+        :return: (PackedArray)
+        """
+        return cls(np.packbits(np.asarray(array, dtype=bool), axis=1), array.shape)
+
+    def __eq__(self, other):
+        return self.shape == other.shape and np.array_equal(self.bits, other.bits)
+
+    def __and__(self, other):
+        return PackedArray(np.bitwise_and(self.bits, other.bits), self.shape)
+
+    def __or__(self, other):
+        return PackedArray(np.bitwise_or(self.bits, other.bits), self.shape)
+
+    def andnot(self, other):
+        """
+        :param other: (PackedArray)
+        :return: (PackedArray) self AND NOT other
+        """
+        return PackedArray(np.bitwise_and(self.bits, np.invert(other.bits)), self.shape)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def copy(self):
+        return PackedArray(np.copy(self.bits), self.shape)
+
+    def unpack(self):
+        """
+        :return: (ndarray) boolean array
+        """
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]).astype(bool)
+
+    def count(self):
+        """
+        :return: (int) number of set sites
+        """
+        return int(np.sum(POPCOUNT[self.bits], dtype=np.int64))
+
+    def coordinates(self):
+        """
+        Coordinates of set sites in row major order, only non zero bytes are unpacked
+        :return: (ndarray) (n, 2) int16 coordinates
+        """
+        rows, columns = np.nonzero(self.bits)
+        bits = np.unpackbits(self.bits[rows, columns][:, np.newaxis], axis=1)
+        index, bit = np.nonzero(bits)
+        return np.stack((rows[index], columns[index] * 8 + bit), axis=1).astype(np.int16)
+
+    def set(self, sites: np.ndarray, value: bool):
+        """
+        Sets or clears sites
+        :param sites: (ndarray) (2, ) coordinate or (n, 2) coordinates
+        :param value: (bool)
+        :return:
+        """
+        sites = np.asarray(sites).reshape(-1, 2)
+        rows, columns = sites[:, 0], sites[:, 1]
+        masks = (0x80 >> (columns & 7)).astype(np.uint8)
+        if value:
+            np.bitwise_or.at(self.bits, (rows, columns >> 3), masks)
+        else:
+            np.bitwise_and.at(self.bits, (rows, columns >> 3), np.invert(masks))
@@ -4,6 +4,7 @@ Build a numpy grid with sample configurations
 
 import numpy as np
 from skimage.draw import disk
+from .bitset import PackedArray
 
 
 def generate_mask_box(origin, size, shape):
@@ -43,8 +44,11 @@ def generate_mask_box(origin, size, shape):
 
 class ArrayMixin:
     """
-    Enables to use == on Sample and Lattice
+    Enables to use == on Sample and Lattice.
+    Optionally stores the array bit packed, value then returns a read only unpacked copy.
     """
+    _bits = None
+
     def __eq__(self, other):
         from numpy import array_equal
         result = array_equal(self.value, other.value)
@@ -55,15 +59,80 @@ class ArrayMixin:
         """
         :return: (ndarray) returns the array
         """
+        if self._bits is not None:
+            return self._unpacked()
+        return self._array
+
+    @property
+    def packed(self):
+        """
+        :return: (bool) True if the array is stored bit packed
+        """
+        return self._bits is not None
+
+    def _unpacked(self):
+        array = self._bits.unpack()
+        array.flags.writeable = False
+        return array
+
+    def _mutable(self):
+        """
+        :return: (ndarray) the array to be changed in place, packed storage is unpacked
+        """
+        if self._bits is not None:
+            self.unpack()
         return self._array
 
+    def pack(self):
+        """
+        Stores the array bit packed
+        :return:
+        """
+        if self._bits is None:
+            self._bits = PackedArray.from_array(self.value)
+            self._array = None
+
+    def unpack(self):
+        """
+        Stores the array as bool array
+        :return:
+        """
+        if self._bits is not None:
+            self._array = self._bits.unpack()
+            self._bits = None
+
+    def count(self):
+        """
+        :return: (int) number of occupied sites, popcount if packed
+        """
+        if self._bits is not None:
+            return self._bits.count()
+        return int(np.count_nonzero(self.value))
+
+
+def random_streams(seed: int = None, n_streams: int = 1):
+    """
+    Independent random generators for parallel work, reproducible for a given seed
+    :param seed: (int) seed of all streams, fresh entropy if None
+    :param n_streams: (int) number of streams
+    :return: (list) of np.random.Generator
+    """
+    return [np.random.default_rng(stream) for stream in np.random.SeedSequence(seed).spawn(n_streams)]
+
 
 class Sample(ArrayMixin):
-    def __init__(self, shape: tuple = (100, 100)):
+    """
+    Packed samples (see pack) are unpacked again by the add_* methods.
+    Random loading draws from its own generator, seeded by rng.
+    """
+    def __init__(self, shape: tuple = (100, 100), rng: (int or np.random.Generator) = None):
         """
         :param shape: list as used in numpy
+        :param rng: (int, SeedSequence or Generator) seed or generator for add_random, fresh entropy if None
         """
         self._array = np.zeros(shape, dtype=bool)
+        self._shape = tuple(shape)
+        self.rng = np.random.default_rng(rng)
 
     @property
     def shape(self):
@@ -71,7 +140,14 @@ class Sample(ArrayMixin):
 
         :return: (list) shape
         """
-        return self._array.shape
+        return self._shape
+
+    @property
+    def site_shape(self):
+        """
+        :return: (tuple) shape of the lattice, the last two axes
+        """
+        return self._shape[-2:]
 
     def add_position(self, positions: tuple = ((10, 20), (50, 50))):
         """
@@ -79,17 +155,20 @@ class Sample(ArrayMixin):
         :param positions: list of sites
         :return:
         """
-        for p in positions:
-            self._array[tuple(p)] = 1
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        self._mutable()[..., positions[:, 0], positions[:, 1]] = 1
 
     def add_rect(self, origin: tuple = (20, 20), size: tuple = (10, 10)):
         """
 
         :param origin: (list) origin coordinate
-        :param size: (list) size
+        :param size: (list) size, clipped at the borders
         :return:
         """
-        self._array += generate_mask_box(origin=origin, size=size, shape=self.shape).astype(bool)
+        (x, y), (size_x, size_y) = [int(_) for _ in origin], [int(_) for _ in size]
+        x_high, y_high = x + size_x, y + size_y
+        if x_high > 0 and y_high > 0:
+            self._mutable()[..., max(x, 0):x_high, max(y, 0):y_high] = 1
 
     def add_disk(self, origin: tuple = (20, 20), radius: float = 10):
         """
@@ -98,7 +177,8 @@ class Sample(ArrayMixin):
         :param radius: (int) radius
         :return:
         """
-        self._array += disk(center=origin, radius=radius, shape=self.shape)
+        rows, columns = disk(center=origin, radius=radius, shape=self.site_shape)
+        self._mutable()[..., rows, columns] = 1
 
     def add_random(self, probability: (float or np.ndarray) = 0.5):
         """
@@ -106,7 +186,42 @@ class Sample(ArrayMixin):
         :param probability: (float of ndarray) probability of loading sites, site selective if ndarray
         :return:
         """
+        array = self._mutable()
         if type(probability) is np.ndarray:
-            assert np.array_equal(probability.shape, self._array.shape), f"Probability shape missmatch:" \
-                                                                         f"{probability.shape}"
-        self._array = np.where(np.random.random(self.shape) < probability, np.ones_like(self._array), self._array)
+            assert probability.shape in (self.site_shape, self.shape), f"Probability shape missmatch:" \
+                                                                        f"{probability.shape}"
+        array |= self.rng.random(self.shape) < probability
+
+
+class SampleBatch(Sample):
+    """
+    Many samples of the same lattice shape in one (k, n_0, n_1) array, e.g. random loadings of a Monte Carlo run.
+    Positions, rects and disks are placed in every sample, random loading is drawn independently per sample.
+    Batches are not bit packed.
+    """
+    def __init__(self, n_samples: int, shape: tuple = (100, 100), rng: (int or np.random.Generator) = None):
+        """
+        :param n_samples: (int) number of samples
+        :param shape: (tuple) lattice shape
+        :param rng: (int, SeedSequence or Generator) seed or generator for add_random, fresh entropy if None
+        """
+        super().__init__(shape=(n_samples, ) + tuple(shape), rng=rng)
+
+    def __len__(self):
+        return self._shape[0]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def pack(self):
+        """
+        Batches are stored as bool array only, the samples of a batch are packed one by one as Sample
+        :return:
+        """
+        raise TypeError("SampleBatch can not be bit packed, pack single samples instead")
+
+    def count(self):
+        """
+        :return: (ndarray) (k, ) number of occupied sites per sample
+        """
+        return np.count_nonzero(self.value, axis=(1, 2))
@@ -2,8 +2,8 @@
 
 """
 import numpy as np
-import matplotlib.pyplot as plt
-from celluloid import Camera
+from numba import njit, types
+from uas.helper.types import type_coordinate_matrix
 # from uas import Lattice
 
 
@@ -15,27 +15,148 @@ def add_gaussian(image, sigma, amplitude, center):
     return image
 
 
-def plot_lattice(lattice):
+def gaussian_kernel(sigma: float, amplitude: float = 1., truncate: float = 4.):
     """
+    Gaussian on the pixels within truncate sigma of its center
+    :param sigma: (float) width in pixels
+    :param amplitude: (float)
+    :param truncate: (float) radius in sigma
+    :return: (ndarray) (2 radius + 1, 2 radius + 1) kernel
+    """
+    radius = int(np.ceil(truncate * sigma))
+    x = np.arange(-radius, radius + 1, dtype=float)
+    profile = np.exp(-x ** 2 / (2 * sigma ** 2))
+    return amplitude * np.outer(profile, profile)
 
-    :param lattice:
+
+@njit(types.void(types.float64[:, :], type_coordinate_matrix, types.float64[:, :], types.float64),
+      fastmath=True, nogil=True, cache=True)
+def stamp_kernel(image, centers, kernel, sign):
+    """
+    Adds the kernel centered at every center pixel, clipped at the image border
+    :param image: (ndarray) changed in place
+    :param centers: (ndarray) (n, 2) pixel coordinates
+    :param kernel: (ndarray) odd sized kernel
+    :param sign: (float) 1 adds, -1 removes stamped kernels
     :return:
     """
-    # rescale to 0.2µm
-    lattice.rescale(np.array((200e-9, 200e-9)))
-    image = np.zeros(lattice.value.shape, dtype=float)
-    for coord in lattice.coordinates:
-        image = add_gaussian(image=image, sigma=2, amplitude=1, center=coord)
+    r_0, r_1 = kernel.shape[0] // 2, kernel.shape[1] // 2
+    n_0, n_1 = image.shape
+    for i in range(centers.shape[0]):
+        c_0, c_1 = centers[i, 0], centers[i, 1]
+        for k_0 in range(max(0, r_0 - c_0), min(kernel.shape[0], n_0 - c_0 + r_0)):
+            for k_1 in range(max(0, r_1 - c_1), min(kernel.shape[1], n_1 - c_1 + r_1)):
+                image[c_0 + k_0 - r_0, c_1 + k_1 - r_1] += sign * kernel[k_0, k_1]
+
+
+class LatticeRenderer:
+    """
+    Renders lattices as Gaussians at a given pixel size without touching the lattice.
+    Pixel coordinates of all sites and the image size are cached per lattice shape and spacing. The image of the last
+    rendered state is kept, rendering a state which differs by a few moves only stamps or removes the changed atoms.
+    """
+
+    def __init__(self, pixel_size: np.ndarray = np.array((200e-9, 200e-9)), sigma: float = 2., amplitude: float = 1.):
+        """
+
+        :param pixel_size: (ndarray) size of a pixel [m]
+        :param sigma: (float) width of the Gaussians in pixels
+        :param amplitude: (float)
+        """
+        self.pixel_size = np.asarray(pixel_size, dtype=float)
+        self.kernel = gaussian_kernel(sigma=sigma, amplitude=amplitude)
+        self.geometries = {}
+        self.image = None
+        self.state = None
+        self.geometry = None
+
+    def get_geometry(self, shape: tuple, spacing: np.ndarray):
+        """
+        Pixel of every site and image size, the same rounding as Lattice.rescale
+        :param shape: (tuple) lattice shape
+        :param spacing: (ndarray) lattice spacing
+        :return: (tuple) (n_0, n_1, 2) pixel coordinates of the sites, image shape
+        """
+        key = (tuple(shape), tuple(np.asarray(spacing).tolist()))
+        if key not in self.geometries:
+            factor = spacing / self.pixel_size
+            pixels = np.empty(tuple(shape) + (2, ), dtype=np.int16)
+            pixels[..., 0] = np.around(np.arange(shape[0])[:, np.newaxis] * factor[0], decimals=0)
+            pixels[..., 1] = np.around(np.arange(shape[1])[np.newaxis, :] * factor[1], decimals=0)
+            image_shape = tuple(np.around(np.array(shape) * factor, decimals=0).astype(np.int64))
+            self.geometries[key] = (pixels, image_shape)
+        return self.geometries[key]
+
+    def render(self, lattice, out: np.ndarray = None):
+        """
+        :param lattice: (Lattice) not changed
+        :param out: (ndarray) receives a copy of the image if given
+        :return: (ndarray) image, the renderer's buffer unless out is given, valid until the next call
+        """
+        value = lattice.value
+        geometry = self.get_geometry(value.shape, lattice.spacing)
+        pixels, image_shape = geometry
+        if self.geometry is not geometry or self.state is None:
+            # full render
+            self.geometry = geometry
+            self.image = np.zeros(image_shape, dtype=float)
+            self.state = np.zeros(value.shape, dtype=bool)
+        added = np.logical_and(value, np.logical_not(self.state))
+        removed = np.logical_and(self.state, np.logical_not(value))
+        if np.count_nonzero(removed) > np.count_nonzero(value):
+            # cheaper to start over than to remove
+            self.image[:] = 0
+            self.state[:] = False
+            added, removed = value, np.zeros_like(value)
+        stamp_kernel(self.image, pixels[removed], self.kernel, -1.)
+        stamp_kernel(self.image, pixels[added], self.kernel, 1.)
+        self.state[:] = value
+        if out is not None:
+            out[:] = self.image
+            return out
+        return self.image
+
+
+_RENDERER = None
+
+
+def plot_lattice(lattice, image: np.ndarray = None, renderer: LatticeRenderer = None):
+    """
+    Renders every atom as Gaussian with a width of 2 pixels at 0.2µm per pixel, the lattice is not changed.
+    Stamps a precomputed kernel truncated at 4 sigma instead of evaluating every Gaussian on the whole image.
+    :param lattice:
+    :param image: (ndarray) output buffer to reuse, allocated if None or of the wrong shape
+    :param renderer: (LatticeRenderer) kernel and pixel geometry to use, only its caches change, a shared renderer
+        with the defaults if None
+    :return: (ndarray) image
+    """
+    global _RENDERER
+    if renderer is None:
+        if _RENDERER is None:
+            _RENDERER = LatticeRenderer()
+        renderer = _RENDERER
+    pixels, image_shape = renderer.get_geometry(lattice.value.shape, lattice.spacing)
+    if image is None or image.shape != image_shape or image.dtype != np.float64:
+        image = np.zeros(image_shape, dtype=float)
+    else:
+        image[:] = 0
+    stamp_kernel(image, pixels[lattice.value], renderer.kernel, 1.)
     return image
 
 
 def animate_timeline(timeline):
+    # pyplot takes long to import, only load it when animating
+    import matplotlib.pyplot as plt
+    from celluloid import Camera
     fig, ax = plt.subplots()
     fig.set_size_inches(10, 10, True)
     camera = Camera(fig)
+    # consecutive states differ by a single move, only the changed atoms are rendered
+    renderer = LatticeRenderer()
     for timestep in timeline:
         print(f"{timestep['time'] * 1e-3:.1f}ms")
-        ax.imshow(plot_lattice(timestep["lattice"]))
+        # imshow keeps a reference to its data, every frame needs its own copy
+        ax.imshow(np.copy(renderer.render(timestep["lattice"])))
         ax.text(0, -0.05, f"{timestep['time'] * 1e-3:.1f}ms", transform=ax.transAxes)
         camera.snap()
     plt.tight_layout()
@@ -0,0 +1,123 @@
+"""
+Export of simulations to videos without matplotlib figures
+"""
+
+import os
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .plot import plot_lattice
+
+
+def frame_steps(times: np.ndarray, frame_interval: float = None):
+    """
+    Steps shown by every frame. With a frame interval the video follows the simulation time: every frame shows the
+    last state completed before its time, the last frame shows the final state.
+    :param times: (ndarray) (n, ) completion time of every step
+    :param frame_interval: (float) simulation time per frame, one frame per step if None
+    :return: (ndarray) step of every frame, -1 for the state before the first step (History.array_at(None))
+    """
+    if frame_interval is None:
+        return np.arange(times.shape[0])
+    if not times.shape[0]:
+        return np.zeros(0, dtype=np.int64)
+    frame_times = np.arange(int(np.ceil(times[-1] / frame_interval)) + 1) * frame_interval
+    return np.searchsorted(times, frame_times, side="right") - 1
+
+
+def colormap(name: str = "viridis"):
+    """
+    :param name: (str) matplotlib colormap
+    :return: (ndarray) (256, 3) uint8 lookup table
+    """
+    import matplotlib
+    return (matplotlib.colormaps[name](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+
+def render_frame(history, step: int, lut: np.ndarray, v_max: float = 1.):
+    """
+    Renders the state after a step as RGB image, padded to even size as video encoders require
+    :param history: (History) see uas.frontend.History
+    :param step: (int) step, see History.array_at, the state before the first step if None
+    :param lut: (ndarray) (256, 3) colormap
+    :param v_max: (float) intensity mapped to the last color
+    :return: (ndarray) (h, w, 3) uint8 frame
+    """
+    from uas import Lattice
+    image = plot_lattice(Lattice(history.array_at(step), spacing=history.spacing))
+    index = (np.clip(image / v_max, 0, 1) * 255).astype(np.uint8)
+    frame = np.zeros((image.shape[0] + image.shape[0] % 2, image.shape[1] + image.shape[1] % 2, 3), dtype=np.uint8)
+    frame[...] = lut[0]
+    frame[:image.shape[0], :image.shape[1]] = lut[index]
+    return frame
+
+
+class FFmpegWriter:
+    """
+    Pipes raw RGB frames into ffmpeg, nothing but the frame being written is held in memory
+    """
+
+    def __init__(self, path: str, fps: float = 30, codec: str = "libx264", ffmpeg: str = "ffmpeg"):
+        """
+
+        :param path: (str) video file
+        :param fps: (float) frames per second
+        :param codec: (str) ffmpeg video codec
+        :param ffmpeg: (str) ffmpeg executable
+        """
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.ffmpeg = ffmpeg
+        self.process = None
+
+    def write(self, frame: np.ndarray):
+        """
+        :param frame: (ndarray) (h, w, 3) uint8 frame, all frames have the same size
+        :return:
+        """
+        if self.process is None:
+            command = [self.ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                       "-s", f"{frame.shape[1]}x{frame.shape[0]}", "-r", str(self.fps), "-i", "-",
+                       "-vcodec", self.codec, "-pix_fmt", "yuv420p", self.path]
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            assert self.process.wait() == 0, f"ffmpeg failed to write {self.path}"
+            self.process = None
+
+
+def export_animation(history, path: str = "animation.mp4", fps: float = 30, frame_interval: float = None,
+                     n_threads: int = None, writer=None, cmap: str = "viridis"):
+    """
+    Renders the states of a simulation in a thread pool and streams the frames in order into a writer.
+    At most two frames per thread are in flight, memory does not grow with the length of the simulation.
+    :param history: (History) states, e.g. Simulator.state
+    :param path: (str) video file, used if no writer is given
+    :param fps: (float) frames per second, used if no writer is given
+    :param frame_interval: (float) simulation time per frame, one frame per step if None, see frame_steps
+    :param n_threads: (int) number of render threads, all cores if None
+    :param writer: object with write(frame) and close(), FFmpegWriter if None
+    :param cmap: (str) matplotlib colormap
+    :return: (int) number of frames
+    """
+    n_threads = n_threads or os.cpu_count()
+    writer = writer or FFmpegWriter(path, fps=fps)
+    lut = colormap(cmap)
+    steps = frame_steps(history.times, frame_interval)
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            for step in steps:
+                pending.append(executor.submit(render_frame, history, int(step) if step >= 0 else None, lut))
+                if len(pending) >= 2 * n_threads:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+    return len(steps)
@@ -5,7 +5,7 @@
 import numpy as np
 from numba import types, typed, typeof, njit
 from numba.experimental import jitclass
-from uas.helper import ArrayMixin
+from uas.helper import ArrayMixin, PackedArray
 from uas.helper import type_site_matrix, type_coordinate_matrix
 
 
@@ -17,28 +17,115 @@ spec_lattice = [
 ]
 
 
-@njit
+@njit(cache=True)
 def calculate_coordinates(input_array):
     return np.argwhere(input_array).astype(np.int16)
 
 
-@njit(type_site_matrix(type_coordinate_matrix, type_site_matrix), fastmath=True)
+@njit(type_site_matrix(type_coordinate_matrix, type_site_matrix), fastmath=True, cache=True)
 def array_from_coordinates(coordinates, new_array):
-    for coord in coordinates:
-        for _c, _s in zip(coord, new_array.shape):
-            if _c > _s:
-                _c = _c - 1
-        new_array[coord[0], coord[1]] = 1
+    """
+    Sets the sites of coordinates, coordinates outside of the array are clamped to its border
+    :param coordinates: (ndarray) (n, 2) coordinates
+    :param new_array: (ndarray) occupation, changed in place
+    :return: (ndarray) new_array
+    """
+    for i in range(coordinates.shape[0]):
+        c_0 = min(max(coordinates[i, 0], 0), new_array.shape[0] - 1)
+        c_1 = min(max(coordinates[i, 1], 0), new_array.shape[1] - 1)
+        new_array[c_0, c_1] = 1
     return new_array
 
 
+@njit(types.void(type_coordinate_matrix, types.float64[:], types.int64[:], type_coordinate_matrix), cache=True)
+def resample_coordinates(coordinates, factor, shape, out):
+    """
+    Scales coordinates to the nearest site of the resampled lattice (rounding half to even as np.around),
+    clamped to its shape
+    :param coordinates: (ndarray) (n, 2) coordinates
+    :param factor: (ndarray) (2, ) factor per axis
+    :param shape: (ndarray) (2, ) shape of the resampled lattice
+    :param out: (ndarray) (n, 2) resampled coordinates, may be coordinates
+    :return:
+    """
+    for i in range(coordinates.shape[0]):
+        for j in range(2):
+            c = np.rint(coordinates[i, j] * factor[j])
+            out[i, j] = min(max(c, 0), shape[j] - 1)
+
+
+def resampled_shape(shape: tuple, factor: np.ndarray):
+    """
+    :param shape: (tuple) lattice shape
+    :param factor: (ndarray) (2, ) factor per axis
+    :return: (ndarray) (2, ) int64 shape of the resampled lattice
+    """
+    new_shape = np.around(np.array(shape) * factor, decimals=0).astype(np.int64)
+    assert np.all(new_shape >= 1) and np.all(new_shape <= np.iinfo(np.int16).max), \
+        f"Resampled shape {tuple(new_shape)} is out of range"
+    return new_shape
+
+
+@njit(types.void(type_site_matrix, type_coordinate_matrix, type_coordinate_matrix), fastmath=True, cache=True)
+def apply_deltas(array, cleared, filled):
+    """
+    Applies per step deltas in order, negative coordinates mark steps without a filled site (discards)
+    :param array: (ndarray) occupation, changed in place
+    :param cleared: (ndarray) (n, 2) sites cleared by every step
+    :param filled: (ndarray) (n, 2) sites filled by every step
+    :return:
+    """
+    for i in range(cleared.shape[0]):
+        array[cleared[i, 0], cleared[i, 1]] = 0
+        if filled[i, 0] >= 0:
+            array[filled[i, 0], filled[i, 1]] = 1
+
+
+@njit(types.int64(type_coordinate_matrix, types.int32[:, :], types.int64, type_coordinate_matrix,
+                  type_coordinate_matrix), fastmath=True, cache=True)
+def update_coordinates(coordinates, site_index, n, cleared, filled):
+    """
+    Keeps a coordinate list valid for steps of (site cleared, site filled), see apply_deltas.
+    A move rewrites the row of the atom in place, a cleared site is swap removed with the last row.
+    :param coordinates: (ndarray) (capacity, 2) coordinates, the first n rows are valid, changed in place
+    :param site_index: (ndarray) map from site to row in coordinates, -1 if empty, changed in place
+    :param n: (int) number of valid rows
+    :param cleared: (ndarray) (k, 2) sites cleared by every step
+    :param filled: (ndarray) (k, 2) sites filled by every step, negative if nothing is filled
+    :return: (int) number of valid rows
+    """
+    for i in range(cleared.shape[0]):
+        row = site_index[cleared[i, 0], cleared[i, 1]]
+        if row >= 0:
+            site_index[cleared[i, 0], cleared[i, 1]] = -1
+        fill = filled[i, 0] >= 0 and site_index[filled[i, 0], filled[i, 1]] < 0
+        if row >= 0:
+            if fill:
+                # move: rewrite in place
+                coordinates[row] = filled[i]
+                site_index[filled[i, 0], filled[i, 1]] = row
+                continue
+            # swap remove
+            n -= 1
+            if row != n:
+                coordinates[row] = coordinates[n]
+                site_index[coordinates[row, 0], coordinates[row, 1]] = row
+        if fill:
+            coordinates[n] = filled[i]
+            site_index[filled[i, 0], filled[i, 1]] = n
+            n += 1
+    return n
+
+
 # @jitclass(spec_lattice)
 class Lattice(ArrayMixin):
-    def __init__(self, array: np.ndarray, spacing: np.ndarray = np.array([5e-6, 5e-6], dtype=np.float32)):
+    def __init__(self, array: np.ndarray, spacing: np.ndarray = np.array([5e-6, 5e-6], dtype=np.float32),
+                 packed: bool = False):
         """
 
         :param array:
         :param spacing: (ndarray) [µm]
+        :param packed: (bool) store the occupation bit packed, see ArrayMixin
         """
         self._array = array
         self._array_cached = True
@@ -46,23 +133,40 @@ class Lattice(ArrayMixin):
         self.spacing = spacing
         self._coordinates_cached = False
         self._coordinates = np.zeros((2, 2), dtype=np.int16)
+        self._n_coordinates = 0
+        # coordinates were handed out, copy before the next update
+        self._coordinates_shared = False
+        self._site_index = None
+        if packed:
+            self.pack()
 
     @property
     def coordinates(self):
+        """
+        Coordinates of occupied sites. Computed in row major order and then kept valid incrementally by move, discard
+        and friends (not for packed lattices), so their order changes. A returned array is never changed by the
+        lattice, the first update after a read copies the coordinates.
+        :return: (ndarray) (n, 2) coordinates
+        """
         if self._coordinates_cached:
-            return self._coordinates
+            self._coordinates_shared = True
+            return self._coordinates[:self._n_coordinates]
         # get coordinates
+        elif self.packed:
+            self.set_coordinates(self._bits.coordinates())
+            return self._coordinates
         else:
-            self._coordinates = calculate_coordinates(self.value)
-            self._coordinates_cached = True
+            self.set_coordinates(calculate_coordinates(self.value))
             return self._coordinates
 
     @property
     def value(self):
         """
-        :return: (ndarray) returns the array
+        :return: (ndarray) returns the array, read only if packed
         """
-        if self._array_cached:
+        if self.packed:
+            return self._unpacked()
+        elif self._array_cached:
             return self._array
         # get array
         else:
@@ -77,7 +181,39 @@ class Lattice(ArrayMixin):
         :return:
         """
         self._coordinates = coordinates
+        self._n_coordinates = coordinates.shape[0]
         self._coordinates_cached = True
+        self._coordinates_shared = True
+        self._site_index = None
+
+    def _update_coordinates(self, cleared: np.ndarray, filled: np.ndarray):
+        """
+        Keeps cached coordinates valid after steps of (site cleared, site filled), see update_coordinates.
+        Packed lattices drop their coordinates instead of keeping an index map.
+        :param cleared: (ndarray) (n, 2) coordinates
+        :param filled: (ndarray) (n, 2) coordinates, negative if nothing is filled
+        :return:
+        """
+        if not self._coordinates_cached or self.packed:
+            self._coordinates_cached = False
+            return
+        cleared = np.asarray(cleared, dtype=np.int16).reshape(-1, 2)
+        filled = np.asarray(filled, dtype=np.int16).reshape(-1, 2)
+        if self._site_index is None:
+            self._site_index = np.full(self._shape, -1, dtype=np.int32)
+            coordinates = self._coordinates[:self._n_coordinates]
+            self._site_index[coordinates[:, 0], coordinates[:, 1]] = np.arange(self._n_coordinates, dtype=np.int32)
+        required = self._n_coordinates + filled.shape[0]
+        if required > self._coordinates.shape[0] or self._coordinates_shared:
+            capacity = self._coordinates.shape[0]
+            if required > capacity:
+                capacity = max(required, 2 * capacity)
+            coordinates = np.zeros((capacity, 2), dtype=np.int16)
+            coordinates[:self._n_coordinates] = self._coordinates[:self._n_coordinates]
+            self._coordinates = coordinates
+            self._coordinates_shared = False
+        self._n_coordinates = update_coordinates(self._coordinates, self._site_index, self._n_coordinates,
+                                                 cleared, filled)
 
     def set_value(self, value: np.ndarray):
         """
@@ -85,23 +221,58 @@ class Lattice(ArrayMixin):
         :param value: ndarray
         :return:
         """
+        if self.packed:
+            self._bits = PackedArray.from_array(value)
+            return
         self._array = value
         self._array_cached = True
 
-    def resample(self, factor: np.ndarray):
+    def unpack(self):
+        """
+        Stores the array as bool array
+        :return:
+        """
+        super().unpack()
+        self._array_cached = True
+
+    def andnot(self, other):
+        """
+        Sites occupied in this lattice but not in other, e.g. atoms left to discard. Bitwise if both are packed.
+        :param other: (Lattice)
+        :return: (Lattice) packed if this lattice is packed
+        """
+        if self.packed and other.packed:
+            obj = Lattice(np.zeros((0, 0), dtype=bool), spacing=self.spacing)
+            obj._shape = self._shape
+            obj._bits = self._bits.andnot(other._bits)
+            return obj
+        return Lattice(np.logical_and(self.value, np.logical_not(other.value)), spacing=self.spacing,
+                       packed=self.packed)
+
+    def resample(self, factor: np.ndarray, out: np.ndarray = None):
         """
-        Resample the lattice. The underlying array is then reconstructed
-        from coordinates.
-        :param factor:
+        Resample the lattice, every atom goes to the nearest site of the new lattice. Coordinates are scaled into a new
+        array, the underlying array is then reconstructed from them. Downsampling can merge atoms.
+        :param factor: (ndarray) (2, ) factor per axis or scalar, need not be integer
+        :param out: (ndarray) preallocated bool array of the resampled shape, used as the new array
         :return:
         """
-        new_coordinates = np.copy(self.coordinates)
-        new_coordinates[:, 0] = np.around(new_coordinates[:, 0] * factor[0], decimals=0).astype(np.int16)
-        new_coordinates[:, 1] = np.around(new_coordinates[:, 1] * factor[1], decimals=0).astype(np.int16)
-        new_shape = np.around(np.array(self._array.shape) * factor, decimals=0).astype(np.int16)
-        self.set_coordinates(new_coordinates)
-        self.set_value(array_from_coordinates(new_coordinates, np.zeros(new_shape, dtype=bool)))
-        self._shape = new_shape
+        factor = np.ones(2) * factor
+        new_shape = resampled_shape(self._shape, factor)
+        if out is None:
+            out = np.zeros(tuple(new_shape), dtype=bool)
+        else:
+            assert out.shape == tuple(new_shape) and out.dtype == bool, \
+                f"out has to be a bool array of shape {tuple(new_shape)}"
+            out[...] = False
+        coordinates = np.empty_like(self.coordinates)
+        resample_coordinates(self.coordinates, factor, new_shape, coordinates)
+        self.set_value(array_from_coordinates(coordinates, out))
+        self.set_coordinates(coordinates)
+        if np.any(factor < 1):
+            # merged atoms leave duplicate coordinates
+            self._coordinates_cached = False
+        self._shape = tuple(new_shape)
         self.spacing = self.spacing / factor
 
     def rescale(self, spacing: np.ndarray):
@@ -114,18 +285,70 @@ class Lattice(ArrayMixin):
         self.resample(factor)
 
     def move(self, origin: np.ndarray, target: np.ndarray):
-        self.value[tuple(origin)] = 0
-        self.value[tuple(target)] = 1
-        self._coordinates_cached = False
+        if self.packed:
+            self._bits.set(origin, False)
+            self._bits.set(target, True)
+        else:
+            self.value[tuple(origin)] = 0
+            self.value[tuple(target)] = 1
+        self._update_coordinates(origin, target)
 
     def discard(self, origin: np.ndarray):
-        self.value[tuple(origin)] = 0
-        self._coordinates_cached = False
+        if self.packed:
+            self._bits.set(origin, False)
+        else:
+            self.value[tuple(origin)] = 0
+        self._update_coordinates(origin, (-1, -1))
+
+    def apply_deltas(self, cleared: np.ndarray, filled: np.ndarray):
+        """
+        Applies steps of (site cleared, site filled) one after another, see apply_deltas
+        :param cleared: (ndarray) (n, 2) coordinates
+        :param filled: (ndarray) (n, 2) coordinates, negative if nothing is filled
+        :return:
+        """
+        if self.packed:
+            array = self._bits.unpack()
+            apply_deltas(array, cleared, filled)
+            self._bits = PackedArray.from_array(array)
+        else:
+            apply_deltas(self.value, cleared, filled)
+        self._update_coordinates(cleared, filled)
+
+    def move_many(self, origins: np.ndarray, targets: np.ndarray):
+        """
+        Applies a batch of moves at once. Origins and targets have to be disjoint sets of sites,
+        i.e. no move may start from a site another move of the batch fills.
+        :param origins: (ndarray) (n, 2) coordinates
+        :param targets: (ndarray) (n, 2) coordinates
+        :return:
+        """
+        if self.packed:
+            self._bits.set(origins, False)
+            self._bits.set(targets, True)
+        else:
+            self.value[origins[:, 0], origins[:, 1]] = 0
+            self.value[targets[:, 0], targets[:, 1]] = 1
+        self._update_coordinates(origins, targets)
+
+    def discard_many(self, origins: np.ndarray):
+        """
+        Discards a batch of sites at once
+        :param origins: (ndarray) (n, 2) coordinates
+        :return:
+        """
+        if self.packed:
+            self._bits.set(origins, False)
+        else:
+            self.value[origins[:, 0], origins[:, 1]] = 0
+        self._update_coordinates(origins, np.full_like(origins, -1))
 
 
 def lattice_from_lattice(lattice):
     obj = Lattice(array=np.zeros_like(lattice.value), spacing=lattice.spacing)
     obj._array = np.copy(lattice.value)
+    if lattice.packed:
+        obj.pack()
     return obj
 
 #
@@ -0,0 +1,273 @@
+"""
+Batched sorting of many random loadings into one target, single or repeated image, sort and move cycles with loss
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from numba import njit, types
+from uas import Lattice
+from uas.helper import type_coordinate_matrix, type_site_matrix, SampleBatch, random_streams
+from uas.strategy.french import calculate_target_index, greedy_rings
+from uas.trajectory import completion_time
+
+
+@njit(types.void(types.boolean[:, :, :], type_site_matrix, type_coordinate_matrix, types.int32[:, :],
+                 types.float32[:], types.float64, types.float64, types.float64,
+                 types.float32[:], types.int64[:], types.int64[:]), nogil=True, cache=True)
+def sort_loadings(loadings, target, target_coordinates, target_index, spacing, t_pick, t_place, v_move,
+                  completion, site_moves, discard_moves):
+    """
+    Sorts every loading with the greedy French strategy (bucketed) and evaluates the completion time of the plan.
+    Releases the GIL, so disjoint chunks can be sorted by threads.
+    :param loadings: (ndarray) (k, n_0, n_1) start states
+    :param target: (ndarray) target state
+    :param target_coordinates: (ndarray) coordinates of the target state
+    :param target_index: (ndarray) see calculate_target_index
+    :param spacing: (ndarray) lattice spacing
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :param completion: (ndarray) (k, ) output, completion times, NaN if unsolvable
+    :param site_moves: (ndarray) (k, ) output, number of moves
+    :param discard_moves: (ndarray) (k, ) output, number of discards
+    :return:
+    """
+    for k in range(loadings.shape[0]):
+        loading = loadings[k]
+        start_coordinates = np.argwhere(loading).astype(np.int16)
+        if start_coordinates.shape[0] < target_coordinates.shape[0]:
+            completion[k] = np.nan
+            site_moves[k] = 0
+            discard_moves[k] = 0
+            continue
+        start_visited = np.logical_and(loading, target)
+        target_visited = np.copy(start_visited)
+        queue = greedy_rings(start_visited, target_visited, start_coordinates, target_coordinates, target_index)
+        state = np.copy(loading)
+        for i in range(queue.shape[0]):
+            state[queue[i, 0], queue[i, 1]] = 0
+            state[queue[i, 2], queue[i, 3]] = 1
+        remainder = np.argwhere(np.logical_and(state, np.logical_not(target))).astype(np.int16)
+        n_queue, n_remainder = queue.shape[0], remainder.shape[0]
+        origins = np.empty((n_queue + n_remainder, 2), dtype=np.int16)
+        targets = np.empty((n_queue + n_remainder, 2), dtype=np.int16)
+        discards = np.zeros(n_queue + n_remainder, dtype=np.bool_)
+        origins[:n_queue] = queue[:, :2]
+        targets[:n_queue] = queue[:, 2:]
+        origins[n_queue:] = remainder
+        targets[n_queue:] = remainder
+        discards[n_queue:] = True
+        completion[k] = completion_time(origins, targets, discards, spacing, 0., t_pick, t_place, v_move)
+        site_moves[k] = n_queue
+        discard_moves[k] = n_remainder
+
+
+@njit(nogil=True, cache=True)
+def _lose_atoms(state, p_survive):
+    for r in range(state.shape[0]):
+        for c in range(state.shape[1]):
+            if state[r, c] and np.random.random() >= p_survive:
+                state[r, c] = 0
+
+
+@njit(types.void(types.boolean[:, :, :], type_site_matrix, type_coordinate_matrix, types.int32[:, :],
+                 types.float32[:], types.float64, types.float64, types.float64, types.float64, types.float64,
+                 types.float64, types.float64, types.int64, types.int64,
+                 types.float32[:], types.int64[:], types.int64[:], types.float32[:]), nogil=True, cache=True)
+def sort_cycles(loadings, target, target_coordinates, target_index, spacing, t_pick, t_place, v_move, t_image,
+                p_move, lifetime, t_budget, max_cycles, seed, fill_time, cycles, site_moves, filling):
+    """
+    Repeats cycles of imaging, sorting with the greedy French strategy (bucketed) and moving until an image shows the
+    target filled. Every move loses its atom with probability 1 - p_move, every atom survives a cycle with
+    probability exp(-duration / lifetime). Surplus atoms are kept as reservoir for later cycles, they are not
+    discarded. Releases the GIL, random numbers are drawn from the numba generator of the calling thread.
+    :param loadings: (ndarray) (k, n_0, n_1) start states, changed in place to the final states
+    :param target: (ndarray) target state
+    :param target_coordinates: (ndarray) coordinates of the target state
+    :param target_index: (ndarray) see calculate_target_index
+    :param spacing: (ndarray) lattice spacing
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :param t_image: time to take an image
+    :param p_move: probability that a move keeps its atom
+    :param lifetime: vacuum lifetime of an atom
+    :param t_budget: no cycle starts after this time
+    :param max_cycles: maximal number of sort and move cycles
+    :param seed: seed of the generator of the calling thread
+    :param fill_time: (ndarray) (k, ) output, time of the first image with the target filled, NaN if never
+    :param cycles: (ndarray) (k, ) output, number of sort and move cycles
+    :param site_moves: (ndarray) (k, ) output, number of moves of all cycles
+    :param filling: (ndarray) (k, ) output, filled fraction of the target at the last image
+    :return:
+    """
+    np.random.seed(seed)
+    n_target = target_coordinates.shape[0]
+    no_discards = np.zeros(n_target, dtype=np.bool_)
+    for k in range(loadings.shape[0]):
+        state = loadings[k]
+        timer = 0.
+        fill_time[k] = np.nan
+        cycles[k] = 0
+        site_moves[k] = 0
+        while True:
+            timer += t_image
+            _lose_atoms(state, np.exp(-t_image / lifetime))
+            n_filled = np.count_nonzero(np.logical_and(state, target))
+            filling[k] = n_filled / max(n_target, 1)
+            if n_filled == n_target:
+                fill_time[k] = timer
+                break
+            start_coordinates = np.argwhere(state).astype(np.int16)
+            if cycles[k] == max_cycles or timer >= t_budget or start_coordinates.shape[0] < n_target:
+                break
+            start_visited = np.logical_and(state, target)
+            target_visited = np.copy(start_visited)
+            queue = greedy_rings(start_visited, target_visited, start_coordinates, target_coordinates, target_index)
+            for i in range(queue.shape[0]):
+                state[queue[i, 0], queue[i, 1]] = 0
+                if np.random.random() < p_move:
+                    state[queue[i, 2], queue[i, 3]] = 1
+            duration = completion_time(queue[:, :2], queue[:, 2:], no_discards[:queue.shape[0]], spacing, 0.,
+                                       t_pick, t_place, v_move)
+            _lose_atoms(state, np.exp(-duration / lifetime))
+            timer += duration
+            cycles[k] += 1
+            site_moves[k] += queue.shape[0]
+
+
+def fill_probability(fill_time: np.ndarray, times: np.ndarray):
+    """
+    :param fill_time: (ndarray) (k, ) fill times of trials, NaN if never filled, see MonteCarlo.run_cycles
+    :param times: (ndarray) (m, ) times
+    :return: (ndarray) (m, ) fraction of trials with the target filled at every time
+    """
+    return np.mean(fill_time[np.newaxis, :] <= np.asarray(times)[:, np.newaxis], axis=1)
+
+
+class MonteCarlo:
+    """
+    Sorts many loadings into one target state in a single call.
+    Target coordinates and the target index map are computed once and shared by all trials, trials are split into
+    chunks which are sorted by threads. Timing parameters and results are the same as for French with Frontend.
+    run_cycles repeats image, sort and move cycles with loss of atoms until the target is filled, see sort_cycles.
+    """
+
+    def __init__(self, target: Lattice, n_threads: int = None, chunk_size: int = 16):
+        """
+
+        :param target: (Lattice) target state
+        :param n_threads: (int) number of threads, all cores if None
+        :param chunk_size: (int) number of trials per chunk
+        """
+        self.target = target
+        self.spacing = target.spacing
+        self.v_move = 100/1e3  # [µm/µs] 100µm/ms
+        self.t_pick = 300  # [µs] 300µs
+        self.t_place = 300  # [µs] 300µs
+        # loss model of run_cycles
+        self.t_image = 20e3  # [µs] 20ms
+        self.p_move = 0.99
+        self.lifetime = 60e6  # [µs] 60s
+        self.n_threads = n_threads or os.cpu_count()
+        self.chunk_size = chunk_size
+        # one writable copy for the compiled kernels, the value of a packed lattice is read only
+        self.target_value = np.array(target.value)
+        self.target_coordinates = target.coordinates
+        self.target_index = calculate_target_index(self.target_coordinates, *self.target_value.shape)
+
+    def _sort_chunk(self, loadings: np.ndarray, completion: np.ndarray, site_moves: np.ndarray,
+                    discard_moves: np.ndarray):
+        sort_loadings(loadings, self.target_value, self.target_coordinates, self.target_index,
+                      np.asarray(self.spacing, dtype=np.float32), float(self.t_pick), float(self.t_place / 10),
+                      float(self.v_move), completion, site_moves, discard_moves)
+
+    @staticmethod
+    def _result(completion: np.ndarray, site_moves: np.ndarray, discard_moves: np.ndarray):
+        return {"completion-time": completion,
+                "site-moves": site_moves,
+                "discard-moves": discard_moves}
+
+    def sort_loadings(self, loadings: np.ndarray):
+        """
+        Sorts given loadings
+        :param loadings: (ndarray) (k, n_0, n_1) boolean start states
+        :return: (dict) arrays of completion-time (NaN if unsolvable), site-moves and discard-moves
+        """
+        loadings = np.ascontiguousarray(loadings, dtype=bool)
+        n_trials = loadings.shape[0]
+        completion = np.empty(n_trials, dtype=np.float32)
+        site_moves = np.empty(n_trials, dtype=np.int64)
+        discard_moves = np.empty(n_trials, dtype=np.int64)
+        chunks = range(0, n_trials, self.chunk_size)
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            list(executor.map(lambda i: self._sort_chunk(loadings[i:i + self.chunk_size],
+                                                         completion[i:i + self.chunk_size],
+                                                         site_moves[i:i + self.chunk_size],
+                                                         discard_moves[i:i + self.chunk_size]), chunks))
+        return self._result(completion, site_moves, discard_moves)
+
+    def run(self, n_trials: int, p_loading: (float or np.ndarray) = 0.5, seed: int = None):
+        """
+        Sorts n_trials random loadings. Every chunk draws its loadings from its own random stream spawned from seed,
+        the result does not depend on the number of threads.
+        :param n_trials: (int) number of random loadings
+        :param p_loading: (float or ndarray) probability of loading sites, site selective if ndarray
+        :param seed: (int) seed of the random streams
+        :return: (dict) arrays of completion-time (NaN if unsolvable), site-moves and discard-moves
+        """
+        shape = self.target_value.shape
+        completion = np.empty(n_trials, dtype=np.float32)
+        site_moves = np.empty(n_trials, dtype=np.int64)
+        discard_moves = np.empty(n_trials, dtype=np.int64)
+        chunks = range(0, n_trials, self.chunk_size)
+        streams = random_streams(seed, len(chunks))
+
+        def sort_chunk(i, stream):
+            n = min(self.chunk_size, n_trials - i)
+            loadings = SampleBatch(n, shape, rng=stream)
+            loadings.add_random(p_loading)
+            self._sort_chunk(loadings.value, completion[i:i + n], site_moves[i:i + n], discard_moves[i:i + n])
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            list(executor.map(sort_chunk, chunks, streams))
+        return self._result(completion, site_moves, discard_moves)
+
+    def run_cycles(self, n_trials: int, p_loading: (float or np.ndarray) = 0.5, max_cycles: int = 10,
+                   t_budget: float = np.inf, seed: int = None):
+        """
+        Sorts n_trials random loadings in cycles with the loss model t_image, p_move and lifetime, see sort_cycles.
+        Reproducible for a seed independent of the number of threads, as run.
+        :param n_trials: (int) number of random loadings
+        :param p_loading: (float or ndarray) probability of loading sites, site selective if ndarray
+        :param max_cycles: (int) maximal number of sort and move cycles
+        :param t_budget: (float) [µs] no cycle starts after this time
+        :param seed: (int) seed of the random streams
+        :return: (dict) arrays of fill-time (NaN if never filled), cycles, site-moves and filling, see
+            fill_probability for the fill probability versus time
+        """
+        shape = self.target_value.shape
+        fill_time = np.empty(n_trials, dtype=np.float32)
+        cycles = np.empty(n_trials, dtype=np.int64)
+        site_moves = np.empty(n_trials, dtype=np.int64)
+        filling = np.empty(n_trials, dtype=np.float32)
+        chunks = range(0, n_trials, self.chunk_size)
+        streams = random_streams(seed, len(chunks))
+
+        def sort_chunk(i, stream):
+            n = min(self.chunk_size, n_trials - i)
+            loadings = SampleBatch(n, shape, rng=stream)
+            loadings.add_random(p_loading)
+            sort_cycles(loadings.value, self.target_value, self.target_coordinates, self.target_index,
+                        np.asarray(self.spacing, dtype=np.float32), float(self.t_pick), float(self.t_place / 10),
+                        float(self.v_move), float(self.t_image), float(self.p_move), float(self.lifetime),
+                        float(t_budget), int(max_cycles), int(stream.integers(2 ** 31)), fill_time[i:i + n],
+                        cycles[i:i + n], site_moves[i:i + n], filling[i:i + n])
+
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            list(executor.map(sort_chunk, chunks, streams))
+        return {"fill-time": fill_time,
+                "cycles": cycles,
+                "site-moves": site_moves,
+                "filling": filling}
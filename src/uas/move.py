@@ -17,14 +17,107 @@ class Move:
 
 class Plan:
     """
-    An ordered collection of moves
+    An ordered collection of moves.
+    Moves are stored column wise in preallocated arrays (origins, targets, discard flags) which grow on demand.
     """
 
-    def __init__(self):
-        self.moves = []
+    def __init__(self, capacity: int = 64):
+        """
+
+        :param capacity: (int) number of moves to preallocate
+        """
+        capacity = max(int(capacity), 1)
+        self._origins = np.zeros((capacity, 2), dtype=np.int16)
+        self._targets = np.zeros((capacity, 2), dtype=np.int16)
+        self._discards = np.zeros(capacity, dtype=bool)
+        self._length = 0
+
+    @classmethod
+    def from_arrays(cls, origins: np.ndarray, targets: np.ndarray, discards: np.ndarray = None):
+        """
+        Builds a plan around existing arrays without copying them
+        :param origins: (ndarray) (n, 2) coordinates
+        :param targets: (ndarray) (n, 2) coordinates
+        :param discards: (ndarray) (n, ) discard flags, all False if None
+        :return: (Plan)
+        """
+        obj = cls.__new__(cls)
+        obj._origins = np.asarray(origins, dtype=np.int16).reshape(-1, 2)
+        obj._targets = np.asarray(targets, dtype=np.int16).reshape(-1, 2)
+        if discards is None:
+            discards = np.zeros(obj._origins.shape[0], dtype=bool)
+        obj._discards = np.asarray(discards, dtype=bool)
+        assert obj._origins.shape == obj._targets.shape == (obj._discards.shape[0], 2), "Plan column shape missmatch"
+        obj._length = obj._origins.shape[0]
+        return obj
 
     def __len__(self):
-        return len(self.moves)
+        return self._length
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield Move(origin=self._origins[i], target=self._targets[i], discard=bool(self._discards[i]))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            # views on the columns, the new plan reallocates as soon as something is appended
+            return Plan.from_arrays(self.origins[item], self.targets[item], self.discards[item])
+        if item < 0:
+            item += self._length
+        if not 0 <= item < self._length:
+            raise IndexError(f"Move index {item} out of range")
+        return Move(origin=self._origins[item], target=self._targets[item], discard=bool(self._discards[item]))
+
+    def __add__(self, other):
+        obj = Plan(capacity=len(self) + len(other))
+        obj.extend(self)
+        obj.extend(other)
+        return obj
+
+    @property
+    def moves(self):
+        """
+        :return: (list) Move views on the stored coordinates
+        """
+        return list(self)
+
+    @property
+    def origins(self):
+        """
+        :return: (ndarray) (n, 2) origin coordinates
+        """
+        return self._origins[:self._length]
+
+    @property
+    def targets(self):
+        """
+        :return: (ndarray) (n, 2) target coordinates
+        """
+        return self._targets[:self._length]
+
+    @property
+    def discards(self):
+        """
+        :return: (ndarray) (n, ) discard flags
+        """
+        return self._discards[:self._length]
+
+    def _reserve(self, n: int):
+        """
+        Makes sure there is space for n more moves, grows the storage geometrically
+        :param n: (int) number of moves to be added
+        :return:
+        """
+        required = self._length + n
+        capacity = self._discards.shape[0]
+        if required <= capacity:
+            return
+        capacity = max(required, 2 * capacity)
+        for name in ("_origins", "_targets", "_discards"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, ) + old.shape[1:], dtype=old.dtype)
+            new[:self._length] = old[:self._length]
+            setattr(self, name, new)
 
     def add_move(self, origin: np.ndarray, target: np.ndarray):
         """
@@ -33,7 +126,11 @@ class Plan:
         :param target: (ndarray) coordinate
         :return: (Lattice)
         """
-        self.moves.append(Move(origin=origin, target=target))
+        self._reserve(1)
+        self._origins[self._length] = origin
+        self._targets[self._length] = target
+        self._discards[self._length] = False
+        self._length += 1
 
     def add_discard(self, origin: np.ndarray):
         """
@@ -41,4 +138,48 @@ class Plan:
         :param origin: (ndarray) coordinate
         :return: (Lattice)
         """
-        self.moves.append(Move(origin=origin, target=origin, discard=True))
+        self._reserve(1)
+        self._origins[self._length] = origin
+        self._targets[self._length] = origin
+        self._discards[self._length] = True
+        self._length += 1
+
+    def add_moves(self, origins: np.ndarray, targets: np.ndarray):
+        """
+        Adds a batch of moves, e.g. the queue of a strategy
+        :param origins: (ndarray) (n, 2) coordinates
+        :param targets: (ndarray) (n, 2) coordinates
+        :return:
+        """
+        n = len(origins)
+        self._reserve(n)
+        self._origins[self._length:self._length + n] = origins
+        self._targets[self._length:self._length + n] = targets
+        self._discards[self._length:self._length + n] = False
+        self._length += n
+
+    def add_discards(self, origins: np.ndarray):
+        """
+        Adds a batch of discard moves
+        :param origins: (ndarray) (n, 2) coordinates
+        :return:
+        """
+        n = len(origins)
+        self._reserve(n)
+        self._origins[self._length:self._length + n] = origins
+        self._targets[self._length:self._length + n] = origins
+        self._discards[self._length:self._length + n] = True
+        self._length += n
+
+    def extend(self, other):
+        """
+        Appends all moves of another plan
+        :param other: (Plan)
+        :return:
+        """
+        n = len(other)
+        self._reserve(n)
+        self._origins[self._length:self._length + n] = other.origins
+        self._targets[self._length:self._length + n] = other.targets
+        self._discards[self._length:self._length + n] = other.discards
+        self._length += n
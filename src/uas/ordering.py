@@ -0,0 +1,359 @@
+"""
+Ordering of moves to shorten the travel of the empty tweezer
+"""
+
+import numpy as np
+from numba import njit, types
+from scipy.spatial import cKDTree
+from uas import Plan
+from uas.helper import type_coordinate_matrix
+from uas.trajectory import move_ends
+
+
+@njit(types.Tuple((types.int64[:, :], types.int64[:, :]))(type_coordinate_matrix, type_coordinate_matrix,
+                                                          types.boolean[:]), cache=True)
+def move_dependencies(origins, targets, discards):
+    """
+    Moves touching the same site have to keep their order, e.g. a site has to be vacated before it is filled.
+    Every move touches at most two sites, so it has at most two direct predecessors and successors.
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :return: (tuple) (n, 2) predecessors, (n, 2) successors, -1 if none
+    """
+    n = origins.shape[0]
+    preds = np.full((n, 2), -1, dtype=np.int64)
+    succs = np.full((n, 2), -1, dtype=np.int64)
+    if n == 0:
+        return preds, succs
+    n_0 = max(np.max(origins[:, 0]), np.max(targets[:, 0])) + 1
+    n_1 = max(np.max(origins[:, 1]), np.max(targets[:, 1])) + 1
+    last_touch = np.full((n_0, n_1), -1, dtype=np.int64)
+    for i in range(n):
+        for slot in range(2):
+            site = origins[i] if slot == 0 else targets[i]
+            if slot == 1 and (discards[i] or (site[0] == origins[i, 0] and site[1] == origins[i, 1])):
+                continue
+            p = last_touch[site[0], site[1]]
+            if p >= 0:
+                preds[i, slot] = p
+                succs[p, 0 if origins[p, 0] == site[0] and origins[p, 1] == site[1] else 1] = i
+            last_touch[site[0], site[1]] = i
+    return preds, succs
+
+
+@njit(types.int64[:](type_coordinate_matrix, types.float32[:, :], types.int64[:, :], types.int64[:, :]), cache=True)
+def nearest_neighbour_tour(origins, ends, preds, succs):
+    """
+    Greedy tour: starts with the first move and always continues with the move whose origin is closest (cityblock)
+    to the end of the current move, among the moves whose predecessors are done.
+    Origins of ready moves are bucketed per site and searched in growing rings around the tweezer.
+    :param origins: (ndarray) (n, 2) coordinates
+    :param ends: (ndarray) (n, 2) tweezer positions after every move, see move_ends
+    :param preds: (ndarray) (n, 2) predecessors, see move_dependencies
+    :param succs: (ndarray) (n, 2) successors, see move_dependencies
+    :return: (ndarray) (n, ) order of the moves
+    """
+    n = origins.shape[0]
+    tour = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return tour
+    n_0 = np.max(origins[:, 0]) + 1
+    n_1 = np.max(origins[:, 1]) + 1
+    # doubly linked lists of ready moves per origin site
+    head = np.full(n_0 * n_1, -1, dtype=np.int64)
+    following = np.full(n, -1, dtype=np.int64)
+    previous = np.full(n, -1, dtype=np.int64)
+    ready = np.zeros(n, dtype=np.bool_)
+    waiting = np.zeros(n, dtype=np.int64)
+    for i in range(n):
+        waiting[i] = (preds[i, 0] >= 0) + (preds[i, 1] >= 0)
+    for i in range(n - 1, -1, -1):
+        if waiting[i] == 0:
+            site = origins[i, 0] * n_1 + origins[i, 1]
+            following[i] = head[site]
+            if head[site] >= 0:
+                previous[head[site]] = i
+            head[site] = i
+            ready[i] = True
+    current = 0
+    for k in range(n):
+        if k > 0:
+            r = min(max(int(np.floor(ends[current, 0] + 0.5)), 0), n_0 - 1)
+            c = min(max(int(np.floor(ends[current, 1] + 0.5)), 0), n_1 - 1)
+            current = -1
+            d = 0
+            while current < 0 and d <= n_0 + n_1:
+                if 2 * d * (d + 1) > n - k:
+                    # the rings are larger than the remaining moves, scan them instead
+                    best = np.inf
+                    for i in range(n):
+                        if ready[i]:
+                            distance = abs(origins[i, 0] - r) + abs(origins[i, 1] - c)
+                            if distance < best:
+                                best = distance
+                                current = i
+                    break
+                for i_0 in range(max(r - d, 0), min(r + d, n_0 - 1) + 1):
+                    rest = d - abs(i_0 - r)
+                    for i_1 in (c - rest, c + rest):
+                        if 0 <= i_1 < n_1:
+                            i = head[i_0 * n_1 + i_1]
+                            if i >= 0 and (current < 0 or i < current):
+                                current = i
+                        if rest == 0:
+                            break
+                d += 1
+        tour[k] = current
+        # remove from the bucket
+        ready[current] = False
+        if previous[current] >= 0:
+            following[previous[current]] = following[current]
+        else:
+            head[origins[current, 0] * n_1 + origins[current, 1]] = following[current]
+        if following[current] >= 0:
+            previous[following[current]] = previous[current]
+        # release successors
+        for slot in range(2):
+            s = succs[current, slot]
+            if s < 0:
+                continue
+            waiting[s] -= 1
+            if waiting[s] == 0:
+                site = origins[s, 0] * n_1 + origins[s, 1]
+                following[s] = head[site]
+                previous[s] = -1
+                if head[site] >= 0:
+                    previous[head[site]] = s
+                head[site] = s
+                ready[s] = True
+    return tour
+
+
+@njit(fastmath=True, cache=True)
+def _leg(origins, ends, weights, a, b):
+    """
+    Length of the empty leg from the end of move a to the origin of move b
+    """
+    return weights[0] * abs(origins[b, 0] - ends[a, 0]) + weights[1] * abs(origins[b, 1] - ends[a, 1])
+
+
+@njit(types.float64(types.int64[:], type_coordinate_matrix, types.float32[:, :], types.float64[:]),
+      fastmath=True, cache=True)
+def empty_length(tour, origins, ends, weights):
+    """
+    :param tour: (ndarray) (n, ) order of the moves
+    :param origins: (ndarray) (n, 2) coordinates
+    :param ends: (ndarray) (n, 2) tweezer positions after every move
+    :param weights: (ndarray) length of one site step along both axes
+    :return: (float) total length of the empty legs
+    """
+    length = 0.
+    for k in range(tour.shape[0] - 1):
+        length += _leg(origins, ends, weights, tour[k], tour[k + 1])
+    return length
+
+
+@njit(fastmath=True, cache=True)
+def _prefix_lengths(tour, origins, ends, weights, forward, backward):
+    """
+    Cumulated leg lengths along the tour in both directions, reversal costs of 2-opt are differences of these
+    """
+    forward[0] = 0.
+    backward[0] = 0.
+    for k in range(tour.shape[0] - 1):
+        forward[k + 1] = forward[k] + _leg(origins, ends, weights, tour[k], tour[k + 1])
+        backward[k + 1] = backward[k] + _leg(origins, ends, weights, tour[k + 1], tour[k])
+
+
+@njit(types.int64(types.int64[:], type_coordinate_matrix, types.float32[:, :], types.float64[:],
+                  types.int64[:, :], types.int64[:, :], types.int64[:, :], types.int64[:, :], types.int64),
+      fastmath=True, cache=True)
+def improve_tour(tour, origins, ends, weights, preds, succs, before, after, max_rounds):
+    """
+    Local search on an open tour with an asymmetric leg length, modifies tour in place.
+    * Or-opt: moves a segment of 1-3 moves behind a move ending close to the segment's origin
+    * 2-opt: reverses a segment so a move is followed by a move starting close to its end
+    Candidates come from neighbour lists, changes which break the order of dependent moves are skipped.
+    :param tour: (ndarray) (n, ) order of the moves
+    :param origins: (ndarray) (n, 2) coordinates
+    :param ends: (ndarray) (n, 2) tweezer positions after every move
+    :param weights: (ndarray) length of one site step along both axes
+    :param preds: (ndarray) (n, 2) predecessors, see move_dependencies
+    :param succs: (ndarray) (n, 2) successors, see move_dependencies
+    :param before: (ndarray) (n, k) moves ending closest to the origin of every move
+    :param after: (ndarray) (n, k) moves starting closest to the end of every move
+    :param max_rounds: (int) maximal number of passes over the tour
+    :return: (int) number of applied changes
+    """
+    n = tour.shape[0]
+    position = np.empty(n, dtype=np.int64)
+    for k in range(n):
+        position[tour[k]] = k
+    constrained = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        constrained[i] = preds[i, 0] >= 0 or preds[i, 1] >= 0 or succs[i, 0] >= 0 or succs[i, 1] >= 0
+    forward = np.empty(n, dtype=np.float64)
+    backward = np.empty(n, dtype=np.float64)
+    segment = np.empty(3, dtype=np.int64)
+    epsilon = 1e-9
+    n_changes = 0
+    for _ in range(max_rounds):
+        improved = False
+        # or-opt
+        for length in range(1, 4):
+            i = 0
+            while i + length <= n:
+                j = i + length - 1
+                first, last = tour[i], tour[j]
+                removed = 0.
+                if i > 0:
+                    removed += _leg(origins, ends, weights, tour[i - 1], first)
+                if j < n - 1:
+                    removed += _leg(origins, ends, weights, last, tour[j + 1])
+                if 0 < i and j < n - 1:
+                    removed -= _leg(origins, ends, weights, tour[i - 1], tour[j + 1])
+                best, best_p = -epsilon, -2
+                for m in range(before.shape[1]):
+                    v = before[first, m]
+                    if v < 0:
+                        break
+                    p = position[v]
+                    if i - 1 <= p <= j:
+                        continue
+                    added = _leg(origins, ends, weights, v, first)
+                    if p < n - 1:
+                        added += _leg(origins, ends, weights, last, tour[p + 1]) - \
+                                 _leg(origins, ends, weights, v, tour[p + 1])
+                    if added - removed < best:
+                        # moved segment must stay behind its predecessors and before its successors
+                        feasible = True
+                        for k in range(i, j + 1):
+                            if not constrained[tour[k]]:
+                                continue
+                            for slot in range(2):
+                                s, q = succs[tour[k], slot], preds[tour[k], slot]
+                                if p > j and s >= 0 and j < position[s] <= p:
+                                    feasible = False
+                                if p < i and q >= 0 and p < position[q] < i:
+                                    feasible = False
+                        if feasible:
+                            best, best_p = added - removed, p
+                if best_p == -2:
+                    i += 1
+                    continue
+                p = best_p
+                segment[:length] = tour[i:j + 1]
+                if p > j:
+                    tour[i:p - length + 1] = tour[j + 1:p + 1]
+                    tour[p - length + 1:p + 1] = segment[:length]
+                    low, high = i, p
+                else:
+                    tour[p + 1 + length:j + 1] = tour[p + 1:i].copy()
+                    tour[p + 1:p + 1 + length] = segment[:length]
+                    low, high = p + 1, j
+                for k in range(low, high + 1):
+                    position[tour[k]] = k
+                n_changes += 1
+                improved = True
+        # 2-opt
+        _prefix_lengths(tour, origins, ends, weights, forward, backward)
+        for i in range(n - 2):
+            a = tour[i]
+            best, best_j = -epsilon, -1
+            for m in range(after.shape[1]):
+                b = after[a, m]
+                if b < 0:
+                    break
+                j = position[b]
+                if j <= i + 1:
+                    continue
+                delta = _leg(origins, ends, weights, a, b) - _leg(origins, ends, weights, a, tour[i + 1]) + \
+                    (backward[j] - backward[i + 1]) - (forward[j] - forward[i + 1])
+                if j < n - 1:
+                    delta += _leg(origins, ends, weights, tour[i + 1], tour[j + 1]) - \
+                             _leg(origins, ends, weights, b, tour[j + 1])
+                if delta < best:
+                    # a reversed segment must not contain two dependent moves
+                    feasible = True
+                    for k in range(i + 1, j + 1):
+                        if not constrained[tour[k]]:
+                            continue
+                        for slot in range(2):
+                            if succs[tour[k], slot] >= 0 and position[succs[tour[k], slot]] <= j:
+                                feasible = False
+                    if feasible:
+                        best, best_j = delta, j
+            if best_j < 0:
+                continue
+            tour[i + 1:best_j + 1] = tour[i + 1:best_j + 1][::-1].copy()
+            for k in range(i + 1, best_j + 1):
+                position[tour[k]] = k
+            _prefix_lengths(tour, origins, ends, weights, forward, backward)
+            n_changes += 1
+            improved = True
+        if not improved:
+            break
+    return n_changes
+
+
+class MoveOrder:
+    """
+    Reorders the moves of a plan to shorten the travel of the empty tweezer from the end of a move to the origin of
+    the next one. Moves touching the same site keep their order, so the reordered plan yields the same final state.
+    * calculate dependencies between moves
+    * nearest neighbour tour
+    * improve the tour with Or-opt and 2-opt
+    """
+
+    def __init__(self, plan: Plan, spacing: np.ndarray = np.array([5e-6, 5e-6], dtype=np.float32),
+                 n_neighbours: int = 8, max_rounds: int = 50):
+        """
+
+        :param plan: (Plan)
+        :param spacing: (ndarray) lattice spacing
+        :param n_neighbours: (int) candidates per move for the local search
+        :param max_rounds: (int) maximal number of local search passes
+        """
+        self.plan = plan
+        self.spacing = spacing
+        self.n_neighbours = n_neighbours
+        self.max_rounds = max_rounds
+        self.report = {}
+
+    def calculate_neighbours(self, ends: np.ndarray):
+        """
+        Nearest (cityblock) moves for both directions of a leg
+        :param ends: (ndarray) (n, 2) tweezer positions after every move
+        :return: (tuple) (n, k) moves ending closest to every origin, (n, k) moves starting closest to every end
+        """
+        origins = self.plan.origins.astype(np.float64)
+        k = min(self.n_neighbours + 1, len(self.plan))
+        before = cKDTree(ends).query(origins, k=k, p=1)[1].reshape(len(self.plan), k)
+        after = cKDTree(origins).query(ends, k=k, p=1)[1].reshape(len(self.plan), k)
+        # a move is no candidate of itself
+        index = np.arange(len(self.plan))[:, np.newaxis]
+        before = np.where(before == index, -1, before)
+        after = np.where(after == index, -1, after)
+        before = np.take_along_axis(before, np.argsort(before < 0, axis=1, kind="stable"), axis=1)
+        after = np.take_along_axis(after, np.argsort(after < 0, axis=1, kind="stable"), axis=1)
+        return before.astype(np.int64), after.astype(np.int64)
+
+    def run(self):
+        """
+        :return: (Plan) reordered plan
+        """
+        origins, targets, discards = self.plan.origins, self.plan.targets, self.plan.discards
+        ends = move_ends(origins, targets, discards)
+        weights = np.asarray(self.spacing, dtype=np.float64)
+        preds, succs = move_dependencies(origins, targets, discards)
+        tour = nearest_neighbour_tour(origins, ends, preds, succs)
+        n_changes = 0
+        if len(self.plan) > 2:
+            before, after = self.calculate_neighbours(ends)
+            n_changes = improve_tour(tour, origins, ends, weights / np.min(weights), preds, succs, before, after,
+                                     self.max_rounds)
+        self.report.update({"empty-length-before": empty_length(np.arange(len(self.plan)), origins, ends, weights),
+                            "empty-length-after": empty_length(tour, origins, ends, weights),
+                            "local-changes": n_changes})
+        return Plan.from_arrays(origins[tour], targets[tour], discards[tour])
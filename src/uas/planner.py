@@ -0,0 +1,283 @@
+"""
+Collision aware paths of single moves
+"""
+
+import heapq
+import numpy as np
+from numba import njit, types
+from uas import Plan
+from uas.helper import type_site_matrix
+
+# half site steps on the doubled grid: axis steps first, diagonals only between a site and a channel crossing
+HALF_STEPS = np.array(((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)), dtype=np.int64)
+
+
+@njit(fastmath=True, cache=True)
+def _close_passes(occupancy, origin, target, p_0, p_1):
+    """
+    Occupied sites the carried atom passes at half a site distance when at (p_0, p_1) of the doubled grid,
+    -1 if it hits an occupied site. The origin is empty while the atom is carried, the target is not checked.
+    """
+    n_0, n_1 = occupancy.shape
+    odd_0, odd_1 = p_0 % 2, p_1 % 2
+    if odd_0 and odd_1:
+        # channel crossing, all sites are further away
+        return 0
+    if not odd_0 and not odd_1:
+        s_0, s_1 = p_0 // 2, p_1 // 2
+        if (s_0 == origin[0] and s_1 == origin[1]) or (s_0 == target[0] and s_1 == target[1]):
+            return 0
+        if 0 <= s_0 < n_0 and 0 <= s_1 < n_1 and occupancy[s_0, s_1]:
+            return -1
+        return 0
+    # edge between two sites
+    count = 0
+    for k in range(2):
+        if odd_0:
+            s_0, s_1 = (p_0 - 1) // 2 + k, p_1 // 2
+        else:
+            s_0, s_1 = p_0 // 2, (p_1 - 1) // 2 + k
+        if s_0 == origin[0] and s_1 == origin[1]:
+            continue
+        if 0 <= s_0 < n_0 and 0 <= s_1 < n_1 and occupancy[s_0, s_1]:
+            count += 1
+    return count
+
+
+@njit(types.float64(type_site_matrix, types.int64[:], types.int64[:], types.int64[:, :], types.float64[:],
+                    types.float64), fastmath=True, cache=True)
+def evaluate_route(occupancy, origin, target, steps, weights, penalty):
+    """
+    Cost of a route: its length plus penalty for every occupied site passed at half a site distance
+    :param occupancy: (ndarray) occupied sites
+    :param origin: (ndarray) coordinate
+    :param target: (ndarray) coordinate
+    :param steps: (ndarray) (m, 2) half site steps of the route
+    :param weights: (ndarray) length of one site step along both axes
+    :param penalty: (float) cost of a close pass in site steps
+    :return: (float) cost, inf if the route hits an occupied site
+    """
+    p_0, p_1 = 2 * origin[0], 2 * origin[1]
+    cost = 0.
+    for k in range(steps.shape[0]):
+        p_0 += steps[k, 0]
+        p_1 += steps[k, 1]
+        close = _close_passes(occupancy, origin, target, p_0, p_1)
+        if close < 0:
+            return np.inf
+        cost += 0.5 * (weights[0] * abs(steps[k, 0]) + weights[1] * abs(steps[k, 1])) + penalty * close
+    return cost
+
+
+@njit(types.int64[:, :](type_site_matrix, types.int64[:], types.int64[:], types.float64[:], types.float64,
+                        types.int64, types.float64), fastmath=True, cache=True)
+def search_route(occupancy, origin, target, weights, penalty, margin, bound):
+    """
+    A* on the doubled grid of sites, edges and channel crossings within margin sites around the move
+    :param occupancy: (ndarray) occupied sites
+    :param origin: (ndarray) coordinate
+    :param target: (ndarray) coordinate
+    :param weights: (ndarray) length of one site step along both axes
+    :param penalty: (float) cost of a close pass in site steps
+    :param margin: (int) sites the route may leave the bounding box of the move
+    :param bound: (float) cost of the best known route
+    :return: (ndarray) (m, 2) half site steps, empty if no route is cheaper than bound
+    """
+    n_0, n_1 = occupancy.shape
+    low_0 = max(min(origin[0], target[0]) * 2 - 2 * margin, -1)
+    high_0 = min(max(origin[0], target[0]) * 2 + 2 * margin, 2 * n_0 - 1)
+    low_1 = max(min(origin[1], target[1]) * 2 - 2 * margin, -1)
+    high_1 = min(max(origin[1], target[1]) * 2 + 2 * margin, 2 * n_1 - 1)
+    m_0, m_1 = high_0 - low_0 + 1, high_1 - low_1 + 1
+    cost = np.full(m_0 * m_1, np.inf)
+    parent = np.full(m_0 * m_1, -1, dtype=np.int64)
+    t_0, t_1 = 2 * target[0], 2 * target[1]
+    start = (2 * origin[0] - low_0) * m_1 + 2 * origin[1] - low_1
+    goal = (t_0 - low_0) * m_1 + t_1 - low_1
+    cost[start] = 0.
+    heap = [(0.5 * (weights[0] * abs(t_0 - 2 * origin[0]) + weights[1] * abs(t_1 - 2 * origin[1])), start)]
+    found = False
+    while len(heap):
+        f, v = heapq.heappop(heap)
+        if f >= bound:
+            break
+        if v == goal:
+            found = True
+            break
+        p_0, p_1 = v // m_1 + low_0, v % m_1 + low_1
+        if f > cost[v] + 0.5 * (weights[0] * abs(t_0 - p_0) + weights[1] * abs(t_1 - p_1)) + 1e-9:
+            continue
+        n_directions = 8 if p_0 % 2 == p_1 % 2 else 4
+        for direction in range(n_directions):
+            q_0, q_1 = p_0 + HALF_STEPS[direction, 0], p_1 + HALF_STEPS[direction, 1]
+            if q_0 < low_0 or q_0 > high_0 or q_1 < low_1 or q_1 > high_1:
+                continue
+            close = _close_passes(occupancy, origin, target, q_0, q_1)
+            if close < 0:
+                continue
+            w = (q_0 - low_0) * m_1 + q_1 - low_1
+            c = cost[v] + 0.5 * (weights[0] * abs(HALF_STEPS[direction, 0]) +
+                                 weights[1] * abs(HALF_STEPS[direction, 1])) + penalty * close
+            if c < cost[w]:
+                cost[w] = c
+                parent[w] = direction
+                heapq.heappush(heap, (c + 0.5 * (weights[0] * abs(t_0 - q_0) + weights[1] * abs(t_1 - q_1)), w))
+    if not found:
+        return np.zeros((0, 2), dtype=np.int64)
+    # walk back to the origin
+    n_steps = 0
+    v = goal
+    while v != start:
+        direction = parent[v]
+        v -= HALF_STEPS[direction, 0] * m_1 + HALF_STEPS[direction, 1]
+        n_steps += 1
+    steps = np.empty((n_steps, 2), dtype=np.int64)
+    v = goal
+    for k in range(n_steps - 1, -1, -1):
+        direction = parent[v]
+        steps[k] = HALF_STEPS[direction]
+        v -= HALF_STEPS[direction, 0] * m_1 + HALF_STEPS[direction, 1]
+    return steps
+
+
+@njit(types.float32[:, :](types.int64[:, :]), cache=True)
+def steps_to_segments(steps):
+    """
+    Merges consecutive equal half site steps into path segments
+    :param steps: (ndarray) (m, 2) half site steps
+    :return: (ndarray) (k, 2) segments in sites
+    """
+    segments = np.empty((steps.shape[0], 2), dtype=np.float32)
+    n = 0
+    for k in range(steps.shape[0]):
+        if n and k and steps[k, 0] == steps[k - 1, 0] and steps[k, 1] == steps[k - 1, 1]:
+            segments[n - 1, 0] += np.float32(steps[k, 0] / 2)
+            segments[n - 1, 1] += np.float32(steps[k, 1] / 2)
+        else:
+            segments[n, 0] = steps[k, 0] / 2
+            segments[n, 1] = steps[k, 1] / 2
+            n += 1
+    return segments[:n]
+
+
+def route_templates(offset: tuple):
+    """
+    Obstacle independent routes of a move by offset: the L shaped Type2 paths over the sites (both orders) and the
+    Type1 path through the channels (diagonal, L, diagonal)
+    :param offset: (tuple) target - origin
+    :return: (list) of (name, (m, 2) half site steps)
+    """
+    d = np.asarray(offset, dtype=np.int64)
+    sign = np.sign(d)
+    templates = []
+    for order in ((0, 1), (1, 0)):
+        steps = [np.repeat(np.eye(2, dtype=np.int64)[k:k + 1] * sign[k], 2 * abs(d[k]), axis=0) for k in order]
+        steps = np.concatenate(steps)
+        if not any(np.array_equal(steps, other) for name, other in templates):
+            templates.append(("type2", steps))
+    if np.sum(np.abs(d)) > 1:
+        # leave and enter the site diagonally, straight lines stay in the same channel
+        first = np.where(sign == 0, -1, sign)
+        last = np.where(sign == 0, 1, sign)
+        legs = (2 * d - first - last) // 2
+        steps = [first[np.newaxis]]
+        for k in range(2):
+            steps.append(np.repeat(np.eye(2, dtype=np.int64)[k:k + 1] * np.sign(legs[k]), 2 * abs(legs[k]), axis=0))
+        steps.append(last[np.newaxis])
+        templates.append(("type1", np.concatenate(steps)))
+    return templates
+
+
+class PathPlanner:
+    """
+    Chooses the cheapest route of every move given the occupied sites: Type2 over empty sites, Type1 through the
+    channels in between sites or an A* route through the channels. The cost of a route is its length plus a penalty
+    for every atom it passes at half a site distance, routes through occupied sites are illegal.
+    Route templates are cached by offset, only moves whose templates pass close to atoms are searched.
+    """
+
+    def __init__(self, spacing: np.ndarray, penalty: float = 1., margin: int = 3):
+        """
+
+        :param spacing: (ndarray) lattice spacing
+        :param penalty: (float) cost of passing an atom at half a site distance in site steps
+        :param margin: (int) sites a searched route may leave the bounding box of the move
+        """
+        self.spacing = spacing
+        self.weights = np.asarray(spacing, dtype=np.float64) / np.min(spacing)
+        self.penalty = float(penalty)
+        self.margin = margin
+        self.occupancy = np.zeros((0, 0), dtype=bool)
+        self.cache = {}
+        self.report = {"type2": 0, "type1": 0, "routed": 0, "close-passes": 0}
+
+    def set_occupancy(self, array: np.ndarray):
+        """
+        :param array: (ndarray) occupied sites, copied
+        :return:
+        """
+        self.occupancy = np.array(array, dtype=bool)
+
+    def route(self, origin: np.ndarray, target: np.ndarray):
+        """
+        Cheapest route of a move with the current occupancy, does not move the atom
+        :param origin: (ndarray) coordinate
+        :param target: (ndarray) coordinate
+        :return: (tuple) name of the route, (ndarray) (k, 2) path segments
+        """
+        origin = np.asarray(origin, dtype=np.int64)
+        target = np.asarray(target, dtype=np.int64)
+        offset = tuple(target - origin)
+        if offset not in self.cache:
+            self.cache[offset] = [(name, steps, steps_to_segments(steps), 0.5 * np.sum(np.abs(steps) @ self.weights))
+                                  for name, steps in route_templates(offset)]
+        best, best_cost, best_length = None, np.inf, 0.
+        for name, steps, segments, length in self.cache[offset]:
+            cost = evaluate_route(self.occupancy, origin, target, steps, self.weights, self.penalty)
+            if cost < best_cost:
+                best, best_cost, best_length = (name, segments), cost, length
+        if best_cost > best_length + 1e-9:
+            steps = search_route(self.occupancy, origin, target, self.weights, self.penalty, self.margin, best_cost)
+            if steps.shape[0]:
+                best_cost = evaluate_route(self.occupancy, origin, target, steps, self.weights, self.penalty)
+                best_length = 0.5 * np.sum(np.abs(steps) @ self.weights)
+                best = ("routed", steps_to_segments(steps))
+        assert best is not None, f"No route from {origin} to {target}"
+        self.report[best[0]] += 1
+        self.report["close-passes"] += int(round((best_cost - best_length) / self.penalty)) if self.penalty else 0
+        return best
+
+    def move(self, origin: np.ndarray, target: np.ndarray):
+        """
+        Routes a move and updates the occupancy
+        :param origin: (ndarray) coordinate
+        :param target: (ndarray) coordinate
+        :return: (ndarray) (k, 2) path segments
+        """
+        name, segments = self.route(origin, target)
+        self.occupancy[tuple(origin)] = False
+        self.occupancy[tuple(target)] = True
+        return segments
+
+    def discard(self, origin: np.ndarray):
+        """
+        Discards leave the plane, same path as Discard
+        :param origin: (ndarray) coordinate
+        :return: (ndarray) (1, 2) path segment
+        """
+        self.occupancy[tuple(origin)] = False
+        return np.array(((0.5, 0.5), ), dtype=np.float32)
+
+    def plan_routes(self, array: np.ndarray, plan: Plan):
+        """
+        Routes all moves of a plan in order, starting from array
+        :param array: (ndarray) occupied sites before the plan
+        :param plan: (Plan)
+        :return: (tuple) (m, 2) path segments of all moves, (n + 1, ) offsets of the moves into the segments
+        """
+        self.set_occupancy(array)
+        paths = [self.discard(move.origin) if move.discard else self.move(move.origin, move.target) for move in plan]
+        offsets = np.zeros(len(plan) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([path.shape[0] for path in paths])
+        segments = np.concatenate(paths) if paths else np.zeros((0, 2), dtype=np.float32)
+        return segments, offsets
@@ -0,0 +1,132 @@
+"""
+Parallel moves with several tweezers
+"""
+
+import numpy as np
+from numba import njit, types
+from uas import Plan, Frontend
+from uas.helper import type_coordinate_matrix
+from uas.trajectory import count_timeline_rows
+
+
+@njit(types.Tuple((types.float64[:], types.int64[:]))(type_coordinate_matrix, type_coordinate_matrix,
+                                                     types.float64[:], types.float64[:, :], types.int64),
+      cache=True)
+def schedule_moves(origins, targets, durations, boxes, n_tweezers):
+    """
+    Greedy list scheduling of moves (in plan order) onto the tweezer which is free first.
+    A move starts after every earlier move touching its origin or target site has finished and while no other
+    tweezer moves within its box.
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param durations: (ndarray) (n, ) duration of every move
+    :param boxes: (ndarray) (n, 4) area [x_min, x_max, y_min, y_max] blocked by every move
+    :param n_tweezers: (int) number of tweezers
+    :return: (tuple) start times, tweezer of every move
+    """
+    n = origins.shape[0]
+    starts = np.zeros(n, dtype=np.float64)
+    tweezers = np.zeros(n, dtype=np.int64)
+    if n == 0:
+        return starts, tweezers
+    n_0 = max(np.max(origins[:, 0]), np.max(targets[:, 0])) + 1
+    n_1 = max(np.max(origins[:, 1]), np.max(targets[:, 1])) + 1
+    site_free = np.zeros((n_0, n_1), dtype=np.float64)
+    tweezer_free = np.zeros(n_tweezers, dtype=np.float64)
+    active = np.empty(n, dtype=np.int64)
+    n_active = 0
+    for k in range(n):
+        tweezer = np.argmin(tweezer_free)
+        # moves which end before any tweezer is free cannot block anything anymore
+        earliest = tweezer_free[tweezer]
+        n_kept = 0
+        for i in range(n_active):
+            if starts[active[i]] + durations[active[i]] > earliest:
+                active[n_kept] = active[i]
+                n_kept += 1
+        n_active = n_kept
+        start = max(earliest, site_free[origins[k, 0], origins[k, 1]], site_free[targets[k, 0], targets[k, 1]])
+        while True:
+            blocked_until = np.inf
+            for i in range(n_active):
+                j = active[i]
+                end = starts[j] + durations[j]
+                if end <= start or starts[j] >= start + durations[k]:
+                    continue
+                if boxes[j, 1] < boxes[k, 0] or boxes[k, 1] < boxes[j, 0] or \
+                        boxes[j, 3] < boxes[k, 2] or boxes[k, 3] < boxes[j, 2]:
+                    continue
+                blocked_until = min(blocked_until, end)
+            if blocked_until == np.inf:
+                break
+            start = blocked_until
+        starts[k] = start
+        tweezers[k] = tweezer
+        end = start + durations[k]
+        tweezer_free[tweezer] = end
+        site_free[origins[k, 0], origins[k, 1]] = end
+        site_free[targets[k, 0], targets[k, 1]] = end
+        active[n_active] = k
+        n_active += 1
+    return starts, tweezers
+
+
+class Scheduler(Frontend):
+    """
+    Accepts a plan, packs moves which do not conflict into parallel time slots of n_tweezers tweezers.
+    Moves keep their trajectories (Type1 or Discard). Two moves conflict if they touch the same site or if their
+    bounding boxes, grown by half the clearance, overlap.
+    The timeline has one more column: [time, tweezer, picker, x-component, y-component]
+    """
+    def __init__(self, spacing: np.ndarray, plan: Plan, n_tweezers: int = 2, clearance: float = 1.):
+        """
+
+        :param spacing: (ndarray) lattice spacing
+        :param plan: (Plan)
+        :param n_tweezers: (int) number of tweezers moving in parallel
+        :param clearance: (float) minimal distance of two tweezers in sites
+        """
+        super().__init__(spacing=spacing, plan=plan)
+        self.n_tweezers = n_tweezers
+        self.clearance = clearance
+        self.starts = np.zeros(0, dtype=np.float64)
+        self.tweezers = np.zeros(0, dtype=np.int64)
+
+    def calculate_boxes(self):
+        """
+        Area blocked by every move: its bounding box including the half site steps of Type1 and Discard
+        :return: (ndarray) (n, 4) [x_min, x_max, y_min, y_max]
+        """
+        origins, targets = self.plan.origins.astype(np.float64), self.plan.targets.astype(np.float64)
+        margin = 0.5 + self.clearance / 2
+        low = np.minimum(origins, targets) - margin
+        high = np.maximum(origins, targets) + margin
+        return np.stack((low[:, 0], high[:, 0], low[:, 1], high[:, 1]), axis=1)
+
+    def parse_plan(self):
+        # single tweezer timeline, split into moves
+        serial = self.compile_timeline(self.plan).astype(np.float64)
+        rows = count_timeline_rows(self.plan.origins, self.plan.targets, self.plan.discards, self.empty_legs)
+        step_ends = np.cumsum(rows) - 1
+        ends = serial[step_ends, 0]
+        begins = np.concatenate(((0., ), ends[:-1]))
+        durations = ends - begins
+        self.starts, self.tweezers = schedule_moves(self.plan.origins, self.plan.targets, durations,
+                                                    self.calculate_boxes(), self.n_tweezers)
+        row_move = np.repeat(np.arange(len(self.plan)), rows)
+        timeline = np.empty((serial.shape[0], 5), dtype=np.float64)
+        timeline[:, 0] = serial[:, 0] - begins[row_move] + self.starts[row_move]
+        timeline[:, 1] = self.tweezers[row_move]
+        timeline[:, 2:] = serial[:, 1:]
+        order = np.argsort(timeline[:, 0], kind="stable")
+        self.timeline = timeline[order].astype(np.float32)
+        return self.timeline
+
+    @property
+    def completion_time(self):
+        """
+        :return: end of the last move
+        """
+        if not self.timeline.shape[0]:
+            return 0.
+        return float(np.max(self.timeline[:, 0]))
@@ -0,0 +1,180 @@
+"""
+Binary container for plans and timelines
+
+Layout, little endian:
+    header, 64 bytes
+        magic       4s  b"UAS\\x00"
+        version     u2  format version, currently 1
+        kind        u2  0 array, 1 timeline, 2 plan
+        dtype       8s  numpy dtype string of the rows, e.g. b"<f4"
+        columns     u4  values per row
+        rows        u8  number of complete rows
+        padding     up to 64 bytes
+    rows, C order
+
+Timelines are float32 rows [time, picker, dx, dy] (Frontend) or [time, tweezer, picker, dx, dy] (Scheduler).
+Plans are int16 rows [origin_0, origin_1, target_0, target_1, discard].
+The row count in the header is updated after every appended chunk, an interrupted writer leaves a readable file.
+"""
+
+import struct
+import numpy as np
+from uas import Plan
+
+MAGIC = b"UAS\x00"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8sIQ")
+HEADER_SIZE = 64
+KINDS = {"array": 0, "timeline": 1, "plan": 2}
+# default row layout per kind
+LAYOUTS = {"array": (np.float32, 1), "timeline": (np.float32, 4), "plan": (np.int16, 5)}
+
+
+def plan_to_rows(plan: Plan):
+    """
+    :param plan: (Plan)
+    :return: (ndarray) (n, 5) int16 rows [origin, target, discard]
+    """
+    rows = np.empty((len(plan), 5), dtype=np.int16)
+    rows[:, :2] = plan.origins
+    rows[:, 2:4] = plan.targets
+    rows[:, 4] = plan.discards
+    return rows
+
+
+def read_header(path: str):
+    """
+    :param path: (str) file name
+    :return: (dict) kind, dtype, columns, rows, version
+    """
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    assert len(raw) == HEADER_SIZE, f"{path} is too short for a header"
+    magic, version, kind, dtype, columns, rows = HEADER.unpack(raw[:HEADER.size])
+    assert magic == MAGIC, f"{path} is no uas file"
+    assert version <= VERSION, f"{path} has unsupported version {version}"
+    return {"kind": {v: k for k, v in KINDS.items()}[kind],
+            "dtype": np.dtype(dtype.rstrip(b"\x00").decode()),
+            "columns": columns,
+            "rows": rows,
+            "version": version}
+
+
+class Writer:
+    """
+    Appends chunks of rows to a file, e.g. timelines of consecutive plans or results of a sweep
+    """
+
+    def __init__(self, path: str, kind: str = "timeline", columns: int = None, dtype: np.dtype = None,
+                 append: bool = False):
+        """
+
+        :param path: (str) file name
+        :param kind: (str) one of KINDS
+        :param columns: (int) values per row, default of the kind if None
+        :param dtype: (dtype) dtype of the rows, default of the kind if None
+        :param append: (bool) continue an existing file with the same layout instead of truncating it
+        """
+        assert kind in KINDS, f"Unknown kind {kind}, use one of {tuple(KINDS)}"
+        default_dtype, default_columns = LAYOUTS[kind]
+        self.path = path
+        self.kind = kind
+        self.dtype = np.dtype(dtype or default_dtype).newbyteorder("<")
+        self.columns = columns or default_columns
+        self.rows = 0
+        if append:
+            header = read_header(path)
+            assert (header["kind"], header["dtype"], header["columns"]) == (kind, self.dtype, self.columns), \
+                f"Layout of {path} does not match"
+            self.rows = header["rows"]
+            self.file = open(path, "r+b")
+            # drop a partially written row
+            self.file.truncate(HEADER_SIZE + self.rows * self.columns * self.dtype.itemsize)
+            self.file.seek(0, 2)
+        else:
+            self.file = open(path, "wb")
+            self._write_header()
+
+    def _write_header(self):
+        header = HEADER.pack(MAGIC, VERSION, KINDS[self.kind], self.dtype.str.encode(), self.columns, self.rows)
+        self.file.seek(0)
+        self.file.write(header.ljust(HEADER_SIZE, b"\x00"))
+        self.file.seek(0, 2)
+
+    def append(self, rows):
+        """
+        :param rows: (ndarray) (n, columns) rows or a Plan
+        :return:
+        """
+        if isinstance(rows, Plan):
+            rows = plan_to_rows(rows)
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape(-1, self.columns)
+        self.file.write(rows.tobytes())
+        self.rows += rows.shape[0]
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_array(path: str, mode: str = "r"):
+    """
+    Maps the rows of a file without reading them
+    :param path: (str) file name
+    :param mode: (str) np.memmap mode, "r" read only, "r+" writable, "c" copy on write
+    :return: (ndarray) (rows, columns) memory map, empty array if there are no rows
+    """
+    header = read_header(path)
+    if not header["rows"]:
+        return np.zeros((0, header["columns"]), dtype=header["dtype"])
+    return np.memmap(path, dtype=header["dtype"], mode=mode, offset=HEADER_SIZE,
+                     shape=(header["rows"], header["columns"]))
+
+
+def write_timeline(path: str, timeline: np.ndarray):
+    """
+    :param path: (str) file name
+    :param timeline: (ndarray) (rows, 4) or (rows, 5) timeline
+    :return:
+    """
+    with Writer(path, kind="timeline", columns=timeline.shape[1]) as f:
+        f.append(timeline)
+
+
+def read_timeline(path: str):
+    """
+    :param path: (str) file name
+    :return: (ndarray) timeline, memory map
+    """
+    assert read_header(path)["kind"] == "timeline", f"{path} holds no timeline"
+    return open_array(path)
+
+
+def write_plan(path: str, plan: Plan):
+    """
+    :param path: (str) file name
+    :param plan: (Plan)
+    :return:
+    """
+    with Writer(path, kind="plan") as f:
+        f.append(plan)
+
+
+def read_plan(path: str):
+    """
+    Plan on top of the memory map, coordinates are views, only the discard flags are read.
+    The map is copy on write: the views are writable as the compiled kernels require, the file is never changed.
+    :param path: (str) file name
+    :return: (Plan)
+    """
+    assert read_header(path)["kind"] == "plan", f"{path} holds no plan"
+    rows = open_array(path, mode="c")
+    return Plan.from_arrays(rows[:, :2], rows[:, 2:4], rows[:, 4].astype(bool))
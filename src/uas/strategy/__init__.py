@@ -3,5 +3,9 @@
 """
 
 from uas import Lattice
-from .template import StrategyTemplate
+from .template import StrategyTemplate, STRATEGIES, register
 from .french import French
+from .hungarian import Hungarian
+from .tetris import Tetris
+from .auto import Auto, CostModel
+from .replan import Replanner
@@ -0,0 +1,182 @@
+"""
+Automatic selection of the strategy with the lowest predicted cost
+"""
+
+import json
+import time
+from copy import copy, deepcopy
+import numpy as np
+from scipy.optimize import nnls
+from uas import Lattice, Plan, Frontend
+from . import StrategyTemplate, STRATEGIES
+
+# fitted with python benchmarks/bench_selection.py on the lattices of the benchmarks
+DEFAULT_COEFFICIENTS = {
+    "french": {"compute": [2.08e-08, 2.01], "operations": [0, 0, 1], "path": [0.155, 0.0257]},
+    "french-bucketed": {"compute": [3.46e-07, 1.17], "operations": [0, 0, 1], "path": [0.155, 0.0257]},
+    "hungarian": {"compute": [1.53e-07, 1.58], "operations": [0, 0, 1], "path": [0.155, 0.0243]},
+    "tetris": {"compute": [3.61e-06, 0.612], "operations": [2.05, 1.27, 0], "path": [0.204, 0.0351]},
+}
+
+
+def cost_features(start: Lattice, target: Lattice):
+    """
+    Counts the number of operations and the path length of plans are about linear in: target sites empty at the start,
+    all target sites and surplus atoms, and the first two times the edge length of the lattice.
+    Counting takes time linear in the number of sites.
+    :param start: (Lattice)
+    :param target: (Lattice)
+    :return: (ndarray) (5, ) features
+    """
+    start_value, target_value = start.value, target.value
+    n_free = np.count_nonzero(np.logical_and(target_value, np.logical_not(start_value)))
+    n_surplus = np.count_nonzero(np.logical_and(start_value, np.logical_not(target_value)))
+    n_target = np.count_nonzero(target_value)
+    length = np.sqrt(start_value.size)
+    return np.array([n_free, n_target, n_surplus, n_free * length, n_target * length], dtype=float)
+
+
+class CostModel:
+    """
+    Predicts for every strategy
+    * compute time [s] as a * n_sites ** b
+    * number of operations (moves and discards) as linear combination of the first three cost_features
+    * path length [sites] as linear combination of the last two cost_features
+    The completion time [µs] follows from the timing of a Frontend.
+    """
+
+    def __init__(self, coefficients: dict = None):
+        """
+
+        :param coefficients: (dict) per strategy name {"compute": [a, b], "operations": [3 weights],
+            "path": [2 weights]}, DEFAULT_COEFFICIENTS if None
+        """
+        self.coefficients = deepcopy(coefficients or DEFAULT_COEFFICIENTS)
+
+    def predict(self, name: str, start: Lattice, target: Lattice, frontend: Frontend):
+        """
+        :param name: (str) strategy
+        :param start: (Lattice)
+        :param target: (Lattice)
+        :param frontend: (Frontend) timing parameters
+        :return: (tuple) compute time [s], completion time [µs]
+        """
+        coefficients = self.coefficients[name]
+        features = cost_features(start, target)
+        a, b = coefficients["compute"]
+        n_operations = np.dot(coefficients["operations"], features[:3])
+        path_length = np.dot(coefficients["path"], features[3:])
+        # Frontend spends a tenth of t_place, see Frontend.compile_timeline
+        completion = n_operations * (frontend.t_pick + frontend.t_place / 10) + \
+            path_length * np.mean(frontend.spacing) / frontend.v_move
+        return a * start.value.size ** b, float(completion)
+
+    def calibrate(self, samples: list, names: list = None, frontend: Frontend = None):
+        """
+        Runs the strategies on samples and fits their coefficients, compile time is excluded
+        :param samples: (list) of (start, target) bool arrays, of several sizes
+        :param names: (list) strategies, all registered if None
+        :param frontend: (Frontend) timing of the completion times in the records, defaults if None
+        :return: (list) of records (name, n_sites, compute time, operations, path length, completion time)
+        """
+        names = names or list(STRATEGIES)
+        frontend = copy(frontend) if frontend else Frontend(spacing=Lattice(samples[0][0]).spacing, plan=Plan())
+        records = []
+        features = [cost_features(Lattice(start), Lattice(target)) for start, target in samples]
+        for name in names:
+            # compile
+            STRATEGIES[name](Lattice(np.copy(samples[0][0])), Lattice(samples[0][1])).run()
+            for start, target in samples:
+                strategy = STRATEGIES[name](Lattice(np.copy(start)), Lattice(target))
+                t = time.perf_counter()
+                plan, end_state = strategy.run()
+                t_compute = time.perf_counter() - t
+                frontend.plan = plan
+                records.append((name, start.size, t_compute, len(plan), strategy.report["path-length"],
+                                completion_time(frontend)))
+        for name in names:
+            n_sites, t_compute, n_operations, path_length, _ = zip(*[_[1:] for _ in records if _[0] == name])
+            b, log_a = np.polyfit(np.log(n_sites), np.log(t_compute), 1)
+            weights_operations, _ = nnls(np.array(features)[:, :3], np.array(n_operations, dtype=float))
+            weights_path, _ = nnls(np.array(features)[:, 3:], np.array(path_length, dtype=float))
+            self.coefficients[name] = {"compute": [float(np.exp(log_a)), float(b)],
+                                       "operations": [float(_) for _ in weights_operations],
+                                       "path": [float(_) for _ in weights_path]}
+        return records
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.coefficients, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+def completion_time(frontend: Frontend):
+    """
+    :param frontend: (Frontend) with a plan
+    :return: (float) end of the timeline [µs]
+    """
+    if not len(frontend.plan):
+        return 0.
+    return float(frontend.parse_plan()[-1, 0])
+
+
+class Auto(StrategyTemplate):
+    """
+    Runs the registered strategy with the lowest predicted compute plus completion time.
+    The decision and the predicted and actual times are in the report, predictions of all candidates in predictions.
+    """
+
+    def __init__(self, start: Lattice, target: Lattice, frontend: Frontend = None, model: CostModel = None,
+                 names: list = None, monitor: bool = True):
+        """
+
+        :param start: (Lattice)
+        :param target: (Lattice)
+        :param frontend: (Frontend) timing parameters of the completion time, defaults if None
+        :param model: (CostModel) default coefficients if None
+        :param names: (list) candidate strategies, all with coefficients if None
+        :param monitor: (bool) compile the timeline of the plan to report the actual completion time
+        """
+        self.start = start
+        self.current_state = start
+        self.target = target
+        self.frontend = frontend or Frontend(spacing=start.spacing, plan=Plan())
+        self.model = model or CostModel()
+        self.names = names or [_ for _ in STRATEGIES if _ in self.model.coefficients]
+        self.monitor = monitor
+        self.plan = Plan()
+        self.report = {}
+        self.predictions = {}
+        # first assert that a possible solution exists
+        assert start.count() >= target.count(), f"Unsolvable {start.count()} sites cannot be sorted" \
+                                                f" to {target.count()} sites"
+
+    def select(self):
+        """
+        :return: (str) name of the strategy with the lowest predicted cost
+        """
+        self.predictions = {name: self.model.predict(name, self.start, self.target, self.frontend)
+                            for name in self.names}
+        return min(self.names, key=lambda name: self.predictions[name][0] * 1e6 + self.predictions[name][1])
+
+    def run(self):
+        name = self.select()
+        strategy = STRATEGIES[name](self.start, self.target)
+        t = time.perf_counter()
+        self.plan, self.current_state = strategy.run()
+        t_compute = time.perf_counter() - t
+        self.report.update(strategy.report)
+        self.report.update({"strategy": name,
+                            "predicted-compute-time": self.predictions[name][0],
+                            "compute-time": t_compute,
+                            "predicted-completion-time": self.predictions[name][1]})
+        if self.monitor:
+            # the frontend of the caller keeps its plan
+            frontend = copy(self.frontend)
+            frontend.plan = self.plan
+            self.report["completion-time"] = completion_time(frontend)
+        return self.plan, self.current_state
@@ -2,14 +2,380 @@
 From Paris
 """
 
+import time
 import numpy as np
 from scipy.spatial import distance
-from numba import njit, types, typeof, typed
+from numba import njit, types
 from uas import Lattice, Plan
-from uas.helper import type_coordinate, type_coordinate_matrix, type_site_matrix
-from . import StrategyTemplate
+from uas.helper import type_coordinate_matrix, type_site_matrix
+from . import StrategyTemplate, register
 
+# French.run(deadline=...) reserves the work left after every phase in multiples of the measured set up time, all
+# of it takes time linear in the number of sites. Measured on 200x200 sites at 50% filling: setting up greedy_queue
+# or improve_queue takes about 1.5 times the set up, applying the plan about 2.5 times, ordering the queue after the
+# last swaps about 0.5 times, reserved with a margin
+SETUP_RESERVE = 1.5
+APPLY_RESERVE = 2.5
+ORDER_RESERVE = 0.75
+# share of the budget kept for local swaps if the greedy queue is not completed, the greedy queue shortens the plan
+# more per time
+IMPROVE_SHARE = 0.1
 
+
+@njit(types.int32[:, :](type_coordinate_matrix, types.int64, types.int64), nogil=True, cache=True)
+def calculate_target_index(target_coordinates, n_0, n_1):
+    """
+    Map from site to index of the target coordinate, -1 if the site is not a target site
+    :param target_coordinates:
+    :param n_0: (int) lattice shape
+    :param n_1: (int) lattice shape
+    :return: (ndarray) index map
+    """
+    target_index = np.full((n_0, n_1), -1, dtype=np.int32)
+    for j in range(target_coordinates.shape[0]):
+        target_index[target_coordinates[j, 0], target_coordinates[j, 1]] = j
+    return target_index
+
+
+@njit(types.int64[:](type_site_matrix, type_site_matrix, type_coordinate_matrix, type_coordinate_matrix),
+      nogil=True, cache=True)
+def rings_cursor(start_visited, target_visited, start_coordinates, target_coordinates):
+    """
+    State of greedy_rings_chunk before the first move
+    :param start_visited: (ndarray) atoms which must not be moved
+    :param target_visited: (ndarray) target sites which must not be filled
+    :param start_coordinates:
+    :param target_coordinates:
+    :return: (ndarray) [distance, position in active, n_active, n_remaining, n_open, active atoms ...]
+    """
+    n_open = 0
+    for j in range(target_coordinates.shape[0]):
+        s_1 = target_coordinates[j]
+        if not target_visited[s_1[0], s_1[1]]:
+            n_open += 1
+    cursor = np.zeros(5 + start_coordinates.shape[0], dtype=np.int64)
+    n_active = 0
+    for i in range(start_coordinates.shape[0]):
+        s_0 = start_coordinates[i]
+        if not start_visited[s_0[0], s_0[1]]:
+            cursor[5 + n_active] = i
+            n_active += 1
+    cursor[2] = n_active
+    cursor[4] = n_open
+    return cursor
+
+
+@njit(type_coordinate_matrix(type_site_matrix, type_site_matrix, type_coordinate_matrix, type_coordinate_matrix,
+                             types.int32[:, :], types.int64[:], types.int64, types.int64), nogil=True, cache=True)
+def greedy_rings_chunk(start_visited, target_visited, start_coordinates, target_coordinates, target_index, cursor,
+                       max_moves, max_scans):
+    """
+    Next moves of greedy_rings, stops after max_moves moves or max_scans ring searches of an atom and continues from
+    cursor on the next call
+    :param start_visited: (ndarray) atoms which must not be moved, changed in place
+    :param target_visited: (ndarray) target sites which must not be filled, changed in place
+    :param start_coordinates:
+    :param target_coordinates:
+    :param target_index: (ndarray) see calculate_target_index
+    :param cursor: (ndarray) see rings_cursor, changed in place
+    :param max_moves: (int) maximal number of moves
+    :param max_scans: (int) maximal number of ring searches
+    :return: (ndarray) (n, 4) queue, empty if done or max_scans is reached before the first move
+    """
+    n_0, n_1 = start_visited.shape
+    d, k, n_active, n_remaining, n_open = cursor[0], cursor[1], cursor[2], cursor[3], cursor[4]
+    active = cursor[5:]
+    queue = np.empty((max(min(max_moves, n_open), 0), 4), dtype=np.int16)
+    n, m = 0, 0
+    while d < n_0 + n_1 - 1 and n < max_moves and m < max_scans:
+        if n_open == 0 or n_active == 0:
+            break
+        while k < n_active and n < max_moves and m < max_scans and n_open > 0:
+            i = active[k]
+            k += 1
+            m += 1
+            x, y = start_coordinates[i, 0], start_coordinates[i, 1]
+            best = -1
+            for dx in range(max(-d, -x), min(d, n_0 - 1 - x) + 1):
+                dy = d - abs(dx)
+                for sign in (-1, 1):
+                    y_1 = y + sign * dy
+                    if 0 <= y_1 < n_1:
+                        j = target_index[x + dx, y_1]
+                        if j >= 0 and not target_visited[x + dx, y_1] and (best < 0 or j < best):
+                            best = j
+                    if dy == 0:
+                        break
+            if best < 0:
+                active[n_remaining] = i
+                n_remaining += 1
+                continue
+            s_1 = target_coordinates[best]
+            start_visited[x, y] = 1
+            target_visited[s_1[0], s_1[1]] = 1
+            queue[n, 0] = x
+            queue[n, 1] = y
+            queue[n, 2:] = s_1
+            n += 1
+            n_open -= 1
+        if k == n_active or n_open == 0:
+            # ring done, atoms without a target site search the next ring
+            n_active = n_remaining
+            n_remaining = 0
+            k = 0
+            d += 1
+    cursor[0], cursor[1], cursor[2], cursor[3], cursor[4] = d, k, n_active, n_remaining, n_open
+    return queue[:n]
+
+
+@njit(type_coordinate_matrix(type_site_matrix, type_site_matrix, type_coordinate_matrix, type_coordinate_matrix,
+                             types.int32[:, :]), nogil=True, cache=True)
+def greedy_rings(start_visited, target_visited, start_coordinates, target_coordinates, target_index):
+    """
+    Greedy queue of moves [origin, target] without a distance matrix.
+    For every distance d each remaining atom (in start order) searches the ring of sites at cityblock distance d
+    and takes the free target site with the lowest index, i.e. pairs are visited in the order of the stable sort
+    of the distance matrix.
+    :param start_visited: (ndarray) atoms which must not be moved, changed in place
+    :param target_visited: (ndarray) target sites which must not be filled, changed in place
+    :param start_coordinates:
+    :param target_coordinates:
+    :param target_index: (ndarray) see calculate_target_index
+    :return: (ndarray) (n, 4) queue
+    """
+    cursor = rings_cursor(start_visited, target_visited, start_coordinates, target_coordinates)
+    n_moves = min(start_coordinates.shape[0], target_coordinates.shape[0])
+    return greedy_rings_chunk(start_visited, target_visited, start_coordinates, target_coordinates, target_index,
+                              cursor, n_moves, np.iinfo(np.int64).max)
+
+
+@njit(type_coordinate_matrix(type_coordinate_matrix, type_site_matrix, type_site_matrix, type_coordinate_matrix,
+                             type_coordinate_matrix, types.int64[:], types.int64), cache=True)
+def scan_distances_chunk(distances, start_visited, target_visited, start_coordinates, target_coordinates, cursor,
+                         max_moves):
+    """
+    Next moves of French.loop_over_distances, stops after max_moves moves and continues from cursor on the next call
+    :param distances: (ndarray) sorted pairs [start index, target index]
+    :param start_visited: (ndarray) changed in place
+    :param target_visited: (ndarray) changed in place
+    :param start_coordinates:
+    :param target_coordinates:
+    :param cursor: (ndarray) (1, ) next pair, changed in place
+    :param max_moves: (int) maximal number of moves
+    :return: (ndarray) (n, 4) queue, empty if done
+    """
+    queue = np.empty((max_moves, 4), dtype=np.int16)
+    n = 0
+    i = cursor[0]
+    while i < distances.shape[0] and n < max_moves:
+        s_0, s_1 = start_coordinates[distances[i, 0]], target_coordinates[distances[i, 1]]
+        i += 1
+        if start_visited[s_0[0], s_0[1]] or target_visited[s_1[0], s_1[1]]:
+            continue
+        start_visited[s_0[0], s_0[1]] = 1
+        target_visited[s_1[0], s_1[1]] = 1
+        queue[n, :2] = s_0
+        queue[n, 2:] = s_1
+        n += 1
+    cursor[0] = i
+    return queue[:n]
+
+
+@njit(types.int32[:, :](type_site_matrix), nogil=True, cache=True)
+def nearest_distances(sources):
+    """
+    Cityblock distance of every site to the closest source site, two raster passes
+    :param sources: (ndarray) source sites
+    :return: (ndarray) distances, n_0 + n_1 if there is no source
+    """
+    n_0, n_1 = sources.shape
+    far = n_0 + n_1
+    distances = np.empty((n_0, n_1), dtype=np.int32)
+    for r in range(n_0):
+        for c in range(n_1):
+            if sources[r, c]:
+                distances[r, c] = 0
+                continue
+            d = far
+            if r > 0:
+                d = min(d, distances[r - 1, c] + 1)
+            if c > 0:
+                d = min(d, distances[r, c - 1] + 1)
+            distances[r, c] = d
+    for r in range(n_0 - 1, -1, -1):
+        for c in range(n_1 - 1, -1, -1):
+            if r < n_0 - 1:
+                distances[r, c] = min(distances[r, c], distances[r + 1, c] + 1)
+            if c < n_1 - 1:
+                distances[r, c] = min(distances[r, c], distances[r, c + 1] + 1)
+    return distances
+
+
+@njit(nogil=True, cache=True)
+def _distance(a_0, a_1, b_0, b_1):
+    return abs(np.int64(a_0) - b_0) + abs(np.int64(a_1) - b_1)
+
+
+@njit(types.boolean(type_coordinate_matrix, type_coordinate_matrix, type_coordinate_matrix, types.int32[:, :],
+                    types.int32[:, :], types.int64, types.int64[:], types.int64), nogil=True, cache=True)
+def swap_chunk(origins, targets, spare, target_index, spare_index, radius, cursor, max_steps):
+    """
+    Local improvement of an assignment of origins to targets, visits the moves one after another and applies the best
+    of: exchanging targets with a move whose target lies close to the origin, exchanging the origin with a spare atom
+    close to the target. Every applied swap shortens the total path length, the assignment stays complete.
+    :param origins: (ndarray) (n, 2) coordinates, changed in place
+    :param targets: (ndarray) (n, 2) coordinates, changed in place
+    :param spare: (ndarray) (m, 2) atoms not moved, changed in place
+    :param target_index: (ndarray) map from site to move targeting it, -1 otherwise, changed in place
+    :param spare_index: (ndarray) map from site to row in spare, -1 otherwise, changed in place
+    :param radius: (int) cityblock search radius
+    :param cursor: (ndarray) [next move, swaps in the current sweep, swaps], changed in place
+    :param max_steps: (int) maximal number of moves visited
+    :return: (bool) True if a whole sweep found no swap, i.e. a local optimum
+    """
+    n = origins.shape[0]
+    n_0, n_1 = target_index.shape
+    if n == 0:
+        return True
+    for _ in range(max_steps):
+        i = cursor[0]
+        o_0, o_1, t_0, t_1 = origins[i, 0], origins[i, 1], targets[i, 0], targets[i, 1]
+        d_i = _distance(o_0, o_1, t_0, t_1)
+        best_gain, best_kind, best = 0, 0, -1
+        for d_0 in range(-radius, radius + 1):
+            for d_1 in range(abs(d_0) - radius, radius - abs(d_0) + 1):
+                # targets close to the origin
+                r, c = o_0 + d_0, o_1 + d_1
+                if 0 <= r < n_0 and 0 <= c < n_1:
+                    j = target_index[r, c]
+                    if j >= 0 and j != i:
+                        gain = d_i + _distance(origins[j, 0], origins[j, 1], r, c) - _distance(o_0, o_1, r, c) - \
+                            _distance(origins[j, 0], origins[j, 1], t_0, t_1)
+                        if gain > best_gain:
+                            best_gain, best_kind, best = gain, 1, j
+                # spare atoms close to the target
+                r, c = t_0 + d_0, t_1 + d_1
+                if 0 <= r < n_0 and 0 <= c < n_1:
+                    k = spare_index[r, c]
+                    if k >= 0:
+                        gain = d_i - _distance(r, c, t_0, t_1)
+                        if gain > best_gain:
+                            best_gain, best_kind, best = gain, 2, k
+        if best_kind == 1:
+            target_index[t_0, t_1] = best
+            target_index[targets[best, 0], targets[best, 1]] = i
+            targets[i, 0], targets[i, 1] = targets[best, 0], targets[best, 1]
+            targets[best, 0], targets[best, 1] = t_0, t_1
+        elif best_kind == 2:
+            spare_index[spare[best, 0], spare[best, 1]] = -1
+            spare_index[o_0, o_1] = best
+            origins[i, 0], origins[i, 1] = spare[best, 0], spare[best, 1]
+            spare[best, 0], spare[best, 1] = o_0, o_1
+        if best_kind:
+            cursor[1] += 1
+            cursor[2] += 1
+        cursor[0] = i + 1
+        if cursor[0] == n:
+            cursor[0] = 0
+            if cursor[1] == 0:
+                return True
+            cursor[1] = 0
+    return False
+
+
+@njit(nogil=True, cache=True, inline="always")
+def _hilbert_site(d, n):
+    # site at position d along the Hilbert curve filling an n x n square
+    x, y = np.int64(0), np.int64(0)
+    s = np.int64(1)
+    while s < n:
+        rx = 1 & (d >> 1)
+        ry = 1 & (d ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - x, s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        d >>= 2
+        s <<= 1
+    return x, y
+
+
+@njit(type_coordinate_matrix(types.int64, types.int64), nogil=True, cache=True)
+def hilbert_sites(n_0, n_1):
+    """
+    :param n_0: (int) lattice shape
+    :param n_1: (int) lattice shape
+    :return: (ndarray) (n_0 * n_1, 2) sites in the order of a Hilbert curve, close positions are close sites
+    """
+    n = 1
+    while n < max(n_0, n_1):
+        n *= 2
+    sites = np.empty((n_0 * n_1, 2), dtype=np.int16)
+    k = 0
+    for d in range(n * n):
+        r, c = _hilbert_site(d, n)
+        if r < n_0 and c < n_1:
+            sites[k, 0], sites[k, 1] = r, c
+            k += 1
+    return sites
+
+
+# sites along the Hilbert curve per lattice shape, see hilbert_curve
+_HILBERT_CURVES = {}
+
+
+def hilbert_curve(shape: tuple):
+    """
+    :param shape: (tuple) lattice shape
+    :return: (ndarray) see hilbert_sites, computed once per shape
+    """
+    shape = tuple(shape)
+    if shape not in _HILBERT_CURVES:
+        _HILBERT_CURVES[shape] = hilbert_sites(*shape)
+    return _HILBERT_CURVES[shape]
+
+
+@njit(type_coordinate_matrix(type_site_matrix, type_site_matrix, type_coordinate_matrix), nogil=True, cache=True)
+def curve_matching(atoms, targets, curve):
+    """
+    Fills every target with an atom close along a Hilbert curve: walking the curve, an atom and a target site meeting
+    on top of a stack of unmatched sites are paired, as brackets. Needs at least as many atoms as targets, takes time
+    linear in the number of sites.
+    :param atoms: (ndarray) sites with an atom to move
+    :param targets: (ndarray) target sites to fill
+    :param curve: (ndarray) all sites in curve order, see hilbert_curve
+    :return: (ndarray) (m, 4) queue
+    """
+    stack = np.empty((curve.shape[0], 2), dtype=np.int16)
+    stack_atom = np.empty(curve.shape[0], dtype=np.bool_)
+    depth = 0
+    queue = np.empty((curve.shape[0], 4), dtype=np.int16)
+    n_queue = 0
+    for k in range(curve.shape[0]):
+        r, c = curve[k, 0], curve[k, 1]
+        is_atom, is_target = atoms[r, c], targets[r, c]
+        if is_atom == is_target:
+            continue
+        if depth and stack_atom[depth - 1] != is_atom:
+            depth -= 1
+            if is_atom:
+                queue[n_queue, 0], queue[n_queue, 1] = r, c
+                queue[n_queue, 2], queue[n_queue, 3] = stack[depth, 0], stack[depth, 1]
+            else:
+                queue[n_queue, 0], queue[n_queue, 1] = stack[depth, 0], stack[depth, 1]
+                queue[n_queue, 2], queue[n_queue, 3] = r, c
+            n_queue += 1
+        else:
+            stack[depth, 0], stack[depth, 1] = r, c
+            stack_atom[depth] = is_atom
+            depth += 1
+    return queue[:n_queue]
+
+
+@register("french")
+@register("french-bucketed", mode="bucketed")
 class French(StrategyTemplate):
     """
     src: Sylvain de Léséleuc (2018) - Quantum simulation of spin models with assembled arrays of Rydberg atoms, pp. 51
@@ -17,17 +383,36 @@ class French(StrategyTemplate):
     * calculate distances
     * sort distances
     * calculate moves
+    Modes:
+    * dense: sort the full start x target distance matrix, memory grows with the product of the number of sites
+    * bucketed: visit the same pairs in the same order by searching rings of growing cityblock distance around
+      every atom, memory grows with the number of sites
     """
+    modes = ("dense", "bucketed")
+
+    def __init__(self, start: Lattice, target: Lattice, mode: str = "dense", cache: bool = False):
+        """
 
-    def __init__(self, start: Lattice, target: Lattice):
+        :param start: (Lattice) changed in place
+        :param target: (Lattice)
+        :param mode: (str) one of modes
+        :param cache: (bool) keep the start state and sorted distances (dense mode) of run for re-planning,
+            see uas.strategy.replan.Replanner
+        """
+        assert mode in self.modes, f"Unknown mode {mode}, use one of {self.modes}"
+        self.mode = mode
         self.start = start
         self.current_state = start
         self.target = target
         self.plan = Plan()
         self.report = {}
+        self.cache = cache
+        self.start_value = None
+        self.start_coordinates = None
+        self.distances = None
         # first assert that a possible solution exists
-        assert np.sum(start.value) >= np.sum(target.value), f"Unsolvable {np.sum(start.value)} sites cannot be sorted" \
-                                                            f" to {np.sum(target.value)} sites"
+        assert start.count() >= target.count(), f"Unsolvable {start.count()} sites cannot be sorted" \
+                                                f" to {target.count()} sites"
 
     @staticmethod
     def calculate_distances(start_coordinates, target_coordinates):
@@ -39,18 +424,19 @@ class French(StrategyTemplate):
         """
         dist = distance.cdist(start_coordinates, target_coordinates, 'cityblock').astype(np.int16)
         # dist_sorted = np.argsort(dist.flatten())  # use in case this will be jit-ed
-        dist_sorted = np.argsort(dist, axis=None)
+        # stable: equal distances are ordered by start index, then target index
+        dist_sorted = np.argsort(dist, axis=None, kind="stable")
         # https://stackoverflow.com/questions/29734660/python-numpy-keep-a-list-of-indices-of-a-sorted-2d-array
         coordinates_sorted = np.vstack(np.unravel_index(dist_sorted, dist.shape)).T
         out = coordinates_sorted.astype(np.int16)
         return out
 
     @staticmethod
-    @njit((types.ListType(type_coordinate))(type_coordinate_matrix, type_site_matrix, type_site_matrix,
-                                            type_coordinate_matrix, type_coordinate_matrix))
+    @njit(type_coordinate_matrix(type_coordinate_matrix, type_site_matrix, type_site_matrix,
+                                 type_coordinate_matrix, type_coordinate_matrix), cache=True)
     def loop_over_distances(distances, start_visited, target_visited, start_coordinates, target_coordinates):
         """
-        Loop over sorted distances between start and target, build list
+        Loop over sorted distances between start and target, build queue of moves [origin, target] with shape (n, 4)
         This loop is offloaded into a static function to make it jit-compatible
         :param distances:
         :param start_visited:
@@ -59,7 +445,8 @@ class French(StrategyTemplate):
         :param target_coordinates:
         :return:
         """
-        queue = typed.List.empty_list(type_coordinate)
+        queue = np.empty((min(start_coordinates.shape[0], target_coordinates.shape[0]), 4), dtype=np.int16)
+        n = 0
         for coord in distances:
             s_0, s_1 = start_coordinates[coord[0]], target_coordinates[coord[1]]
             if start_visited[s_0[0], s_0[1]] or target_visited[s_1[0], s_1[1]]:
@@ -67,29 +454,242 @@ class French(StrategyTemplate):
                 continue
             start_visited[s_0[0], s_0[1]] = 1
             target_visited[s_1[0], s_1[1]] = 1
-            queue.append(np.append(s_0, s_1))
-        return queue
+            queue[n, :2] = s_0
+            queue[n, 2:] = s_1
+            n += 1
+        return queue[:n]
+
+    @staticmethod
+    @njit(type_coordinate_matrix(type_site_matrix, type_site_matrix, type_coordinate_matrix,
+                                 type_coordinate_matrix), cache=True)
+    def loop_over_rings(start_visited, target_visited, start_coordinates, target_coordinates):
+        """
+        Same queue as loop_over_distances without the distance matrix, see greedy_rings
+        :param start_visited:
+        :param target_visited:
+        :param start_coordinates:
+        :param target_coordinates:
+        :return:
+        """
+        target_index = calculate_target_index(target_coordinates, start_visited.shape[0], start_visited.shape[1])
+        return greedy_rings(start_visited, target_visited, start_coordinates, target_coordinates, target_index)
+
+    def calculate_queue(self, start_visited, target_visited):
+        """
+        Greedy queue of moves [origin, target] in order of increasing distance, computed according to mode
+        :param start_visited:
+        :param target_visited:
+        :return: (ndarray) (n, 4) queue
+        """
+        if self.mode == "bucketed":
+            return self.loop_over_rings(start_visited, target_visited, self.start.coordinates, self.target.coordinates)
+        distances = self.calculate_distances(self.start.coordinates, self.target.coordinates)
+        if self.cache:
+            self.distances = distances
+        return self.loop_over_distances(distances, start_visited, target_visited,
+                                        self.start.coordinates, self.target.coordinates)
+
+    def iter_queue(self, start_visited, target_visited, chunk_size: int = 256):
+        """
+        Same queue as calculate_queue in chunks, computed only as far as it is consumed
+        :param start_visited:
+        :param target_visited:
+        :param chunk_size: (int) moves per chunk
+        :return: (generator) of (ndarray) (n, 4) queue chunks
+        """
+        # the indices of the pairs refer to these arrays, Lattice does not change them while iter_moves moves atoms
+        start_coordinates, target_coordinates = self.start.coordinates, self.target.coordinates
+        if self.mode == "bucketed":
+            target_index = calculate_target_index(target_coordinates, *start_visited.shape)
+            cursor = rings_cursor(start_visited, target_visited, start_coordinates, target_coordinates)
+            next_chunk = lambda: greedy_rings_chunk(start_visited, target_visited, start_coordinates,
+                                                    target_coordinates, target_index, cursor, chunk_size,
+                                                    np.iinfo(np.int64).max)
+        else:
+            distances = self.calculate_distances(start_coordinates, target_coordinates)
+            cursor = np.zeros(1, dtype=np.int64)
+            next_chunk = lambda: scan_distances_chunk(distances, start_visited, target_visited, start_coordinates,
+                                                      target_coordinates, cursor, chunk_size)
+        queue = next_chunk()
+        while queue.shape[0]:
+            yield queue
+            queue = next_chunk()
 
-    def run(self):
+    def iter_moves(self, chunk_size: int = 256):
+        """
+        Yields the moves of run one by one while they are computed, plan, current state and report are updated
+        along the way and equal those of run once the generator is exhausted
+        :param chunk_size: (int) moves computed at once
+        :return: (generator) of Move
+        """
+        start_visited = np.zeros_like(self.start.value, dtype=bool)
+        start_visited[np.logical_and(self.start.value, self.target.value)] = 1
+        target_visited = np.copy(start_visited)
+        path_length = 0
+        for queue in self.iter_queue(start_visited, target_visited, chunk_size):
+            n = len(self.plan)
+            self.plan.add_moves(origins=queue[:, :2], targets=queue[:, 2:])
+            self.current_state.move_many(origins=queue[:, :2], targets=queue[:, 2:])
+            path_length += int(np.sum(np.abs(queue[:, :2].astype(np.int32) - queue[:, 2:])))
+            yield from self.plan[n:]
+        remainder = self.current_state.andnot(self.target)
+        self.report.update({"site-moves": len(self.plan),
+                            "discard-moves": remainder.coordinates.shape[0],
+                            "path-length": path_length})
+        n = len(self.plan)
+        self.plan.add_discards(origins=remainder.coordinates)
+        self.current_state.discard_many(origins=remainder.coordinates)
+        yield from self.plan[n:]
+
+    def improve_queue(self, queue: np.ndarray, deadline: float, radius: int = 3, max_radius: int = 64):
+        """
+        Shortens the total path length of a queue by local swaps until the deadline or a local optimum, see swap_chunk.
+        Swaps are computed in chunks sized to the remaining time, the search radius is doubled up to max_radius at
+        every local optimum reached before the deadline.
+        :param queue: (ndarray) (n, 4) queue, changed in place
+        :param deadline: (float) time.perf_counter() to stop at
+        :param radius: (int) first cityblock search radius of swaps
+        :param max_radius: (int) largest cityblock search radius of swaps
+        :return: (tuple) queue ordered by increasing distance, number of swaps, True if a local optimum of the
+            largest radius is reached
+        """
+        start_value, target_value = self.start.value, self.target.value
+        origins, targets = np.ascontiguousarray(queue[:, :2]), np.ascontiguousarray(queue[:, 2:])
+        target_index = np.full(start_value.shape, -1, dtype=np.int32)
+        target_index[targets[:, 0], targets[:, 1]] = np.arange(targets.shape[0], dtype=np.int32)
+        unused = np.logical_and(start_value, np.logical_not(target_value))
+        unused[origins[:, 0], origins[:, 1]] = False
+        spare = np.argwhere(unused).astype(np.int16)
+        spare_index = np.full(start_value.shape, -1, dtype=np.int32)
+        spare_index[spare[:, 0], spare[:, 1]] = np.arange(spare.shape[0], dtype=np.int32)
+        cursor = np.zeros(3, dtype=np.int64)
+        steps, converged = 16, False
+        while not converged:
+            t = time.perf_counter()
+            if t >= deadline:
+                break
+            converged = swap_chunk(origins, targets, spare, target_index, spare_index, radius, cursor, steps)
+            # next chunk fills a quarter of the remaining time, steps vary in time with the number of close atoms
+            t_step = (time.perf_counter() - t) / steps
+            steps = int(min(max(0.25 * (deadline - time.perf_counter()) / max(t_step, 1e-9), 16), 1 << 20))
+            if converged and radius < max_radius:
+                # the last chunk stopped early, measure the steps of the larger radius anew
+                radius, converged, steps = min(2 * radius, max_radius), False, 16
+                cursor[0], cursor[1] = 0, 0
+        queue = np.concatenate((origins, targets), axis=1)
+        if cursor[2]:
+            # shortest moves first, as the greedy queue
+            lengths = np.sum(np.abs(origins.astype(np.int32) - targets), axis=1)
+            queue = queue[np.argsort(lengths, kind="stable")]
+        return queue, int(cursor[2]), converged
+
+    def greedy_queue(self, start_visited, target_visited, deadline: float):
+        """
+        Greedy queue computed in chunks (as the bucketed mode, the same queue for both modes) until the deadline.
+        If the deadline passes first, the remaining target sites are filled by close atoms along a Hilbert curve,
+        see curve_matching, a rough but complete assignment.
+        Chunks are bounded by ring searches sized to the remaining time, a search takes longer the larger the ring.
+        :param start_visited: (ndarray) changed in place
+        :param target_visited: (ndarray) changed in place
+        :param deadline: (float) time.perf_counter() to stop the greedy queue at
+        :return: (tuple) (n, 4) queue, True if the greedy queue was completed
+        """
+        start_coordinates, target_coordinates = self.start.coordinates, self.target.coordinates
+        target_index = calculate_target_index(target_coordinates, *start_visited.shape)
+        cursor = rings_cursor(start_visited, target_visited, start_coordinates, target_coordinates)
+        n_moves = min(start_coordinates.shape[0], target_coordinates.shape[0])
+        chunks = [np.zeros((0, 4), dtype=np.int16)]
+        scans = 256
+        while True:
+            t = time.perf_counter()
+            if t >= deadline:
+                break
+            queue = greedy_rings_chunk(start_visited, target_visited, start_coordinates, target_coordinates,
+                                       target_index, cursor, n_moves, scans)
+            if cursor[4] == 0 or cursor[2] == 0 or cursor[0] >= sum(start_visited.shape) - 1:
+                chunks.append(queue)
+                return np.concatenate(chunks), True
+            chunks.append(queue)
+            # next chunk fills a quarter of the remaining time
+            t_scan = (time.perf_counter() - t) / scans
+            scans = int(min(max(0.25 * (deadline - time.perf_counter()) / max(t_scan, 1e-9), 256), 1 << 24))
+        chunks.append(self.rough_queue(start_visited, target_visited))
+        return np.concatenate(chunks), False
+
+    def rough_queue(self, start_visited, target_visited):
+        """
+        Fills the target sites not visited with atoms not visited, see curve_matching
+        :param start_visited:
+        :param target_visited:
+        :return: (ndarray) (n, 4) queue
+        """
+        return curve_matching(np.logical_and(self.start.value, np.logical_not(start_visited)),
+                              np.logical_and(self.target.value, np.logical_not(target_visited)),
+                              hilbert_curve(start_visited.shape))
+
+    def lower_bound(self):
+        """
+        Lower bound of the total path length: every empty target site is filled from the closest free atom
+        :return: (int) path length
+        """
+        free_start = np.logical_and(self.start.value, np.logical_not(self.target.value))
+        free_target = np.logical_and(self.target.value, np.logical_not(self.start.value))
+        return int(np.sum(nearest_distances(free_start)[free_target]))
+
+    def run(self, deadline: float = None):
+        """
+        :param deadline: (float) time.perf_counter() the plan is due. A rough complete queue is computed first, see
+            rough_queue, then the greedy queue as far as the budget allows, see greedy_queue, the remaining time is
+            spent on local swaps, see improve_queue. The time to complete the greedy queue roughly and to apply the
+            plan is measured and reserved, latency exceeds the deadline only if these alone exceed the budget.
+        :return: (tuple) plan, end state
+        """
+        t_start = time.perf_counter()
         # mark already sorted sites
         start_visited = np.zeros_like(self.start.value, dtype=bool)
         start_visited[np.logical_and(self.start.value, self.target.value)] = 1
         target_visited = np.copy(start_visited)
-        distances = self.calculate_distances(self.start.coordinates, self.target.coordinates)
-        queue = self.loop_over_distances(distances, start_visited, target_visited,
-                                         self.start.coordinates, self.target.coordinates)
-        for coord in queue:
-            s_0 = coord[:2]
-            s_1 = coord[2:]
-            # add a move to the plan
-            self.plan.add_move(origin=s_0, target=s_1)
-            self.current_state.move(origin=s_0, target=s_1)
+        if self.cache:
+            self.start_value = np.copy(self.start.value)
+            self.start_coordinates = np.copy(self.start.coordinates)
+        if deadline is None:
+            queue = self.calculate_queue(start_visited, target_visited)
+        else:
+            lower_bound = self.lower_bound()
+            t = time.perf_counter()
+            rough = self.rough_queue(start_visited, target_visited)
+            t_rough = time.perf_counter() - t
+            # the reserves are multiples of the set up so far, see SETUP_RESERVE
+            t_sites = t - t_start
+            t_setup = SETUP_RESERVE * t_sites
+            t_improve = deadline - (APPLY_RESERVE + ORDER_RESERVE) * t_sites
+            # greedy stops in time to complete its queue roughly, improve it and apply the plan
+            stop = t_improve - t_rough - t_setup - IMPROVE_SHARE * (deadline - t_start)
+            queue, greedy = rough, False
+            if time.perf_counter() + t_setup < stop:
+                queue, greedy = self.greedy_queue(start_visited, target_visited, stop)
+            path_length = int(np.sum(np.abs(queue[:, :2].astype(np.int32) - queue[:, 2:])))
+            n_swaps, converged = 0, False
+            if time.perf_counter() + t_setup < t_improve:
+                queue, n_swaps, converged = self.improve_queue(queue, t_improve)
+        # add all moves to the plan at once, origins and targets are disjoint by construction
+        self.plan.add_moves(origins=queue[:, :2], targets=queue[:, 2:])
+        self.current_state.move_many(origins=queue[:, :2], targets=queue[:, 2:])
         # drop left over atoms
-        remainder = Lattice(np.logical_and(self.current_state.value, np.logical_not(self.target.value)),
-                            spacing=self.current_state.spacing)
+        remainder = self.current_state.andnot(self.target)
         self.report.update({"site-moves": len(self.plan),
-                            "discard-moves": remainder.coordinates.shape[0]})
-        for to_discard in remainder.coordinates:
-            self.plan.add_discard(origin=to_discard)
-            self.current_state.discard(origin=to_discard)
+                            "discard-moves": remainder.coordinates.shape[0],
+                            "path-length": int(np.sum(np.abs(queue[:, :2].astype(np.int32) - queue[:, 2:])))})
+        self.plan.add_discards(origins=remainder.coordinates)
+        self.current_state.discard_many(origins=remainder.coordinates)
+        if deadline is not None:
+            t_end = time.perf_counter()
+            self.report.update({"greedy-completed": greedy,
+                                "initial-path-length": path_length,
+                                "swaps": n_swaps,
+                                "converged": converged,
+                                "compute-time": t_end - t_start,
+                                "budget-used": (t_end - t_start) / max(deadline - t_start, 1e-9),
+                                "lower-bound": lower_bound,
+                                "gap": self.report["path-length"] / max(lower_bound, 1) - 1})
         return self.plan, self.current_state
@@ -0,0 +1,223 @@
+"""
+Minimal total distance
+"""
+
+import heapq
+import numpy as np
+from numba import njit
+from uas import Lattice, Plan
+from uas.helper import type_coordinate_matrix, type_site_matrix
+from . import StrategyTemplate, register
+
+# neighbours on the grid: down, up, right, left
+STEPS = np.array(((1, 0), (-1, 0), (0, 1), (0, -1)), dtype=np.int64)
+
+
+@njit(fastmath=True, cache=True)
+def _edge_cost(flow_v, flow_h, r, c, direction):
+    """
+    Cost of sending one unit from site (r, c) in direction, -1 if it cancels flow in the opposite direction
+    """
+    if direction == 0:
+        return -1 if flow_v[r, c] < 0 else 1
+    elif direction == 1:
+        return -1 if flow_v[r - 1, c] > 0 else 1
+    elif direction == 2:
+        return -1 if flow_h[r, c] < 0 else 1
+    else:
+        return -1 if flow_h[r, c - 1] > 0 else 1
+
+
+@njit(fastmath=True, cache=True)
+def _push(flow_v, flow_h, r, c, direction):
+    """
+    Sends one unit from site (r, c) in direction
+    """
+    if direction == 0:
+        flow_v[r, c] += 1
+    elif direction == 1:
+        flow_v[r - 1, c] -= 1
+    elif direction == 2:
+        flow_h[r, c] += 1
+    else:
+        flow_h[r, c - 1] -= 1
+
+
+@njit(type_coordinate_matrix(type_site_matrix, type_site_matrix), fastmath=True, cache=True)
+def min_cost_assignment(sources, sinks):
+    """
+    Assigns every sink site to a source site with minimal total cityblock distance.
+    Cityblock distances are shortest paths on the grid, so the assignment is a min cost flow on the grid graph
+    which only needs O(sites) memory. Solved with the primal-dual (Hungarian) method: Dijkstra on reduced costs
+    followed by augmentations along all zero reduced cost paths, then decomposed into single moves.
+    :param sources: (ndarray) sites with an atom to move, at least as many as sinks
+    :param sinks: (ndarray) sites to be filled, disjoint from sources
+    :return: (ndarray) (n, 4) moves [origin, target]
+    """
+    n_0, n_1 = sources.shape
+    n_sites = n_0 * n_1
+    flow_v = np.zeros((n_0, n_1), dtype=np.int32)
+    flow_h = np.zeros((n_0, n_1), dtype=np.int32)
+    potential = np.zeros(n_sites, dtype=np.int64)
+    potential_sink = 0
+    supply = sources.ravel().copy()
+    demand = sinks.ravel().copy()
+    remaining = np.sum(demand)
+    n_moves = remaining
+    infinity = np.iinfo(np.int64).max // 4
+    distance = np.empty(n_sites, dtype=np.int64)
+    dead = np.zeros(n_sites, dtype=np.bool_)
+    on_stack = np.zeros(n_sites, dtype=np.bool_)
+    stack = np.empty(n_sites, dtype=np.int64)
+    next_step = np.zeros(n_sites, dtype=np.int64)
+    while remaining > 0:
+        # dijkstra on reduced costs from all sources with supply left
+        distance[:] = infinity
+        heap = [(np.int64(0), np.int64(0))]
+        heap.pop()
+        for v in range(n_sites):
+            if supply[v]:
+                distance[v] = -potential[v]
+                heapq.heappush(heap, (distance[v], np.int64(v)))
+        while len(heap):
+            d, v = heapq.heappop(heap)
+            if d > distance[v]:
+                continue
+            r, c = v // n_1, v % n_1
+            for direction in range(4):
+                r_w, c_w = r + STEPS[direction, 0], c + STEPS[direction, 1]
+                if r_w < 0 or r_w >= n_0 or c_w < 0 or c_w >= n_1:
+                    continue
+                w = r_w * n_1 + c_w
+                d_w = d + _edge_cost(flow_v, flow_h, r, c, direction) + potential[v] - potential[w]
+                if d_w < distance[w]:
+                    distance[w] = d_w
+                    heapq.heappush(heap, (d_w, w))
+        d_sink = infinity
+        for v in range(n_sites):
+            if demand[v] and distance[v] < infinity:
+                d_sink = min(d_sink, distance[v] + potential[v] - potential_sink)
+        for v in range(n_sites):
+            potential[v] += min(distance[v], d_sink)
+        potential_sink += d_sink
+        # augment along zero reduced cost paths
+        dead[:] = False
+        for a in range(n_sites):
+            while supply[a] and potential[a] == 0 and not dead[a] and remaining > 0:
+                depth = 0
+                stack[0] = a
+                next_step[a] = 0
+                on_stack[a] = True
+                found = False
+                while depth >= 0:
+                    v = stack[depth]
+                    if demand[v] and potential[v] == potential_sink:
+                        found = True
+                        break
+                    r, c = v // n_1, v % n_1
+                    advanced = False
+                    while next_step[v] < 4:
+                        direction = next_step[v]
+                        next_step[v] += 1
+                        r_w, c_w = r + STEPS[direction, 0], c + STEPS[direction, 1]
+                        if r_w < 0 or r_w >= n_0 or c_w < 0 or c_w >= n_1:
+                            continue
+                        w = r_w * n_1 + c_w
+                        if dead[w] or on_stack[w]:
+                            continue
+                        if _edge_cost(flow_v, flow_h, r, c, direction) + potential[v] - potential[w] != 0:
+                            continue
+                        depth += 1
+                        stack[depth] = w
+                        next_step[w] = 0
+                        on_stack[w] = True
+                        advanced = True
+                        break
+                    if not advanced:
+                        dead[v] = True
+                        on_stack[v] = False
+                        depth -= 1
+                if not found:
+                    break
+                # send one unit along the stack
+                for i in range(depth):
+                    v, w = stack[i], stack[i + 1]
+                    r, c = v // n_1, v % n_1
+                    for direction in range(4):
+                        if (r + STEPS[direction, 0]) * n_1 + c + STEPS[direction, 1] == w:
+                            _push(flow_v, flow_h, r, c, direction)
+                            break
+                for i in range(depth + 1):
+                    on_stack[stack[i]] = False
+                supply[a] -= 1
+                demand[stack[depth]] -= 1
+                remaining -= 1
+    # decompose the flow into moves
+    moves = np.empty((n_moves, 4), dtype=np.int16)
+    absorb = sinks.ravel().copy()
+    n = 0
+    for a in range(n_sites):
+        if not sources.ravel()[a] or supply[a]:
+            continue
+        r, c = a // n_1, a % n_1
+        while not absorb[r * n_1 + c]:
+            if r + 1 < n_0 and flow_v[r, c] > 0:
+                flow_v[r, c] -= 1
+                r += 1
+            elif r > 0 and flow_v[r - 1, c] < 0:
+                flow_v[r - 1, c] += 1
+                r -= 1
+            elif c + 1 < n_1 and flow_h[r, c] > 0:
+                flow_h[r, c] -= 1
+                c += 1
+            else:
+                flow_h[r, c - 1] += 1
+                c -= 1
+        absorb[r * n_1 + c] = False
+        moves[n, 0] = a // n_1
+        moves[n, 1] = a % n_1
+        moves[n, 2] = r
+        moves[n, 3] = c
+        n += 1
+    return moves[:n]
+
+
+@register("hungarian")
+class Hungarian(StrategyTemplate):
+    """
+    Assigns atoms to target sites with minimal total (cityblock) path length.
+    Instead of a dense start x target distance matrix the assignment is solved as min cost flow on the lattice
+    itself, see min_cost_assignment.
+    * calculate free atoms and free target sites
+    * solve assignment
+    * calculate moves
+    """
+
+    def __init__(self, start: Lattice, target: Lattice):
+        self.start = start
+        self.current_state = start
+        self.target = target
+        self.plan = Plan()
+        self.report = {}
+        # first assert that a possible solution exists
+        assert start.count() >= target.count(), f"Unsolvable {start.count()} sites cannot be sorted" \
+                                                f" to {target.count()} sites"
+
+    def run(self):
+        # sites which are already sorted do not need to be touched
+        free_start = np.logical_and(self.start.value, np.logical_not(self.target.value))
+        free_target = np.logical_and(self.target.value, np.logical_not(self.start.value))
+        queue = min_cost_assignment(free_start, free_target)
+        # shortest moves first, as French does
+        lengths = np.sum(np.abs(queue[:, :2].astype(np.int32) - queue[:, 2:]), axis=1)
+        queue = queue[np.argsort(lengths, kind="stable")]
+        self.plan.add_moves(origins=queue[:, :2], targets=queue[:, 2:])
+        self.current_state.move_many(origins=queue[:, :2], targets=queue[:, 2:])
+        # drop left over atoms
+        remainder = self.current_state.andnot(self.target)
+        self.report.update({"site-moves": len(self.plan),
+                            "discard-moves": remainder.coordinates.shape[0],
+                            "path-length": int(np.sum(lengths))})
+        self.plan.add_discards(origins=remainder.coordinates)
+        self.current_state.discard_many(origins=remainder.coordinates)
+        return self.plan, self.current_state
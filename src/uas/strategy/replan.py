@@ -0,0 +1,204 @@
+"""
+Repairs plans after atoms are lost or appear during sorting
+"""
+
+import numpy as np
+from numba import njit, types
+from scipy.spatial import distance
+from uas import Plan
+from uas.lattice import apply_deltas
+from uas.helper import type_coordinate_matrix, type_site_matrix
+from .french import French, calculate_target_index, greedy_rings, nearest_distances
+
+
+@njit(types.int64(type_coordinate_matrix, type_coordinate_matrix, type_coordinate_matrix, types.int64),
+      nogil=True, cache=True)
+def first_pair(distances, start_coordinates, target_coordinates, d):
+    """
+    Binary search in the sorted pairs
+    :param distances: (ndarray) sorted pairs [start index, target index], see French.calculate_distances
+    :param start_coordinates: (ndarray) start coordinates the pairs refer to
+    :param target_coordinates: (ndarray) target coordinates the pairs refer to
+    :param d: (int) cityblock distance
+    :return: (int) index of the first pair at distance d or more
+    """
+    low, high = 0, distances.shape[0]
+    while low < high:
+        middle = (low + high) // 2
+        s, t = start_coordinates[distances[middle, 0]], target_coordinates[distances[middle, 1]]
+        if abs(np.int64(s[0]) - t[0]) + abs(np.int64(s[1]) - t[1]) < d:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+@njit(types.int64(type_coordinate_matrix, type_coordinate_matrix, type_coordinate_matrix, type_coordinate_matrix,
+                  type_site_matrix, type_site_matrix, types.int64, types.int64, type_coordinate_matrix,
+                  types.int64[:]), nogil=True, cache=True)
+def scan_repairs(distances, start_coordinates, target_coordinates, candidates, spare, open_sites, n_open, d_min,
+                 queue, scanned):
+    """
+    Greedy fill of open target sites with spare atoms in order of increasing distance. Merges the cached sorted pairs
+    of French with sorted candidate pairs of atoms not in the start coordinates, ties go to the cached pairs.
+    The scan starts at the closest spare atom to any open site and stops as soon as every open site is filled.
+    :param distances: (ndarray) sorted pairs [start index, target index], see French.calculate_distances
+    :param start_coordinates: (ndarray) start coordinates the pairs refer to
+    :param target_coordinates: (ndarray) target coordinates the pairs refer to
+    :param candidates: (ndarray) (k, 4) further pairs [origin, target] sorted by distance
+    :param spare: (ndarray) sites with an atom to move, changed in place
+    :param open_sites: (ndarray) target sites to fill, changed in place
+    :param n_open: (int) number of open sites
+    :param d_min: (int) lower bound of the distance between spare atoms and open sites
+    :param queue: (ndarray) (n_open, 4) moves [origin, target], changed in place
+    :param scanned: (ndarray) (2, ) number of scanned pairs and candidates, changed in place
+    :return: (int) number of moves
+    """
+    i = first_pair(distances, start_coordinates, target_coordinates, d_min)
+    i_start, k, n = i, 0, 0
+    while n < n_open and (i < distances.shape[0] or k < candidates.shape[0]):
+        use_cached = k == candidates.shape[0]
+        if not use_cached and i < distances.shape[0]:
+            s, t = start_coordinates[distances[i, 0]], target_coordinates[distances[i, 1]]
+            d_cached = abs(np.int64(s[0]) - t[0]) + abs(np.int64(s[1]) - t[1])
+            d_candidate = abs(np.int64(candidates[k, 0]) - candidates[k, 2]) + \
+                abs(np.int64(candidates[k, 1]) - candidates[k, 3])
+            use_cached = d_cached <= d_candidate
+        if use_cached:
+            s, t = start_coordinates[distances[i, 0]], target_coordinates[distances[i, 1]]
+            i += 1
+        else:
+            s, t = candidates[k, :2], candidates[k, 2:]
+            k += 1
+        if not spare[s[0], s[1]] or not open_sites[t[0], t[1]]:
+            continue
+        spare[s[0], s[1]] = 0
+        open_sites[t[0], t[1]] = 0
+        queue[n, :2] = s
+        queue[n, 2:] = t
+        n += 1
+    scanned[0] += i - i_start
+    scanned[1] += k
+    return n
+
+
+class Replanner:
+    """
+    Keeps the plan of a French run valid while it is executed.
+    After atoms are lost (or appear) the pending moves which still have an atom and an empty target are kept, only
+    the target sites left empty are filled anew from the spare atoms, greedy as French. Either the cached sorted
+    distances of French(mode="dense", cache=True) are scanned from the closest spare atom on until every empty site
+    is filled, or the rings around the empty sites are searched. Few empty sites far from spare atoms favour rings,
+    the scan passes all pairs of shorter distance.
+    """
+
+    def __init__(self, strategy: French, scan: bool = None):
+        """
+
+        :param strategy: (French) after run with cache=True
+        :param scan: (bool) fill from the cached sorted distances (True) or search rings (False), the one with fewer
+            estimated steps if None
+        """
+        assert strategy.start_value is not None, "Run French with cache=True to re-plan"
+        assert not scan or strategy.distances is not None, "Scan needs the sorted distances of French(mode=\"dense\")"
+        self.strategy = strategy
+        self.scan = scan
+        self.target = strategy.target.value
+        self.plan = strategy.plan
+        # occupation after the first executed steps of plan
+        self.state = np.copy(strategy.start_value)
+        self.executed = 0
+        # sites the cached start coordinates refer to, atoms elsewhere are not in the cached pairs
+        self.cached_sites = np.copy(strategy.start_value)
+        self.report = {}
+
+    def advance(self, progress: int):
+        """
+        Applies the steps of the plan up to progress to the state
+        :param progress: (int) number of executed steps
+        :return:
+        """
+        assert self.executed <= progress <= len(self.plan), f"Progress {progress} is out of range"
+        steps = self.plan[self.executed:progress]
+        filled = np.where(steps.discards[:, np.newaxis], -1, steps.targets).astype(np.int16)
+        apply_deltas(self.state, np.ascontiguousarray(steps.origins), filled)
+        self.executed = progress
+
+    def fill(self, spare: np.ndarray, open_sites: np.ndarray):
+        """
+        Greedy moves from spare atoms into open target sites
+        :param spare: (ndarray) sites with an atom to move, changed in place
+        :param open_sites: (ndarray) target sites to fill, changed in place
+        :return: (ndarray) (n, 4) moves [origin, target]
+        """
+        n_open = np.count_nonzero(open_sites)
+        strategy = self.strategy
+        # distances from open sites to their closest spare atom bound the distances the greedy fill starts and ends with
+        nearest = nearest_distances(spare)[open_sites]
+        d_min, d_max = int(np.min(nearest, initial=sum(spare.shape))), int(np.max(nearest, initial=0))
+        scan = self.scan
+        if scan is None and strategy.distances is not None:
+            n_pairs = first_pair(strategy.distances, strategy.start_coordinates, strategy.target.coordinates,
+                                 d_max + 1) - \
+                first_pair(strategy.distances, strategy.start_coordinates, strategy.target.coordinates, d_min)
+            # every ring search visits about 2 d ** 2 sites, preparing it visits every site
+            scan = n_pairs < n_open * 2 * (d_max + 1) ** 2 + spare.size
+        if scan:
+            # atoms which are not in the cached pairs
+            extra = np.argwhere(np.logical_and(spare, np.logical_not(self.cached_sites))).astype(np.int16)
+            targets = np.argwhere(open_sites).astype(np.int16)
+            pairs = distance.cdist(extra, targets, "cityblock")
+            order = np.argsort(pairs, axis=None, kind="stable")
+            candidates = np.concatenate((extra[order // targets.shape[0]], targets[order % targets.shape[0]]),
+                                        axis=1).astype(np.int16)
+            queue = np.empty((n_open, 4), dtype=np.int16)
+            scanned = np.zeros(2, dtype=np.int64)
+            n = scan_repairs(strategy.distances, strategy.start_coordinates, strategy.target.coordinates,
+                             candidates.reshape(-1, 4), spare, open_sites, n_open, d_min, queue, scanned)
+            self.report["scanned-pairs"] = self.report.get("scanned-pairs", 0) + int(np.sum(scanned))
+            return queue[:n]
+        # search rings around the few open sites instead of around the many spare atoms
+        sites, atoms = np.argwhere(open_sites).astype(np.int16), np.argwhere(spare).astype(np.int16)
+        queue = greedy_rings(np.logical_not(open_sites), np.logical_not(spare), sites, atoms,
+                             calculate_target_index(atoms, *spare.shape))
+        spare[queue[:, 2], queue[:, 3]] = False
+        open_sites[queue[:, 0], queue[:, 1]] = False
+        return np.ascontiguousarray(queue[:, [2, 3, 0, 1]])
+
+    def repair(self, progress: int, lost: np.ndarray = None, unexpected: np.ndarray = None):
+        """
+        Repairs the steps after progress
+        :param progress: (int) number of executed steps of plan
+        :param lost: (ndarray) (n, 2) sites which lost their atom
+        :param unexpected: (ndarray) (n, 2) sites with an atom which should be empty
+        :return: (Plan) steps to execute from now on, plan is updated to the executed steps followed by them
+        """
+        self.advance(progress)
+        lost = np.asarray(lost if lost is not None else np.zeros((0, 2)), dtype=np.int64).reshape(-1, 2)
+        unexpected = np.asarray(unexpected if unexpected is not None else np.zeros((0, 2)),
+                                dtype=np.int64).reshape(-1, 2)
+        self.state[lost[:, 0], lost[:, 1]] = False
+        self.state[unexpected[:, 0], unexpected[:, 1]] = True
+        # pending moves with an atom and an empty target stay
+        pending = self.plan[progress:]
+        moves = np.flatnonzero(np.logical_not(pending.discards))
+        origins, targets = pending.origins[moves], pending.targets[moves]
+        keep = np.logical_and(self.state[origins[:, 0], origins[:, 1]],
+                              np.logical_not(self.state[targets[:, 0], targets[:, 1]]))
+        origins, targets = origins[keep], targets[keep]
+        spare = np.logical_and(self.state, np.logical_not(self.target))
+        spare[origins[:, 0], origins[:, 1]] = False
+        open_sites = np.logical_and(self.target, np.logical_not(self.state))
+        open_sites[targets[:, 0], targets[:, 1]] = False
+        repairs = self.fill(spare, open_sites)
+        remainder = Plan(capacity=len(origins) + len(repairs) + np.count_nonzero(spare))
+        remainder.add_moves(origins=origins, targets=targets)
+        remainder.add_moves(origins=repairs[:, :2], targets=repairs[:, 2:])
+        remainder.add_discards(origins=np.argwhere(spare))
+        self.plan = self.plan[:progress] + remainder
+        self.report.update({"kept-moves": len(origins),
+                            "dropped-moves": len(moves) - len(origins),
+                            "repair-moves": len(repairs),
+                            "discard-moves": int(np.count_nonzero(spare)),
+                            "unfilled": int(np.count_nonzero(open_sites))})
+        return remainder
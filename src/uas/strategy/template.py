@@ -2,8 +2,26 @@
 
 """
 
+from functools import partial
 from uas import Lattice
 
+# registered strategies by name, see register
+STRATEGIES = {}
+
+
+def register(name: str, **kwargs):
+    """
+    Class decorator adding a strategy to STRATEGIES, e.g. for automatic selection
+    :param name: (str) unique name
+    :param kwargs: keyword arguments the strategy is created with, e.g. a mode
+    :return: decorator
+    """
+    def decorator(cls):
+        assert name not in STRATEGIES, f"Strategy {name} is already registered"
+        STRATEGIES[name] = partial(cls, **kwargs) if kwargs else cls
+        return cls
+    return decorator
+
 
 class StrategyTemplate:
     """
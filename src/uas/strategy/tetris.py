@@ -0,0 +1,192 @@
+"""
+Row then column compression
+"""
+
+import numpy as np
+from numba import njit, types
+from uas import Lattice, Plan
+from uas.helper import type_coordinate_matrix, type_site_matrix
+from . import StrategyTemplate, register
+from .french import French
+
+
+@njit(nogil=True, cache=True)
+def _add_line_move(origin, target, line, queue, n_queue, axis):
+    if axis:
+        queue[n_queue, 0], queue[n_queue, 1], queue[n_queue, 2], queue[n_queue, 3] = line, origin, line, target
+    else:
+        queue[n_queue, 0], queue[n_queue, 1], queue[n_queue, 2], queue[n_queue, 3] = origin, line, target, line
+    return n_queue + 1
+
+
+@njit(types.int64(types.int64[:], types.int64[:], types.int64, types.int64, type_coordinate_matrix, types.int64,
+                  types.boolean), nogil=True, cache=True)
+def compress_line(origins, targets, n, line, queue, n_queue, axis):
+    """
+    Order preserving moves of atoms on one row or column: the i-th atom goes to the i-th target.
+    Atoms moving down the line are moved first to last, atoms moving up the line last to first, so every target is
+    empty when it is filled and no atom is passed on the way.
+    :param origins: (ndarray) positions of the atoms on the line, increasing
+    :param targets: (ndarray) positions of the targets on the line, increasing
+    :param n: (int) number of atoms
+    :param line: (int) index of the row (axis 1) or column (axis 0)
+    :param queue: (ndarray) (n, 4) moves [origin, target], changed in place
+    :param n_queue: (int) moves in queue
+    :param axis: (bool) True if the line is a row
+    :return: (int) moves in queue
+    """
+    for i in range(n):
+        if targets[i] < origins[i]:
+            n_queue = _add_line_move(origins[i], targets[i], line, queue, n_queue, axis)
+    for i in range(n - 1, -1, -1):
+        if targets[i] > origins[i]:
+            n_queue = _add_line_move(origins[i], targets[i], line, queue, n_queue, axis)
+    return n_queue
+
+
+@njit(types.Tuple((type_coordinate_matrix, type_coordinate_matrix, types.int64, types.boolean))(
+    type_site_matrix, type_site_matrix), nogil=True, cache=True)
+def compression_queue(start, target):
+    """
+    Rows are visited outwards from the center of the target. Every row sends its atoms to the columns which still
+    lack most atoms, closest to its atoms first, the atoms of the row not needed are discarded. Once every column
+    holds as many atoms as it has target sites the columns are compressed onto their target sites.
+    Both sweeps are order preserving, see compress_line.
+    :param start: (ndarray) occupation
+    :param target: (ndarray) target sites
+    :return: (tuple) (n, 2) discards, (m, 4) moves [origin, target], number of row moves, False if the rows cannot
+        balance the columns
+    """
+    n_0, n_1 = start.shape
+    deficit = np.zeros(n_1, dtype=np.int64)
+    center = 0.
+    n_target = 0
+    for r in range(n_0):
+        for c in range(n_1):
+            if target[r, c]:
+                deficit[c] += 1
+                center += r
+                n_target += 1
+    center = center / max(n_target, 1)
+    row_distance = np.empty(n_0, dtype=np.float64)
+    for r in range(n_0):
+        row_distance[r] = abs(r - center)
+    row_order = np.argsort(row_distance, kind="mergesort")
+    balanced = np.zeros((n_0, n_1), dtype=np.bool_)
+    discards = np.empty((n_0 * n_1, 2), dtype=np.int16)
+    n_discards = 0
+    queue = np.empty((2 * n_0 * n_1, 4), dtype=np.int16)
+    n_queue = 0
+    atoms = np.empty(n_1, dtype=np.int64)
+    columns = np.empty(n_1, dtype=np.int64)
+    keys = np.empty(n_1, dtype=np.int64)
+    near = np.empty(n_1, dtype=np.int64)
+    for r in row_order:
+        k = 0
+        for c in range(n_1):
+            if start[r, c]:
+                atoms[k] = c
+                k += 1
+        if k == 0:
+            continue
+        # distance of every column to the closest atom of the row
+        last = -n_1
+        for c in range(n_1):
+            if start[r, c]:
+                last = c
+            near[c] = c - last
+        last = 2 * n_1
+        for c in range(n_1 - 1, -1, -1):
+            if start[r, c]:
+                last = c
+            near[c] = min(near[c], last - c)
+        n_candidates = 0
+        for c in range(n_1):
+            if deficit[c] > 0:
+                columns[n_candidates] = c
+                keys[n_candidates] = (n_0 - deficit[c]) * (2 * n_1 + 1) + near[c]
+                n_candidates += 1
+        u = min(k, n_candidates)
+        selected = np.sort(columns[:n_candidates][np.argsort(keys[:n_candidates], kind="mergesort")[:u]])
+        # window of u consecutive atoms with the center of mass closest to the selected columns
+        s_best, diff_best = 0, np.iinfo(np.int64).max
+        window, selected_sum = 0, 0
+        for i in range(u):
+            window += atoms[i]
+            selected_sum += selected[i]
+        for s in range(k - u + 1):
+            if s > 0:
+                window += atoms[s + u - 1] - atoms[s - 1]
+            if abs(window - selected_sum) < diff_best:
+                s_best, diff_best = s, abs(window - selected_sum)
+        for i in range(k):
+            if i < s_best or i >= s_best + u:
+                discards[n_discards, 0], discards[n_discards, 1] = r, atoms[i]
+                n_discards += 1
+        for i in range(u):
+            deficit[selected[i]] -= 1
+            balanced[r, selected[i]] = True
+        n_queue = compress_line(atoms[s_best:s_best + u], selected, u, r, queue, n_queue, True)
+    n_row_moves = n_queue
+    for c in range(n_1):
+        if deficit[c] > 0:
+            return discards[:0], queue[:0], 0, False
+    origins = np.empty(n_0, dtype=np.int64)
+    targets = np.empty(n_0, dtype=np.int64)
+    for c in range(n_1):
+        n, m = 0, 0
+        for r in range(n_0):
+            if balanced[r, c]:
+                origins[n] = r
+                n += 1
+            if target[r, c]:
+                targets[m] = r
+                m += 1
+        n_queue = compress_line(origins, targets, n, c, queue, n_queue, False)
+    return discards[:n_discards], queue[:n_queue], n_row_moves, True
+
+
+@register("tetris")
+class Tetris(StrategyTemplate):
+    """
+    Compresses the atoms in two sweeps, first along the rows, then along the columns.
+    Time and memory grow with the number of sites, i.e. linear up to the sorting of columns per row.
+    * discard atoms not needed to fill the target, they would block the sweeps
+    * row moves: balance the number of atoms per column to the number of target sites per column
+    * column moves: fill the target sites of every column in order
+    Moves have to be executed in order of the plan, neither sweep passes another atom.
+    If the rows cannot balance the columns (e.g. too few atoms in the rows) the plan of French is used instead.
+    """
+
+    def __init__(self, start: Lattice, target: Lattice):
+        self.start = start
+        self.current_state = start
+        self.target = target
+        self.plan = Plan()
+        self.report = {}
+        # first assert that a possible solution exists
+        assert start.count() >= target.count(), f"Unsolvable {start.count()} sites cannot be sorted" \
+                                                f" to {target.count()} sites"
+
+    def run(self):
+        # packed lattices return read only values, the compiled signature takes writable arrays
+        discards, queue, n_row_moves, balanced = compression_queue(np.array(self.start.value),
+                                                                   np.array(self.target.value))
+        if not balanced:
+            french = French(start=self.start, target=self.target, mode="bucketed")
+            self.plan, self.current_state = french.run()
+            self.report.update(french.report)
+            self.report["fallback"] = 1
+            return self.plan, self.current_state
+        self.plan.add_discards(origins=discards)
+        self.current_state.discard_many(origins=discards)
+        self.plan.add_moves(origins=queue[:, :2], targets=queue[:, 2:])
+        # moves may fill sites cleared by earlier moves, apply them in order
+        self.current_state.apply_deltas(queue[:, :2], queue[:, 2:])
+        self.report.update({"site-moves": queue.shape[0],
+                            "discard-moves": discards.shape[0],
+                            "path-length": int(np.sum(np.abs(queue[:, :2].astype(np.int32) - queue[:, 2:]))),
+                            "row-moves": n_row_moves,
+                            "column-moves": queue.shape[0] - n_row_moves,
+                            "fallback": 0})
+        return self.plan, self.current_state
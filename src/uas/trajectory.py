@@ -7,7 +7,7 @@ from numba import types, typed, typeof, njit
 from uas.helper import type_path_matrix
 
 
-@njit((types.ListType(type_path_matrix))(types.float32[:], types.float32[:]), fastmath=True)
+@njit((types.ListType(type_path_matrix))(types.float32[:], types.float32[:]), fastmath=True, cache=True)
 def l_trajectory(origin, target):
     path = typed.List.empty_list(type_path_matrix)
     difference = origin - target
@@ -21,12 +21,267 @@ def l_trajectory(origin, target):
     return path
 
 
-@njit(types.float32(types.float32[:, :], types.float32[:]), fastmath=True)
+@njit(types.float32(types.float32[:, :], types.float32[:]), fastmath=True, cache=True)
 def calculate_path_length(path, spacing):
     path = np.abs(path)
     return spacing[0] * np.sum(path[:, 0]) + spacing[1] * np.sum(path[:, 1])
 
 
+@njit(types.int64[:](types.int16[:, :], types.int16[:, :], types.boolean[:], types.boolean),
+      fastmath=True, cache=True)
+def count_timeline_rows(origins, targets, discards, empty_legs):
+    """
+    Number of timeline rows every move contributes: (empty leg), pick, path segments and place
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :param empty_legs: (bool) every move but the first starts with the empty leg from the previous move
+    :return: (ndarray) (n, ) row counts
+    """
+    rows = np.empty(origins.shape[0], dtype=np.int64)
+    for i in range(origins.shape[0]):
+        d_0 = np.float32(targets[i, 0] - origins[i, 0])
+        d_1 = np.float32(targets[i, 1] - origins[i, 1])
+        if discards[i] or np.sqrt(d_0 * d_0 + d_1 * d_1) == 1:
+            # single segment: discard or move by one site
+            rows[i] = 3
+        else:
+            # diagonal, L shape, diagonal
+            rows[i] = 6
+        if empty_legs and i > 0:
+            rows[i] += 1
+    return rows
+
+
+@njit(types.float32[:, :](types.int16[:, :], types.int16[:, :], types.boolean[:]), fastmath=True, cache=True)
+def move_ends(origins, targets, discards):
+    """
+    Position of the tweezer after every move, discards end half a site diagonal to their origin
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :return: (ndarray) (n, 2) positions
+    """
+    ends = np.empty((origins.shape[0], 2), dtype=np.float32)
+    for i in range(origins.shape[0]):
+        if discards[i]:
+            ends[i, 0] = origins[i, 0] + np.float32(0.5)
+            ends[i, 1] = origins[i, 1] + np.float32(0.5)
+        else:
+            ends[i, 0] = targets[i, 0]
+            ends[i, 1] = targets[i, 1]
+    return ends
+
+
+@njit(types.int64(types.int16[:], types.int16[:], types.boolean, types.float32[:, :]), fastmath=True, cache=True)
+def move_path(origin, target, discard, path):
+    """
+    Writes the path segments of a single move (Discard or Type1) into path
+    :param origin: (ndarray) coordinate
+    :param target: (ndarray) coordinate
+    :param discard: (bool) discard flag
+    :param path: (ndarray) (4, 2) buffer for the segments
+    :return: (int) number of segments
+    """
+    d_0 = np.float32(target[0] - origin[0])
+    d_1 = np.float32(target[1] - origin[1])
+    if discard:
+        path[0, 0] = 0.5
+        path[0, 1] = 0.5
+        return 1
+    if np.sqrt(d_0 * d_0 + d_1 * d_1) == 1:
+        path[0, 0] = d_0
+        path[0, 1] = d_1
+        return 1
+    # same path as Type1._calculate_trajectory
+    for k in range(2):
+        difference = np.float32(target[k] - origin[k])
+        if difference == 0:
+            diagonal_step = np.float32(-0.5)
+        else:
+            diagonal_step = difference / np.abs(difference) / 2
+        post_origin = np.abs(np.float32(origin[k]) + diagonal_step)
+        pre_target = np.abs(np.float32(target[k]) - diagonal_step)
+        path[0, k] = diagonal_step
+        path[1, k] = 0
+        path[2, k] = 0
+        path[1 + k, k] = post_origin - pre_target
+        path[3, k] = -1 * diagonal_step
+    return 4
+
+
+@njit(types.float64(types.int16[:, :], types.int16[:, :], types.boolean[:], types.float32[:],
+                    types.float64, types.float64, types.float64, types.float64), fastmath=True, nogil=True, cache=True)
+def completion_time(origins, targets, discards, spacing, t_start, t_pick, t_place, v_move):
+    """
+    Time of the last row of compile_timeline, without building the timeline
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :param spacing: (ndarray) lattice spacing
+    :param t_start: start time
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :return: completion time
+    """
+    path = np.zeros((4, 2), dtype=np.float32)
+    segment = np.zeros((1, 2), dtype=np.float32)
+    timer = t_start
+    for i in range(origins.shape[0]):
+        n_segments = move_path(origins[i], targets[i], discards[i], path)
+        timer += t_pick
+        for k in range(n_segments):
+            segment[0] = path[k]
+            timer += calculate_path_length(segment, spacing) / v_move
+        timer += t_place
+    return timer
+
+
+@njit(types.float64(types.int16[:, :], types.int16[:, :], types.boolean[:], types.float32[:],
+                    types.float64, types.float64, types.float64, types.float64, types.boolean, types.float32[:],
+                    types.float32[:, :]), fastmath=True, cache=True)
+def write_timeline(origins, targets, discards, spacing, t_start, t_pick, t_place, v_move, empty_legs, previous_end,
+                   timeline):
+    """
+    Writes the timeline rows of consecutive moves into timeline, see compile_timeline.
+    Moves can be written in batches, passing the returned timer and the end of the last move on to the next batch
+    gives the same numbers as a single batch.
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :param spacing: (ndarray) lattice spacing
+    :param t_start: start time
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :param empty_legs: (bool) add the travel of the empty tweezer between moves as rows with the picker off
+    :param previous_end: (ndarray) (2, ) tweezer position before the first move, (0, ) if there is none
+    :param timeline: (ndarray) (rows, 4) output
+    :return: (float) time after the last move
+    """
+    ends = move_ends(origins, targets, discards)
+    path = np.zeros((4, 2), dtype=np.float32)
+    segment = np.zeros((1, 2), dtype=np.float32)
+    timer = t_start
+    row = 0
+    for i in range(origins.shape[0]):
+        n_segments = move_path(origins[i], targets[i], discards[i], path)
+        # empty leg from the end of the previous move
+        if empty_legs and (i > 0 or previous_end.shape[0]):
+            end = ends[i - 1] if i > 0 else previous_end
+            segment[0, 0] = origins[i, 0] - end[0]
+            segment[0, 1] = origins[i, 1] - end[1]
+            timer += calculate_path_length(segment, spacing) / v_move
+            timeline[row, 0] = timer
+            timeline[row, 2] = segment[0, 0]
+            timeline[row, 3] = segment[0, 1]
+            row += 1
+        # pick
+        timer += t_pick
+        timeline[row, 0] = timer
+        timeline[row, 1] = 1
+        row += 1
+        # moves
+        for k in range(n_segments):
+            segment[0] = path[k]
+            timer += calculate_path_length(segment, spacing) / v_move
+            timeline[row, 0] = timer
+            timeline[row, 1] = 1
+            timeline[row, 2] = path[k, 0]
+            timeline[row, 3] = path[k, 1]
+            row += 1
+        # place
+        timer += t_place
+        timeline[row, 0] = timer
+        row += 1
+    return timer
+
+
+@njit(types.float32[:, :](types.int16[:, :], types.int16[:, :], types.boolean[:], types.float32[:],
+                          types.float64, types.float64, types.float64, types.float64, types.boolean),
+      fastmath=True, cache=True)
+def compile_timeline(origins, targets, discards, spacing, t_start, t_pick, t_place, v_move, empty_legs):
+    """
+    Builds the timeline of a whole plan in one pass.
+    Yields the same numbers as chaining Type1 and Discard trajectories.
+    timeline signature: [timer, picker, x-component, y-component]
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :param spacing: (ndarray) lattice spacing
+    :param t_start: start time
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :param empty_legs: (bool) add the travel of the empty tweezer between moves as rows with the picker off
+    :return: (ndarray) (rows, 4) timeline
+    """
+    rows = count_timeline_rows(origins, targets, discards, empty_legs)
+    timeline = np.zeros((np.sum(rows), 4), dtype=np.float32)
+    write_timeline(origins, targets, discards, spacing, t_start, t_pick, t_place, v_move, empty_legs,
+                   np.zeros(0, dtype=np.float32), timeline)
+    return timeline
+
+
+@njit(types.float32[:, :](types.float32[:, :], types.int64[:], types.int16[:, :], types.int16[:, :], types.boolean[:],
+                          types.float32[:], types.float64, types.float64, types.float64, types.float64, types.boolean),
+      fastmath=True, cache=True)
+def compile_route_timeline(segments, offsets, origins, targets, discards, spacing, t_start, t_pick, t_place, v_move,
+                           empty_legs):
+    """
+    Same as compile_timeline for moves with explicit paths, e.g. from uas.planner.PathPlanner
+    :param segments: (ndarray) (m, 2) path segments of all moves
+    :param offsets: (ndarray) (n + 1, ) offsets of the moves into segments
+    :param origins: (ndarray) (n, 2) coordinates
+    :param targets: (ndarray) (n, 2) coordinates
+    :param discards: (ndarray) (n, ) discard flags
+    :param spacing: (ndarray) lattice spacing
+    :param t_start: start time
+    :param t_pick: time to pick an atom
+    :param t_place: time to place an atom
+    :param v_move: velocity of the tweezer
+    :param empty_legs: (bool) add the travel of the empty tweezer between moves as rows with the picker off
+    :return: (ndarray) (rows, 4) timeline
+    """
+    n = origins.shape[0]
+    n_rows = 2 * n + segments.shape[0] + (max(n - 1, 0) if empty_legs else 0)
+    timeline = np.zeros((n_rows, 4), dtype=np.float32)
+    ends = move_ends(origins, targets, discards)
+    segment = np.zeros((1, 2), dtype=np.float32)
+    timer = t_start
+    row = 0
+    for i in range(n):
+        # empty leg from the end of the previous move
+        if empty_legs and i > 0:
+            segment[0, 0] = origins[i, 0] - ends[i - 1, 0]
+            segment[0, 1] = origins[i, 1] - ends[i - 1, 1]
+            timer += calculate_path_length(segment, spacing) / v_move
+            timeline[row, 0] = timer
+            timeline[row, 2] = segment[0, 0]
+            timeline[row, 3] = segment[0, 1]
+            row += 1
+        # pick
+        timer += t_pick
+        timeline[row, 0] = timer
+        timeline[row, 1] = 1
+        row += 1
+        # moves
+        for k in range(offsets[i], offsets[i + 1]):
+            segment[0] = segments[k]
+            timer += calculate_path_length(segment, spacing) / v_move
+            timeline[row, 0] = timer
+            timeline[row, 1] = 1
+            timeline[row, 2] = segments[k, 0]
+            timeline[row, 3] = segments[k, 1]
+            row += 1
+        # place
+        timer += t_place
+        timeline[row, 0] = timer
+        row += 1
+    return timeline
+
+
 class Trajectory:
     """
     Trajectories describe the way from a coordinate (x0, y0) to (x1, x1) via vectors
@@ -80,7 +335,7 @@ class Type1(Trajectory):
         self.path = self._calculate_trajectory(self.origin.astype(np.float32), self.target.astype(np.float32))
 
     @staticmethod
-    @njit((types.ListType(type_path_matrix))(types.float32[:], types.float32[:]), fastmath=True)
+    @njit((types.ListType(type_path_matrix))(types.float32[:], types.float32[:]), fastmath=True, cache=True)
     def _calculate_trajectory(origin, target):
         path = typed.List.empty_list(type_path_matrix)
         difference = target - origin
@@ -123,3 +378,17 @@ class Discard(Type2):
     """
     def calculate_trajectory(self):
         self.path = [np.array((0.5, 0.5))]
+
+
+class Route(Type2):
+    """
+    Explicit path, e.g. planned around occupied sites by uas.planner.PathPlanner
+    """
+    def __init__(self, origin: np.ndarray, target: np.ndarray, path: np.ndarray, spacing: np.ndarray,
+                 t_start: float, t_pick: float, t_place: float, v_move: float):
+        self.route = path
+        super().__init__(origin=origin, target=target, spacing=spacing, t_start=t_start, t_pick=t_pick,
+                         t_place=t_place, v_move=v_move)
+
+    def calculate_trajectory(self):
+        self.path = [np.asarray(ds, dtype=np.float32) for ds in self.route]
@@ -0,0 +1,19 @@
+"""
+Fixtures shared by the test modules
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice
+from uas.helper import Sample
+from uas.strategy import French
+
+
+@pytest.fixture
+def plan():
+    start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+    sample = Sample((20, 20))
+    sample.add_rect(origin=(2, 2), size=(10, 10))
+    plan, end_state = French(start=deepcopy(start_state), target=Lattice(sample.value)).run()
+    return plan
@@ -0,0 +1,102 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, Frontend, Plan
+from uas.helper import Sample
+from uas.strategy import STRATEGIES, Auto, CostModel, French, register
+from uas.strategy.auto import completion_time
+
+
+@pytest.fixture
+def states():
+    start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+    sample = Sample((20, 20))
+    sample.add_rect(origin=(4, 4), size=(10, 10))
+    return start_state, Lattice(sample.value)
+
+
+class TestRegistry:
+    def test_registered(self):
+        assert {"french", "french-bucketed", "hungarian", "tetris"} <= set(STRATEGIES)
+        assert STRATEGIES["french-bucketed"].keywords == {"mode": "bucketed"}
+
+    def test_duplicate(self):
+        with pytest.raises(AssertionError):
+            register("french")(French)
+
+
+class TestAuto:
+    def test_run(self, states):
+        # assemble
+        start_state, target_state = states
+
+        # act
+        auto = Auto(start=deepcopy(start_state), target=target_state)
+        plan, end_state = auto.run()
+
+        # assert
+        name = auto.report["strategy"]
+        costs = {_: auto.predictions[_][0] * 1e6 + auto.predictions[_][1] for _ in auto.predictions}
+        assert costs[name] == min(costs.values())
+        assert end_state == target_state
+        assert auto.report["completion-time"] == completion_time(Frontend(spacing=start_state.spacing, plan=plan))
+        assert np.isclose(auto.report["predicted-completion-time"], auto.report["completion-time"], rtol=0.1)
+
+    def test_frontend_unchanged(self, states):
+        # assemble
+        start_state, target_state = states
+        plan = Plan()
+        frontend = Frontend(spacing=start_state.spacing, plan=plan)
+
+        # act
+        auto = Auto(start=deepcopy(start_state), target=target_state, frontend=frontend)
+        auto.run()
+
+        # assert
+        assert frontend.plan is plan and not len(plan)
+        assert auto.report["completion-time"] == completion_time(Frontend(spacing=start_state.spacing,
+                                                                          plan=auto.plan))
+
+    def test_names(self, states):
+        # assemble
+        start_state, target_state = states
+
+        # act
+        auto = Auto(start=deepcopy(start_state), target=target_state, names=["tetris"], monitor=False)
+        plan, end_state = auto.run()
+
+        # assert
+        assert auto.report["strategy"] == "tetris"
+        assert "completion-time" not in auto.report
+        assert end_state == target_state
+
+    def test_calibrate(self, states, tmp_path):
+        # assemble
+        rng = np.random.default_rng(0)
+        samples = []
+        for size in (10, 14, 20):
+            sample = Sample((size, size))
+            sample.add_rect(origin=(2, 2), size=(size // 2, size // 2))
+            samples.append((rng.random((size, size)) < 0.6, sample.value))
+        model = CostModel()
+
+        # act
+        records = model.calibrate(samples, names=["french-bucketed", "tetris"])
+        model.save(tmp_path / "model.json")
+        loaded = CostModel.load(tmp_path / "model.json")
+
+        # assert
+        assert len(records) == 6
+        assert loaded.coefficients == model.coefficients
+        # French moves every free target site and discards the rest, operations are the surplus atoms
+        assert np.allclose(model.coefficients["french-bucketed"]["operations"], (0, 0, 1), atol=1e-6)
+        frontend = Frontend(spacing=states[0].spacing, plan=Plan())
+        for name, n_sites, t_compute, n_operations, path_length, t_completion in records:
+            start, target = [Lattice(_) for _ in samples[[_[0].size for _ in samples].index(n_sites)]]
+            # exact for French, a rough fit of three samples for Tetris
+            rtol = 1e-3 if name == "french-bucketed" else 0.5
+            assert np.isclose(model.predict(name, start, target, frontend)[1], t_completion, rtol=rtol)
@@ -3,17 +3,21 @@
 """
 
 import logging
+from functools import partial
 import pytest
 import numpy as np
 from copy import deepcopy
-from uas import Lattice, Frontend
+from uas import Lattice, Frontend, Plan, Type1, Discard
 from uas.helper import Sample
-from uas.strategy import StrategyTemplate, French
+from uas.strategy import StrategyTemplate, French, Hungarian, Tetris
 
 logging.basicConfig(level=logging.INFO)
 
 STRATEGIES = [
-    French
+    French,
+    partial(French, mode="bucketed"),
+    Hungarian,
+    Tetris,
 ]
 
 SHAPES = [
@@ -124,3 +128,58 @@ class TestStrategy:
         strat = strategy(start=start_state, target=target_state)
         plan, end_state = strat.run()
         timeline = Frontend(spacing=start_state.spacing, plan=plan).parse_plan()
+
+
+class TestTimeline:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_compile_matches_trajectories(self, seed):
+        # assemble, random moves including edge sites, straight and single site moves
+        rng = np.random.default_rng(seed)
+        plan = Plan()
+        for _ in range(200):
+            origin = rng.integers(0, 6, 2).astype(np.int16)
+            kind = rng.integers(0, 4)
+            if kind == 0:
+                plan.add_discard(origin=origin)
+                continue
+            target = rng.integers(0, 6, 2).astype(np.int16)
+            if kind == 1:
+                target[0] = origin[0]
+            plan.add_move(origin=origin, target=target)
+        frontend = Frontend(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan)
+        timeline = []
+        timer = 0
+        for step in plan.moves:
+            trajectory = (Discard if step.discard else Type1)(
+                origin=step.origin, target=step.target, spacing=frontend.spacing, t_start=timer,
+                t_pick=frontend.t_pick, t_place=(frontend.t_place / 10), v_move=frontend.v_move)
+            timeline.extend(trajectory.timeline)
+            timer = timeline[-1][0]
+
+        # act
+        compiled = frontend.parse_plan()
+
+        # assert
+        assert np.array_equal(np.array(timeline, dtype=np.float32), compiled)
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 100, 100000])
+    @pytest.mark.parametrize("empty_legs", [False, True])
+    def test_stream(self, chunk_size, empty_legs):
+        # assemble
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        strategy = French(start=deepcopy(start_state), target=Lattice(sample.value))
+        plan, end_state = deepcopy(strategy).run()
+        frontend = Frontend(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan)
+        frontend.empty_legs = empty_legs
+        timeline = frontend.parse_plan()
+
+        # act
+        chunks = list(frontend.stream(moves=strategy.iter_moves(chunk_size=16), chunk_size=chunk_size,
+                                      batch_size=7))
+
+        # assert
+        assert all(chunk.shape == (chunk_size, 4) for chunk in chunks[:-1])
+        assert all(chunk.dtype == np.float32 for chunk in chunks)
+        assert np.array_equal(np.concatenate(chunks), timeline)
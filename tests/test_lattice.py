@@ -71,3 +71,180 @@ class TestLattice:
         assert (orig_lattice.spacing == lattice.spacing).all()
         assert orig_lattice == lattice
 
+    @pytest.mark.parametrize("factor", [(2.5, 1.5), (0.5, 0.5), (25, 25), (3, 0.4)])
+    def test_resample_factor(self, factor):
+        # assemble, odd shape, downsampling rounds the last row onto the border
+        sample = Sample((13, 17), rng=0)
+        sample.add_random(0.5)
+        lattice = Lattice(np.copy(sample.value), spacing=np.array((5, 5)))
+        reference = np.zeros(np.around(np.array((13, 17)) * factor).astype(int), dtype=bool)
+        coordinates = np.around(np.argwhere(sample.value) * factor).astype(int)
+        reference[np.minimum(coordinates[:, 0], reference.shape[0] - 1),
+                  np.minimum(coordinates[:, 1], reference.shape[1] - 1)] = True
+
+        # act
+        lattice.resample(np.array(factor))
+
+        # assert
+        assert np.array_equal(lattice.value, reference)
+        assert lattice.count() == np.count_nonzero(reference)
+        assert np.allclose(lattice.spacing, np.array((5, 5)) / factor)
+
+    def test_resample_out(self):
+        # assemble
+        sample = Sample((10, 10), rng=0)
+        sample.add_random(0.5)
+        lattice = Lattice(np.copy(sample.value))
+        out = np.ones((25, 25), dtype=bool)
+        coordinates = lattice.coordinates
+        reference = np.copy(coordinates)
+
+        # act
+        lattice.resample(2.5, out=out)
+
+        # assert
+        assert lattice.value is out
+        assert np.array_equal(coordinates, reference)
+        assert lattice.count() == sample.count()
+        with pytest.raises(AssertionError):
+            lattice.resample(2, out=np.zeros((25, 25), dtype=bool))
+
+
+
+class TestPacked:
+    @pytest.mark.parametrize("shape", [(15, 15), (20, 13), (100, 100), (3, 64)])
+    def test_roundtrip(self, shape):
+        # assemble
+        sample = Sample(shape)
+        sample.add_random(0.5)
+
+        # act
+        lattice = Lattice(np.copy(sample.value), packed=True)
+
+        # assert
+        assert lattice.packed
+        assert lattice == sample
+        assert lattice.count() == np.count_nonzero(sample.value)
+        assert np.array_equal(lattice.coordinates, np.argwhere(sample.value))
+        assert lattice._bits.nbytes <= sample.value.nbytes / 8 + shape[0]
+
+    def test_read_only(self):
+        lattice = Lattice(np.ones((5, 5), dtype=bool), packed=True)
+        with pytest.raises(ValueError):
+            lattice.value[0, 0] = 0
+
+    def test_move_discard(self):
+        # assemble
+        sample = Sample((10, 12))
+        sample.add_random(0.5)
+        packed = Lattice(np.copy(sample.value), packed=True)
+        lattice = Lattice(np.copy(sample.value))
+        origins = np.argwhere(sample.value)[:3].astype(np.int16)
+        targets = np.argwhere(np.logical_not(sample.value))[:3].astype(np.int16)
+
+        # act
+        for lat in (packed, lattice):
+            lat.move(origins[0], targets[0])
+            lat.move_many(origins[1:], targets[1:])
+            lat.discard(targets[0])
+
+        # assert
+        assert packed == lattice
+        assert np.array_equal(packed.coordinates, lattice.coordinates)
+
+    def test_andnot(self):
+        # assemble
+        rng = np.random.default_rng(0)
+        first, second = rng.random((2, 17, 17)) < 0.5
+
+        # act
+        remainder = Lattice(first, packed=True).andnot(Lattice(second, packed=True))
+
+        # assert
+        assert remainder.packed
+        assert np.array_equal(remainder.value, np.logical_and(first, np.logical_not(second)))
+
+    def test_sample_pack(self):
+        # assemble
+        sample = Sample((10, 10))
+        sample.add_position(((1, 1), ))
+        sample.pack()
+
+        # act
+        sample.add_position(((2, 2), ))
+
+        # assert
+        assert not sample.packed
+        assert sample.count() == 2
+
+
+class TestCoordinates:
+    @staticmethod
+    def as_set(coordinates):
+        return set(map(tuple, np.asarray(coordinates).tolist()))
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_incremental(self, seed):
+        # assemble
+        rng = np.random.default_rng(seed)
+        lattice = Lattice(rng.random((20, 20)) < 0.5)
+        coordinates = lattice.coordinates
+
+        # act & assert, compare with a fresh argwhere after every step
+        for _ in range(300):
+            occupied = lattice.coordinates
+            origin = occupied[rng.integers(len(occupied))].copy()
+            target = rng.integers(0, 20, 2).astype(np.int16)
+            kind = rng.integers(0, 3)
+            if kind == 0:
+                lattice.discard(origin)
+            elif kind == 1:
+                lattice.move(origin, target)
+            else:
+                lattice.apply_deltas(origin[np.newaxis], target[np.newaxis])
+            assert lattice._coordinates_cached
+            assert len(lattice.coordinates) == np.count_nonzero(lattice.value)
+            assert self.as_set(lattice.coordinates) == self.as_set(np.argwhere(lattice.value))
+
+    def test_move_in_place(self):
+        # assemble
+        sample = Sample((10, 10))
+        sample.add_position(((1, 1), (2, 2), (3, 3)))
+        lattice = Lattice(sample.value)
+        lattice.coordinates
+
+        # act
+        lattice.move(np.array((2, 2)), np.array((5, 5)))
+
+        # assert
+        assert np.array_equal(lattice.coordinates, ((1, 1), (5, 5), (3, 3)))
+
+    def test_returned_unchanged(self):
+        # assemble
+        sample = Sample((10, 10))
+        sample.add_position(((1, 1), (2, 2), (3, 3)))
+        lattice = Lattice(sample.value)
+        coordinates = lattice.coordinates
+        reference = np.copy(coordinates)
+
+        # act
+        lattice.move(np.array((2, 2)), np.array((5, 5)))
+        lattice.discard(np.array((1, 1)))
+        lattice.move_many(np.array(((3, 3), ), dtype=np.int16), np.array(((6, 6), ), dtype=np.int16))
+
+        # assert
+        assert np.array_equal(coordinates, reference)
+        assert self.as_set(lattice.coordinates) == {(5, 5), (6, 6)}
+
+    def test_discard_many(self):
+        # assemble
+        sample = Sample((10, 10))
+        sample.add_position(((1, 1), (2, 2), (3, 3), (4, 4)))
+        lattice = Lattice(sample.value)
+        lattice.coordinates
+
+        # act
+        lattice.discard_many(np.array(((1, 1), (3, 3)), dtype=np.int16))
+
+        # assert
+        assert self.as_set(lattice.coordinates) == {(2, 2), (4, 4)}
@@ -0,0 +1,134 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, Frontend, MonteCarlo
+from uas.helper import Sample
+from uas.montecarlo import sort_cycles, fill_probability
+from uas.strategy import French
+from uas.trajectory import completion_time
+
+
+@pytest.fixture
+def target_state():
+    sample = Sample((20, 20))
+    sample.add_rect(origin=(2, 2), size=(10, 10))
+    return Lattice(sample.value)
+
+
+class TestMonteCarlo:
+    def test_same_as_french(self, target_state):
+        # assemble
+        rng = np.random.default_rng(0)
+        loadings = rng.random((20, 20, 20)) < 0.4
+        monte_carlo = MonteCarlo(target=target_state, n_threads=4, chunk_size=3)
+
+        # act
+        result = monte_carlo.sort_loadings(loadings)
+
+        # assert
+        for loading, completion, site_moves, discard_moves in zip(loadings, result["completion-time"],
+                                                                  result["site-moves"], result["discard-moves"]):
+            start_state = Lattice(loading)
+            try:
+                strat = French(start=deepcopy(start_state), target=target_state)
+                plan, end_state = strat.run()
+            except AssertionError:
+                assert np.isnan(completion)
+                continue
+            timeline = Frontend(spacing=start_state.spacing, plan=plan).parse_plan()
+            assert completion == timeline[-1][0]
+            assert site_moves == strat.report["site-moves"]
+            assert discard_moves == strat.report["discard-moves"]
+
+    def test_reproducible(self, target_state):
+        # act
+        first = MonteCarlo(target=target_state, n_threads=1).run(n_trials=40, seed=42)
+        second = MonteCarlo(target=target_state, n_threads=4).run(n_trials=40, seed=42)
+
+        # assert
+        assert np.array_equal(first["completion-time"], second["completion-time"], equal_nan=True)
+        assert np.array_equal(first["site-moves"], second["site-moves"])
+
+    def test_packed_target(self, target_state):
+        # assemble
+        packed = Lattice(np.copy(target_state.value), packed=True)
+
+        # act
+        result = MonteCarlo(target=packed).run(n_trials=20, seed=3)
+        cycles = MonteCarlo(target=packed).run_cycles(n_trials=20, p_loading=0.6, seed=3)
+
+        # assert
+        reference = MonteCarlo(target=target_state).run(n_trials=20, seed=3)
+        reference_cycles = MonteCarlo(target=target_state).run_cycles(n_trials=20, p_loading=0.6, seed=3)
+        for key in reference:
+            assert np.array_equal(result[key], reference[key], equal_nan=True)
+        for key in reference_cycles:
+            assert np.array_equal(cycles[key], reference_cycles[key], equal_nan=True)
+
+    def test_cycles_lossless(self, target_state):
+        # assemble
+        rng = np.random.default_rng(0)
+        loadings = rng.random((10, 20, 20)) < 0.4
+        loadings[0] = target_state.value
+        monte_carlo = MonteCarlo(target=target_state)
+        fill_time = np.empty(10, dtype=np.float32)
+        cycles, site_moves = np.empty(10, dtype=np.int64), np.empty(10, dtype=np.int64)
+        filling = np.empty(10, dtype=np.float32)
+
+        # act
+        sort_cycles(np.copy(loadings), target_state.value, monte_carlo.target_coordinates, monte_carlo.target_index,
+                    target_state.spacing.astype(np.float32), 300., 30., 0.1, 1e3, 1., np.inf, np.inf, 10, 0,
+                    fill_time, cycles, site_moves, filling)
+
+        # assert, one cycle with the moves of French fills the target
+        assert fill_time[0] == 1e3 and cycles[0] == 0
+        for loading, t, n_cycles, n_moves in zip(loadings[1:], fill_time[1:], cycles[1:], site_moves[1:]):
+            start_state = Lattice(loading)
+            try:
+                strat = French(start=deepcopy(start_state), target=target_state)
+                plan, end_state = strat.run()
+            except AssertionError:
+                assert np.isnan(t) and n_cycles == 0
+                continue
+            moves = np.logical_not(plan.discards)
+            duration = completion_time(plan.origins[moves], plan.targets[moves], plan.discards[moves],
+                                       start_state.spacing.astype(np.float32), 0., 300., 30., 0.1)
+            assert np.isclose(t, 2e3 + duration)
+            assert n_cycles == 1
+            assert n_moves == strat.report["site-moves"]
+        assert np.all(filling[np.isfinite(fill_time)] == 1)
+
+    def test_cycles_loss(self, target_state):
+        # assemble
+        monte_carlo = MonteCarlo(target=target_state, n_threads=4, chunk_size=7)
+        lossless = MonteCarlo(target=target_state)
+        lossless.p_move, lossless.lifetime = 1., np.inf
+
+        # act
+        first = monte_carlo.run_cycles(n_trials=50, p_loading=0.6, seed=1)
+        second = MonteCarlo(target=target_state, n_threads=1, chunk_size=7).run_cycles(n_trials=50, p_loading=0.6,
+                                                                                       seed=1)
+        reference = lossless.run_cycles(n_trials=50, p_loading=0.6, seed=1)
+        limited = monte_carlo.run_cycles(n_trials=50, p_loading=0.6, max_cycles=1, seed=1)
+
+        # assert
+        for key in first:
+            assert np.array_equal(first[key], second[key], equal_nan=True)
+        assert np.all(reference["cycles"] == 1)
+        assert np.all(first["cycles"] >= 1) and np.any(first["cycles"] > 1)
+        assert np.all(limited["cycles"] <= 1)
+        assert np.all(np.isnan(limited["fill-time"]) == (limited["filling"] < 1))
+
+    def test_fill_probability(self):
+        # assemble
+        fill_time = np.array([1., 3., np.nan, 2.], dtype=np.float32)
+
+        # act
+        probability = fill_probability(fill_time, np.array([0., 1., 2.5, 10.]))
+
+        # assert
+        assert np.array_equal(probability, [0, 0.25, 0.5, 0.75])
@@ -1,5 +1,64 @@
 import pytest
+import numpy as np
+from uas import Plan, Move
+
+
+@pytest.fixture
+def plan():
+    plan = Plan(capacity=2)
+    plan.add_move(origin=np.array((0, 0)), target=np.array((1, 1)))
+    plan.add_moves(origins=np.array(((2, 2), (3, 3), (4, 4))), targets=np.array(((5, 5), (6, 6), (7, 7))))
+    plan.add_discard(origin=np.array((8, 8)))
+    return plan
 
 
 class TestMoves:
-    pass
+    def test_len(self, plan):
+        assert len(plan) == 5
+        assert plan.origins.shape == (5, 2)
+        assert plan.origins.dtype == np.int16
+
+    def test_iterate(self, plan):
+        moves = plan.moves
+        assert all(isinstance(m, Move) for m in moves)
+        assert np.array_equal(moves[2].origin, (3, 3))
+        assert np.array_equal(moves[2].target, (6, 6))
+        assert not moves[2].discard
+        assert moves[-1].discard
+        assert np.array_equal(moves[-1].origin, moves[-1].target)
+
+    def test_getitem(self, plan):
+        assert np.array_equal(plan[-1].origin, (8, 8))
+        with pytest.raises(IndexError):
+            plan[5]
+
+    def test_slice(self, plan):
+        # assemble
+        part = plan[1:3]
+
+        # act
+        part.add_discard(origin=np.array((9, 9)))
+
+        # assert
+        assert len(part) == 3
+        assert np.array_equal(part.origins, ((2, 2), (3, 3), (9, 9)))
+        # appending to a slice must not touch the original plan
+        assert len(plan) == 5
+        assert np.array_equal(plan.origins[3], (4, 4))
+
+    def test_concatenate(self, plan):
+        # act
+        combined = plan + plan[:2]
+
+        # assert
+        assert len(combined) == 7
+        assert np.array_equal(combined.targets[5:], plan.targets[:2])
+        assert np.array_equal(combined.discards, [0, 0, 0, 0, 1, 0, 0])
+
+    def test_from_arrays(self, plan):
+        # act
+        copy = Plan.from_arrays(plan.origins, plan.targets, plan.discards)
+
+        # assert
+        assert len(copy) == len(plan)
+        assert np.array_equal(copy.discards, plan.discards)
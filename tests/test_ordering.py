@@ -0,0 +1,115 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, Plan, Frontend, MoveOrder
+from uas.helper import Sample
+from uas.strategy import French
+from uas.ordering import move_dependencies
+from uas.trajectory import move_ends
+
+
+def replay(array: np.ndarray, plan: Plan):
+    """
+    Applies a plan move by move, every origin has to hold an atom and every target has to be empty
+    """
+    array = np.copy(array)
+    for move in plan:
+        assert array[tuple(move.origin)]
+        array[tuple(move.origin)] = False
+        if not move.discard:
+            assert not array[tuple(move.target)]
+            array[tuple(move.target)] = True
+    return array
+
+
+@pytest.fixture
+def start_state():
+    return Lattice(np.load(f"./data/sample_100_100.npy"))
+
+
+@pytest.fixture
+def plan(start_state):
+    sample = Sample((100, 100))
+    sample.add_rect(origin=(20, 20), size=(60, 60))
+    plan, end_state = French(start=deepcopy(start_state), target=Lattice(sample.value)).run()
+    return plan
+
+
+class TestMoveOrder:
+    def test_same_result(self, start_state, plan):
+        # act
+        ordered = MoveOrder(plan).run()
+
+        # assert
+        assert len(ordered) == len(plan)
+        assert np.array_equal(replay(start_state.value, ordered), replay(start_state.value, plan))
+
+    def test_shorter(self, plan):
+        # act
+        order = MoveOrder(plan)
+        ordered = order.run()
+
+        # assert
+        assert order.report["empty-length-after"] < order.report["empty-length-before"]
+        spacing = np.array([5e-6, 5e-6], dtype=np.float32)
+        frontends = [Frontend(spacing=spacing, plan=p) for p in (plan, ordered)]
+        for frontend in frontends:
+            frontend.empty_legs = True
+        before, after = (frontend.parse_plan()[-1, 0] for frontend in frontends)
+        assert after < before
+
+    def test_dependencies(self):
+        # assemble, a chain of moves into sites which are vacated by the previous move, mixed with free moves
+        array = np.zeros((10, 10), dtype=bool)
+        array[0, :5] = True
+        array[9, :] = True
+        plan = Plan()
+        for i in range(4, -1, -1):
+            plan.add_move(origin=np.array((0, i)), target=np.array((0, i + 1)))
+            plan.add_move(origin=np.array((9, 9 - i)), target=np.array((5, 9 - i)))
+        plan.add_move(origin=np.array((0, 5)), target=np.array((4, 4)))
+        plan.add_discard(origin=np.array((4, 4)))
+
+        # act
+        ordered = MoveOrder(plan).run()
+
+        # assert
+        assert np.array_equal(replay(array, ordered), replay(array, plan))
+
+    def test_move_dependencies(self):
+        # assemble
+        origins = np.array(((0, 0), (0, 1), (3, 3), (0, 0)), dtype=np.int16)
+        targets = np.array(((1, 1), (0, 0), (3, 3), (2, 2)), dtype=np.int16)
+        discards = np.array((False, False, True, False))
+
+        # act
+        preds, succs = move_dependencies(origins, targets, discards)
+
+        # assert
+        assert np.array_equal(preds, ((-1, -1), (-1, 0), (-1, -1), (1, -1)))
+        assert np.array_equal(succs, ((1, -1), (-1, 3), (-1, -1), (-1, -1)))
+
+
+class TestEmptyLegs:
+    def test_rows(self, plan):
+        # assemble
+        spacing = np.array([5e-6, 5e-6], dtype=np.float32)
+        frontend = Frontend(spacing=spacing, plan=plan)
+        serial = frontend.parse_plan()
+
+        # act
+        frontend.empty_legs = True
+        timeline = frontend.parse_plan()
+
+        # assert
+        legs = timeline[timeline[:, 1] == 0]
+        legs = legs[np.any(legs[:, 2:] != 0, axis=1)]
+        assert timeline.shape[0] == serial.shape[0] + len(plan) - 1
+        ends = move_ends(plan.origins, plan.targets, plan.discards)
+        assert np.allclose(np.sum(np.abs(plan.origins[1:] - ends[:-1]), axis=1).sum(),
+                           np.sum(np.abs(legs[:, 2:])))
+        assert timeline[-1, 0] > serial[-1, 0]
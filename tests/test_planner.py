@@ -0,0 +1,107 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, PathPlanner, Simulator, Route
+from uas.helper import Sample
+from uas.strategy import French
+from uas.planner import route_templates, evaluate_route
+
+SPACING = np.array([5e-6, 5e-6], dtype=np.float32)
+
+
+class TestPathPlanner:
+    @pytest.mark.parametrize("offset", [(0, 1), (1, 1), (0, 4), (-3, 0), (2, -5), (-4, -4)])
+    def test_templates(self, offset):
+        for name, steps in route_templates(offset):
+            assert np.array_equal(np.sum(steps, axis=0), 2 * np.array(offset))
+            assert np.all(np.abs(steps) <= 1)
+
+    def test_free(self):
+        # assemble
+        planner = PathPlanner(SPACING)
+        planner.set_occupancy(np.zeros((10, 10), dtype=bool))
+
+        # act
+        name, segments = planner.route(np.array((2, 2)), np.array((5, 7)))
+
+        # assert
+        assert name == "type2"
+        assert np.array_equal(np.sum(segments, axis=0), (3, 5))
+
+    def test_blocked(self):
+        # assemble, atoms on both L shaped paths
+        array = np.zeros((10, 10), dtype=bool)
+        array[2, 2] = array[2, 4] = array[4, 2] = True
+        planner = PathPlanner(SPACING)
+        planner.set_occupancy(array)
+
+        # act
+        name, segments = planner.route(np.array((2, 2)), np.array((5, 5)))
+
+        # assert
+        assert name != "type2"
+        assert np.array_equal(np.sum(segments, axis=0), (3, 3))
+        assert planner.report["close-passes"] == 0
+
+    def test_search(self):
+        # assemble, the channel of the Type1 path is lined with atoms, a detour through empty channels is cheaper
+        array = np.zeros((12, 12), dtype=bool)
+        array[4, 1:10] = True
+        array[5, 1:10] = True
+        origin, target = np.array((4, 0)), np.array((4, 10))
+        array[tuple(origin)] = True
+        planner = PathPlanner(SPACING, penalty=1.)
+        planner.set_occupancy(array)
+        weights = np.ones(2)
+        type1 = [steps for name, steps in route_templates(tuple(target - origin)) if name == "type1"][0]
+
+        # act
+        name, segments = planner.route(origin, target)
+
+        # assert
+        assert name == "routed"
+        assert np.allclose(np.sum(segments, axis=0), target - origin)
+        steps = np.repeat(np.sign(segments).astype(np.int64), (2 * np.max(np.abs(segments), axis=1)).astype(int),
+                          axis=0)
+        assert evaluate_route(array, origin, target, steps, weights, 1.) < \
+            evaluate_route(array, origin, target, type1, weights, 1.)
+
+    def test_simulator(self):
+        # assemble
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(4, 4), size=(12, 12))
+        plan, end_state = French(start=deepcopy(start_state), target=Lattice(sample.value)).run()
+        reference = Simulator(lattice=deepcopy(start_state), plan=plan)
+        reference.parse_plan()
+        planner = PathPlanner(start_state.spacing)
+        simulator = Simulator(lattice=deepcopy(start_state), plan=plan, planner=planner)
+
+        # act
+        timeline = simulator.parse_plan()
+
+        # assert
+        assert simulator.lattice == reference.lattice
+        assert len(simulator.state) == len(plan)
+        assert np.array_equal(simulator.state[-1]["lattice"].value, reference.state[-1]["lattice"].value)
+        assert planner.report["type1"] + planner.report["type2"] + planner.report["routed"] == \
+            len(plan) - np.sum(plan.discards)
+        # the tweezer path of every move ends at its target
+        picks = np.flatnonzero(np.diff(np.concatenate(((0, ), timeline[:, 1]))) == 1)
+        for i, step in enumerate(plan):
+            rows = timeline[picks[i]:picks[i + 1] if i + 1 < len(plan) else None]
+            if not step.discard:
+                assert np.allclose(np.sum(rows[:, 2:], axis=0), step.target - step.origin)
+
+    def test_route_trajectory(self):
+        # act
+        route = Route(np.array((0, 0)), np.array((1, 2)), np.array(((0, 1), (1, 0), (0, 1))), spacing=SPACING,
+                      t_start=0, t_pick=300, t_place=30, v_move=0.1)
+
+        # assert
+        assert len(route.timeline) == 5
+        assert np.isclose(route.timeline[-1][0], 300 + 30 + 3 * 5e-6 / 0.1)
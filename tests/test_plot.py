@@ -0,0 +1,137 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice
+from uas.helper.plot import add_gaussian, plot_lattice, gaussian_kernel, stamp_kernel, LatticeRenderer
+
+
+class TestPlot:
+    @pytest.mark.parametrize("shape", [(10, 10), (15, 15)])
+    def test_same_as_full_gaussians(self, shape):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_{shape[0]}_{shape[1]}.npy"))
+        rescaled = deepcopy(lattice)
+        rescaled.rescale(np.array((200e-9, 200e-9)))
+        reference = np.zeros(rescaled.value.shape, dtype=float)
+        for coord in rescaled.coordinates:
+            reference = add_gaussian(image=reference, sigma=2, amplitude=1, center=coord)
+
+        # act
+        image = plot_lattice(deepcopy(lattice))
+
+        # assert
+        assert image.shape == reference.shape
+        # truncation at 4 sigma
+        assert np.allclose(image, reference, atol=1e-3)
+
+    def test_border(self):
+        # assemble, kernels are clipped at all four borders
+        image = np.zeros((20, 30), dtype=float)
+        centers = np.array(((0, 0), (19, 29), (0, 29), (19, 0), (10, 15)), dtype=np.int16)
+        reference = np.zeros_like(image)
+        for center in centers:
+            reference = add_gaussian(image=reference, sigma=1.5, amplitude=2, center=center)
+
+        # act
+        stamp_kernel(image, centers, gaussian_kernel(sigma=1.5, amplitude=2), 1.)
+
+        # assert
+        assert np.allclose(image, reference, atol=1e-3)
+        stamp_kernel(image, centers, gaussian_kernel(sigma=1.5, amplitude=2), -1.)
+        assert np.allclose(image, 0)
+
+    def test_reuse_buffer(self):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_10_10.npy"))
+        first = plot_lattice(deepcopy(lattice))
+        empty = deepcopy(lattice)
+        empty.set_value(np.zeros_like(lattice.value))
+
+        # act
+        image = plot_lattice(deepcopy(empty), image=first)
+        again = plot_lattice(deepcopy(lattice), image=image)
+
+        # assert
+        assert again is first
+        assert np.allclose(again, plot_lattice(deepcopy(lattice)))
+
+    def test_reuse_renderer(self):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_10_10.npy"))
+        renderer = LatticeRenderer()
+
+        # act
+        first = plot_lattice(deepcopy(lattice), renderer=renderer)
+        again = plot_lattice(deepcopy(lattice), renderer=renderer)
+
+        # assert, the geometry is computed once, the incremental state of render is not touched
+        assert len(renderer.geometries) == 1
+        assert renderer.state is None
+        assert np.allclose(first, again)
+        assert np.allclose(first, plot_lattice(deepcopy(lattice)))
+        wide = plot_lattice(deepcopy(lattice), renderer=LatticeRenderer(sigma=3))
+        assert wide.shape == first.shape and not np.allclose(wide, first)
+
+    def test_not_destructive(self):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_15_15.npy"))
+        value, spacing = np.copy(lattice.value), np.copy(lattice.spacing)
+
+        # act
+        plot_lattice(lattice)
+        LatticeRenderer().render(lattice)
+
+        # assert
+        assert np.array_equal(lattice.value, value)
+        assert np.array_equal(lattice.spacing, spacing)
+
+
+class TestLatticeRenderer:
+    def test_same_as_plot_lattice(self):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_20_20.npy"))
+        renderer = LatticeRenderer()
+
+        # act
+        image = renderer.render(lattice)
+
+        # assert
+        assert np.allclose(image, plot_lattice(deepcopy(lattice)))
+
+    def test_incremental(self):
+        # assemble
+        rng = np.random.default_rng(0)
+        lattice = Lattice(np.load(f"./data/sample_20_20.npy"))
+        renderer = LatticeRenderer()
+        renderer.render(lattice)
+
+        # act
+        for _ in range(20):
+            origin = rng.permutation(np.argwhere(lattice.value))[0]
+            target = rng.permutation(np.argwhere(np.logical_not(lattice.value)))[0]
+            lattice.move(origin, target)
+            image = renderer.render(lattice)
+
+            # assert
+            assert np.allclose(image, plot_lattice(lattice))
+        assert len(renderer.geometries) == 1
+
+    def test_spacing(self):
+        # assemble
+        lattice = Lattice(np.load(f"./data/sample_10_10.npy"))
+        coarse = Lattice(np.copy(lattice.value), spacing=np.array([10e-6, 5e-6], dtype=np.float32))
+        renderer = LatticeRenderer()
+
+        # act
+        image = renderer.render(lattice)
+        coarse_image = renderer.render(coarse, out=np.empty((500, 250)))
+
+        # assert
+        assert image.shape == (250, 250)
+        assert coarse_image.shape == (500, 250)
+        assert np.allclose(coarse_image, plot_lattice(coarse))
+        assert len(renderer.geometries) == 2
@@ -0,0 +1,140 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from uas import Lattice
+from uas.helper import Sample
+from uas.strategy import French, Replanner
+from uas.strategy.replan import first_pair
+
+
+def execute(array, plan):
+    # every move takes an atom to an empty site
+    for move in plan:
+        assert array[tuple(move.origin)]
+        array[tuple(move.origin)] = 0
+        if not move.discard:
+            assert not array[tuple(move.target)]
+            array[tuple(move.target)] = 1
+    return array
+
+
+@pytest.fixture
+def states():
+    rng = np.random.default_rng(0)
+    start = rng.random((20, 20)) < 0.6
+    sample = Sample((20, 20))
+    sample.add_rect(origin=(4, 4), size=(10, 10))
+    return start, sample.value
+
+
+class TestReplanner:
+    @pytest.mark.parametrize("mode", French.modes)
+    def test_no_loss(self, states, mode):
+        # assemble
+        start, target = states
+        strategy = French(start=Lattice(np.copy(start)), target=Lattice(target), mode=mode, cache=True)
+        plan, end_state = strategy.run()
+        replanner = Replanner(strategy)
+
+        # act
+        remainder = replanner.repair(len(plan) // 2)
+
+        # assert
+        assert replanner.report["dropped-moves"] == replanner.report["repair-moves"] == 0
+        assert np.array_equal(execute(np.copy(start), replanner.plan), target)
+        assert len(replanner.plan) == len(plan)
+        assert set(map(tuple, remainder.origins)) == set(map(tuple, plan[len(plan) // 2:].origins))
+
+    @pytest.mark.parametrize("mode, scan", [("dense", True), ("dense", False), ("dense", None), ("bucketed", None)])
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_loss(self, states, mode, scan, seed):
+        # assemble
+        start, target = states
+        rng = np.random.default_rng(seed)
+        strategy = French(start=Lattice(np.copy(start)), target=Lattice(target), mode=mode, cache=True)
+        plan, end_state = strategy.run()
+        replanner = Replanner(strategy, scan=scan)
+        array = np.copy(start)
+        progress = 0
+
+        # act, lose atoms and gain one twice during the execution
+        n_moves = strategy.report["site-moves"]
+        for step in (n_moves // 3, 2 * n_moves // 3):
+            execute(array, replanner.plan[progress:step])
+            progress = step
+            # atoms of two pending moves are lost, such that these moves are dropped
+            array[tuple(replanner.plan.origins[step].T)] = 0
+            array[tuple(replanner.plan.origins[step + 1].T)] = 0
+            atoms, empty = np.argwhere(array), np.argwhere(np.logical_not(array))
+            lost = np.concatenate((replanner.plan.origins[step:step + 2],
+                                   atoms[rng.choice(len(atoms), 3, replace=False)]))
+            unexpected = empty[rng.choice(len(empty), 1)]
+            array[lost[:, 0], lost[:, 1]] = 0
+            array[unexpected[:, 0], unexpected[:, 1]] = 1
+            replanner.repair(progress, lost=lost, unexpected=unexpected)
+        execute(array, replanner.plan[progress:])
+
+        # assert
+        assert replanner.report["unfilled"] == 0
+        assert replanner.report["dropped-moves"] > 0
+        assert np.array_equal(array, target)
+        if scan is not None:
+            assert ("scanned-pairs" in replanner.report) == scan
+
+    def test_unfilled(self):
+        # assemble, one spare atom only
+        start = np.zeros((10, 10), dtype=bool)
+        start[2:5, 2:5] = True
+        start[0, 0] = True
+        target = np.zeros((10, 10), dtype=bool)
+        target[3:6, 3:6] = True
+        strategy = French(start=Lattice(np.copy(start)), target=Lattice(target), cache=True)
+        strategy.run()
+        replanner = Replanner(strategy)
+
+        # act
+        remainder = replanner.repair(0, lost=[[2, 2], [3, 3]])
+
+        # assert
+        assert replanner.report["unfilled"] == 1
+        array = np.copy(start)
+        array[2, 2] = array[3, 3] = 0
+        execute(array, remainder)
+        assert np.count_nonzero(np.logical_and(array, target)) == np.count_nonzero(target) - 1
+        assert not np.any(np.logical_and(array, np.logical_not(target)))
+
+    def test_scan_starts_at_closest_spare(self):
+        # assemble, the only spare atom is 6 sites from the open target site
+        start = np.zeros((10, 10), dtype=bool)
+        start[2:5, 2:5] = True
+        start[0, 0] = True
+        target = np.zeros((10, 10), dtype=bool)
+        target[3:6, 3:6] = True
+        strategy = French(start=Lattice(np.copy(start)), target=Lattice(target), mode="dense", cache=True)
+        strategy.run()
+        replanner = Replanner(strategy, scan=True)
+
+        # act
+        replanner.repair(0, lost=[[2, 2], [3, 3]])
+
+        # assert, pairs closer than the spare atom are skipped
+        n_close = first_pair(strategy.distances, strategy.start_coordinates, strategy.target.coordinates, 6)
+        assert n_close > 0
+        assert replanner.report["scanned-pairs"] <= len(strategy.distances) - n_close
+
+    def test_not_cached(self, states):
+        # assemble
+        start, target = states
+        strategy = French(start=Lattice(np.copy(start)), target=Lattice(target))
+        strategy.run()
+
+        # assert
+        with pytest.raises(AssertionError):
+            Replanner(strategy)
+        bucketed = French(start=Lattice(np.copy(start)), target=Lattice(target), mode="bucketed", cache=True)
+        bucketed.run()
+        with pytest.raises(AssertionError):
+            Replanner(bucketed, scan=True)
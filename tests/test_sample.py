@@ -0,0 +1,116 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from skimage.draw import disk
+from uas.helper import Sample, SampleBatch, random_streams
+
+
+class TestSample:
+    def test_position(self):
+        # act
+        sample = Sample((10, 10))
+        sample.add_position([[1, 2], [3, 4], [1, 2]])
+
+        # assert
+        assert sample.count() == 2
+        assert sample.value[1, 2] and sample.value[3, 4]
+
+    @pytest.mark.parametrize("origin, size", [((2, 3), (4, 5)), ((-2, -1), (4, 4)), ((7, 8), (10, 10)),
+                                              ((-5, 0), (3, 3))])
+    def test_rect(self, origin, size):
+        # assemble
+        reference = np.zeros((10, 12), dtype=bool)
+        for x in range(origin[0], origin[0] + size[0]):
+            for y in range(origin[1], origin[1] + size[1]):
+                if 0 <= x < 10 and 0 <= y < 12:
+                    reference[x, y] = True
+
+        # act
+        sample = Sample((10, 12))
+        sample.add_rect(origin=origin, size=size)
+
+        # assert
+        assert np.array_equal(sample.value, reference)
+
+    def test_disk(self):
+        # act
+        sample = Sample((20, 20))
+        sample.add_disk(origin=(10, 10), radius=4)
+        sample.add_disk(origin=(0, 0), radius=3)
+
+        # assert
+        assert sample.value.dtype == bool
+        assert sample.count() == len(disk((10, 10), 4)[0]) + len(disk((0, 0), 3, shape=(20, 20))[0])
+
+    def test_random_seeded(self):
+        # act
+        first, second, other = Sample((20, 20), rng=1), Sample((20, 20), rng=1), Sample((20, 20), rng=2)
+        for sample in (first, second, other):
+            sample.add_random(0.5)
+
+        # assert
+        assert first == second
+        assert not first == other
+
+    def test_random_probability_map(self):
+        # assemble
+        probability = np.zeros((10, 10))
+        probability[:, :5] = 1
+
+        # act
+        sample = Sample((10, 10), rng=0)
+        sample.add_position([[0, 9]])
+        sample.add_random(probability)
+
+        # assert
+        assert np.all(sample.value[:, :5])
+        assert sample.count() == 51
+        with pytest.raises(AssertionError):
+            sample.add_random(np.zeros((5, 5)))
+
+
+class TestSampleBatch:
+    def test_random(self):
+        # act
+        batch = SampleBatch(8, (20, 20), rng=0)
+        batch.add_random(0.5)
+
+        # assert
+        assert batch.value.shape == (8, 20, 20)
+        assert len(batch) == 8
+        assert batch.count().shape == (8, )
+        assert len({array.tobytes() for array in batch}) == 8
+        assert np.array_equal(batch.value, np.random.default_rng(0).random((8, 20, 20)) < 0.5)
+
+    def test_placement(self):
+        # assemble
+        sample = Sample((15, 15))
+        sample.add_rect(origin=(2, 2), size=(5, 5))
+        sample.add_disk(origin=(10, 10), radius=3)
+        sample.add_position([[0, 14]])
+
+        # act
+        batch = SampleBatch(3, (15, 15))
+        batch.add_rect(origin=(2, 2), size=(5, 5))
+        batch.add_disk(origin=(10, 10), radius=3)
+        batch.add_position([[0, 14]])
+
+        # assert
+        assert all(np.array_equal(array, sample.value) for array in batch)
+        with pytest.raises(TypeError, match="can not be bit packed"):
+            batch.pack()
+        assert not batch.packed
+
+    def test_streams(self):
+        # act
+        batches = [SampleBatch(4, (10, 10), rng=stream) for stream in random_streams(seed=5, n_streams=3)]
+        again = [SampleBatch(4, (10, 10), rng=stream) for stream in random_streams(seed=5, n_streams=3)]
+        for batch in batches + again:
+            batch.add_random(0.5)
+
+        # assert
+        assert all(a == b for a, b in zip(batches, again))
+        assert not batches[0] == batches[1]
@@ -0,0 +1,49 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from uas import Frontend, Scheduler
+from uas.trajectory import count_timeline_rows
+
+
+class TestScheduler:
+    def test_one_tweezer(self, plan):
+        # act
+        serial = Frontend(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan).parse_plan()
+        scheduler = Scheduler(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan, n_tweezers=1)
+        timeline = scheduler.parse_plan()
+
+        # assert
+        assert timeline.shape == (serial.shape[0], 5)
+        assert np.allclose(timeline[:, 0], serial[:, 0])
+        assert np.array_equal(timeline[:, 2:], serial[:, 1:])
+        assert np.all(timeline[:, 1] == 0)
+
+    @pytest.mark.parametrize("n_tweezers", [2, 4, 8])
+    def test_parallel(self, plan, n_tweezers):
+        # assemble
+        spacing = np.array([5e-6, 5e-6], dtype=np.float32)
+        serial = Frontend(spacing=spacing, plan=plan).parse_plan()
+        scheduler = Scheduler(spacing=spacing, plan=plan, n_tweezers=n_tweezers)
+
+        # act
+        timeline = scheduler.parse_plan()
+
+        # assert
+        assert scheduler.completion_time < serial[-1][0]
+        assert set(np.unique(timeline[:, 1])) <= set(range(n_tweezers))
+        rows = count_timeline_rows(plan.origins, plan.targets, plan.discards, False)
+        durations = np.diff(np.concatenate(((0., ), serial[np.cumsum(rows) - 1, 0])))
+        starts = scheduler.starts
+        ends = starts + durations
+        boxes = scheduler.calculate_boxes()
+        # moves which overlap in time neither share a tweezer nor an area
+        for i in range(len(plan)):
+            for j in range(i):
+                if ends[j] <= starts[i] or ends[i] <= starts[j]:
+                    continue
+                assert scheduler.tweezers[i] != scheduler.tweezers[j]
+                assert boxes[j, 1] < boxes[i, 0] or boxes[i, 1] < boxes[j, 0] or \
+                    boxes[j, 3] < boxes[i, 2] or boxes[i, 3] < boxes[j, 2]
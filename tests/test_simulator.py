@@ -28,3 +28,42 @@ class TestSimulator:
         # assemble
         simulator.parse_plan()
         print(simulator.timeline)
+
+    @pytest.mark.parametrize("keyframe_interval", [1, 7, 256])
+    def test_history(self, keyframe_interval):
+        # assemble
+        shape = (15, 15)
+        start_state = Lattice(np.load(f"./data/sample_{shape[0]}_{shape[1]}.npy"))
+        sample = Sample(shape)
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        target_state = Lattice(sample.value)
+        plan, end_state = French(start=deepcopy(start_state), target=target_state).run()
+        simulator = Simulator(lattice=deepcopy(start_state), plan=plan, keyframe_interval=keyframe_interval)
+        # reference: full snapshot after every move
+        lattice = deepcopy(start_state)
+        snapshots = []
+        for step in plan:
+            if step.discard:
+                lattice.discard(step.origin)
+            else:
+                lattice.move(step.origin, step.target)
+            snapshots.append(np.copy(lattice.value))
+
+        # act
+        simulator.parse_plan()
+
+        # assert
+        assert len(simulator.state) == len(plan)
+        assert simulator.lattice == end_state
+        assert simulator.state[-1]["lattice"] == end_state
+        for i, state in enumerate(simulator.state):
+            assert np.array_equal(state["lattice"].value, snapshots[i])
+            assert np.array_equal(simulator.state[i]["lattice"].value, snapshots[i])
+        times = [state["time"] for state in simulator.state]
+        assert np.all(np.diff(times) > 0)
+        # the state before the first step has its own name, negative steps count from the end
+        assert np.array_equal(simulator.state.array_at(None), start_state.value)
+        assert np.array_equal(simulator.state.array_at(-1), snapshots[-1])
+        assert np.array_equal(simulator.state.array_at(-len(plan)), snapshots[0])
+        with pytest.raises(IndexError):
+            simulator.state.array_at(len(plan))
@@ -0,0 +1,75 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from uas import Frontend, Scheduler
+from uas.ordering import MoveOrder
+from uas.storage import Writer, read_header, read_plan, read_timeline, write_plan, write_timeline, open_array
+
+
+class TestStorage:
+    def test_plan(self, plan, tmp_path):
+        # act
+        write_plan(tmp_path / "plan.uas", plan)
+        loaded = read_plan(tmp_path / "plan.uas")
+
+        # assert
+        assert len(loaded) == len(plan)
+        assert np.array_equal(loaded.origins, plan.origins)
+        assert np.array_equal(loaded.targets, plan.targets)
+        assert np.array_equal(loaded.discards, plan.discards)
+        # the loaded plan is replayed and reordered as any other
+        spacing = np.array([5e-6, 5e-6], dtype=np.float32)
+        assert np.array_equal(Frontend(spacing=spacing, plan=loaded).parse_plan(),
+                              Frontend(spacing=spacing, plan=plan).parse_plan())
+        assert len(MoveOrder(loaded).run()) == len(plan)
+
+    @pytest.mark.parametrize("frontend", [Frontend, Scheduler])
+    def test_timeline(self, plan, tmp_path, frontend):
+        # assemble
+        timeline = frontend(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan).parse_plan()
+
+        # act
+        write_timeline(tmp_path / "timeline.uas", timeline)
+        loaded = read_timeline(tmp_path / "timeline.uas")
+
+        # assert
+        assert isinstance(loaded, np.memmap)
+        assert loaded.dtype == np.float32
+        assert np.array_equal(loaded, timeline)
+        with pytest.raises(ValueError):
+            loaded[0, 0] = 1
+
+    def test_chunked(self, plan, tmp_path):
+        # assemble
+        timeline = Frontend(spacing=np.array([5e-6, 5e-6], dtype=np.float32), plan=plan).parse_plan()
+
+        # act
+        with Writer(tmp_path / "timeline.uas") as f:
+            for i in range(0, timeline.shape[0], 100):
+                f.append(timeline[i:i + 100])
+                assert read_header(tmp_path / "timeline.uas")["rows"] == min(i + 100, timeline.shape[0])
+        with Writer(tmp_path / "timeline.uas", append=True) as f:
+            f.append(timeline[:10])
+
+        # assert
+        loaded = read_timeline(tmp_path / "timeline.uas")
+        assert np.array_equal(loaded, np.concatenate((timeline, timeline[:10])))
+
+    def test_invalid(self, plan, tmp_path):
+        # assemble
+        write_plan(tmp_path / "plan.uas", plan)
+        np.save(tmp_path / "array.npy", np.zeros(10))
+        with Writer(tmp_path / "empty.uas", kind="array", columns=3):
+            pass
+
+        # assert
+        with pytest.raises(AssertionError):
+            read_timeline(tmp_path / "plan.uas")
+        with pytest.raises(AssertionError):
+            read_header(tmp_path / "array.npy")
+        with pytest.raises(AssertionError):
+            Writer(tmp_path / "plan.uas", kind="timeline", append=True)
+        assert open_array(tmp_path / "empty.uas").shape == (0, 3)
@@ -1,15 +1,24 @@
 import logging
+import time
+from copy import deepcopy
+from functools import partial
 import pytest
 import numpy as np
 from uas import Lattice
 from uas.helper import Sample
-from uas.strategy import StrategyTemplate, French
+from uas.strategy import StrategyTemplate, French, Hungarian, Tetris
+from uas.strategy.french import swap_chunk, nearest_distances, hilbert_sites
 
 logging.basicConfig(level=logging.INFO)
 
 STRATEGIES = [
-    French
+    French,
+    partial(French, mode="bucketed"),
+    Hungarian,
+    Tetris,
 ]
+# strategies moving every atom at most once, Tetris moves atoms along their row and then their column
+DIRECT_STRATEGIES = [_ for _ in STRATEGIES if _ is not Tetris]
 
 SHAPES = [
     (15, 15),
@@ -37,6 +46,26 @@ class TestStrategy:
         strat = strategy(start=start_state, target=target_state)
         plan, end_state = strat.run()
 
+    @pytest.mark.parametrize("strategy", STRATEGIES)
+    def test_packed_same_plan(self, strategy: StrategyTemplate):
+        # assemble
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        target_state = Lattice(sample.value)
+
+        # act
+        plan, end_state = strategy(start=Lattice(np.copy(start_state.value)), target=target_state).run()
+        packed_plan, packed_end_state = strategy(start=Lattice(np.copy(start_state.value), packed=True),
+                                                 target=Lattice(sample.value, packed=True)).run()
+
+        # assert
+        assert packed_end_state.packed
+        assert packed_end_state == end_state
+        assert np.array_equal(plan.origins, packed_plan.origins)
+        assert np.array_equal(plan.targets, packed_plan.targets)
+        assert np.array_equal(plan.discards, packed_plan.discards)
+
     @pytest.mark.parametrize("strategy", STRATEGIES)
     @pytest.mark.parametrize("shape", SHAPES)
     def test_do_nothing(self, strategy: StrategyTemplate, shape: tuple):
@@ -107,7 +136,7 @@ class TestStrategy:
         assert len(plan) == 2
         assert target_state == end_state
 
-    @pytest.mark.parametrize("strategy", STRATEGIES)
+    @pytest.mark.parametrize("strategy", DIRECT_STRATEGIES)
     @pytest.mark.parametrize("shape", SHAPES)
     def test_two(self, strategy: StrategyTemplate, shape: tuple):
         # assemble
@@ -147,3 +176,276 @@ class TestStrategy:
         # assert
         logging.info(strat.report)
         assert target_state == end_state
+
+
+class TestHungarian:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_optimal(self, seed):
+        # assemble
+        from scipy.optimize import linear_sum_assignment
+        from scipy.spatial.distance import cdist
+        rng = np.random.default_rng(seed)
+        start_state = Lattice(rng.random((20, 20)) < 0.5)
+        target_state = Lattice(rng.random((20, 20)) < 0.3)
+        free_start = Lattice(np.logical_and(start_state.value, np.logical_not(target_state.value)))
+        free_target = Lattice(np.logical_and(target_state.value, np.logical_not(start_state.value)))
+        dist = cdist(free_target.coordinates, free_start.coordinates, "cityblock")
+        row, col = linear_sum_assignment(dist)
+
+        # act
+        strat = Hungarian(start=start_state, target=target_state)
+        plan, end_state = strat.run()
+
+        # assert
+        assert strat.report["path-length"] == dist[row, col].sum()
+        assert target_state == end_state
+
+    def test_not_longer_than_french(self):
+        # assemble
+        from copy import deepcopy
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        target_state = Lattice(sample.value)
+
+        # act
+        french = French(start=deepcopy(start_state), target=target_state)
+        french.run()
+        hungarian = Hungarian(start=deepcopy(start_state), target=target_state)
+        hungarian.run()
+
+        # assert
+        assert hungarian.report["path-length"] <= french.report["path-length"]
+        assert hungarian.report["site-moves"] == french.report["site-moves"]
+
+
+class TestFrench:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    @pytest.mark.parametrize("size", RECT_SIZES)
+    def test_bucketed_same_plan(self, seed, size):
+        # assemble
+        from copy import deepcopy
+        rng = np.random.default_rng(seed)
+        start_state = Lattice(rng.random((20, 20)) < 0.5)
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=size)
+        target_state = Lattice(sample.value)
+
+        # act
+        dense_plan, _ = French(start=deepcopy(start_state), target=target_state).run()
+        bucketed_plan, end_state = French(start=deepcopy(start_state), target=target_state, mode="bucketed").run()
+
+        # assert
+        assert np.array_equal(dense_plan.origins, bucketed_plan.origins)
+        assert np.array_equal(dense_plan.targets, bucketed_plan.targets)
+        assert np.array_equal(dense_plan.discards, bucketed_plan.discards)
+        assert target_state == end_state
+
+    def test_unknown_mode(self):
+        sample = Sample((10, 10))
+        sample.add_position([[5, 5]])
+        with pytest.raises(AssertionError, match=r"^Unknown mode.*"):
+            French(start=Lattice(sample.value), target=Lattice(sample.value), mode="sparse")
+
+    @pytest.mark.parametrize("mode", French.modes)
+    @pytest.mark.parametrize("chunk_size", [1, 7, 256])
+    def test_iter_moves(self, mode, chunk_size):
+        # assemble
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        target_state = Lattice(sample.value)
+        plan, end_state = French(start=Lattice(np.copy(start_state.value)), target=target_state, mode=mode).run()
+        strategy = French(start=Lattice(np.copy(start_state.value)), target=target_state, mode=mode)
+
+        # act
+        moves = list(strategy.iter_moves(chunk_size=chunk_size))
+
+        # assert
+        assert len(moves) == len(plan)
+        assert np.array_equal([m.origin for m in moves], plan.origins)
+        assert np.array_equal([m.target for m in moves], plan.targets)
+        assert np.array_equal([m.discard for m in moves], plan.discards)
+        assert np.array_equal(strategy.plan.origins, plan.origins)
+        assert strategy.current_state == end_state
+        assert strategy.report["path-length"] > 0
+
+    @pytest.mark.parametrize("mode", French.modes)
+    def test_iter_moves_read_coordinates(self, mode):
+        # assemble, coordinates are read and kept incrementally before sorting
+        start_state = Lattice(np.load(f"./data/sample_20_20.npy"))
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(2, 2), size=(10, 10))
+        target_state = Lattice(sample.value)
+        plan, end_state = French(start=Lattice(np.copy(start_state.value)), target=target_state, mode=mode).run()
+        origin = np.copy(start_state.coordinates[0])
+        empty = np.argwhere(np.logical_not(start_state.value))[0]
+        start_state.move(origin, empty)
+        start_state.move(empty, origin)
+        strategy = French(start=start_state, target=target_state, mode=mode)
+
+        # act
+        moves = list(strategy.iter_moves(chunk_size=4))
+
+        # assert
+        assert len(moves) == len(plan)
+        assert strategy.current_state == end_state
+
+    @pytest.mark.parametrize("seed", [0, 1])
+    def test_deadline(self, seed):
+        # assemble
+        rng = np.random.default_rng(seed)
+        start_state = Lattice(rng.random((30, 30)) < 0.5)
+        sample = Sample((30, 30))
+        sample.add_rect(origin=(5, 5), size=(15, 15))
+        target_state = Lattice(sample.value)
+        greedy = French(start=deepcopy(start_state), target=target_state)
+        greedy.run()
+        optimal = Hungarian(start=deepcopy(start_state), target=target_state)
+        optimal.run()
+
+        # act
+        strategy = French(start=deepcopy(start_state), target=target_state)
+        plan, end_state = strategy.run(deadline=time.perf_counter() + 10)
+
+        # assert
+        report = strategy.report
+        assert end_state == target_state
+        assert report["greedy-completed"] and report["converged"]
+        assert report["initial-path-length"] == greedy.report["path-length"]
+        assert report["lower-bound"] <= optimal.report["path-length"] <= report["path-length"] <= \
+            greedy.report["path-length"]
+        assert report["budget-used"] < 1
+        assert np.isclose(report["gap"], report["path-length"] / report["lower-bound"] - 1)
+
+    def test_deadline_passed(self):
+        # assemble
+        start_state = Lattice(np.load(f"./data/sample_100_100.npy"))
+        sample = Sample((100, 100))
+        sample.add_rect(origin=(20, 20), size=(50, 50))
+        target_state = Lattice(sample.value)
+
+        # act, the plan is complete even without any time
+        strategy = French(start=deepcopy(start_state), target=target_state)
+        plan, end_state = strategy.run(deadline=0)
+
+        # assert
+        assert end_state == target_state
+        assert not strategy.report["greedy-completed"]
+        assert strategy.report["swaps"] == 0
+        assert len(plan) == start_state.count() - np.count_nonzero(np.logical_and(start_state.value,
+                                                                                  target_state.value))
+
+    def test_deadline_budget(self):
+        # assemble
+        rng = np.random.default_rng(0)
+        start_state = Lattice(rng.random((200, 200)) < 0.5)
+        sample = Sample((200, 200))
+        sample.add_rect(origin=(50, 50), size=(100, 100))
+        target_state = Lattice(sample.value)
+
+        # act
+        strategy = French(start=start_state, target=target_state)
+        t = time.perf_counter()
+        plan, end_state = strategy.run(deadline=t + 0.2)
+        t_end = time.perf_counter()
+
+        # assert, a complete plan and a report measured up to the applied plan, the budget is generous
+        report = strategy.report
+        assert end_state == target_state
+        assert {"greedy-completed", "initial-path-length", "swaps", "converged", "compute-time", "budget-used",
+                "lower-bound", "gap"} <= set(report)
+        assert report["compute-time"] <= t_end - t < 1
+        assert np.isclose(report["budget-used"], report["compute-time"] / 0.2, rtol=1e-3)
+        assert report["lower-bound"] <= report["path-length"] <= report["initial-path-length"]
+
+    def test_hilbert_sites(self):
+        # act
+        square = hilbert_sites(8, 8)
+        sites = hilbert_sites(5, 7)
+
+        # assert, the curve visits every site once, in steps to neighbours on a square of a power of two
+        assert np.all(np.sum(np.abs(np.diff(square.astype(np.int32), axis=0)), axis=1) == 1)
+        assert sorted(map(tuple, sites.tolist())) == sorted(map(tuple, np.argwhere(np.ones((5, 7))).tolist()))
+
+    def test_swap_chunk(self):
+        # assemble, a random assignment
+        rng = np.random.default_rng(0)
+        sites = rng.permutation(np.argwhere(np.ones((20, 20), dtype=bool)).astype(np.int16))
+        origins, targets, spare = sites[:50].copy(), sites[50:100].copy(), sites[100:150].copy()
+        target_index = np.full((20, 20), -1, dtype=np.int32)
+        target_index[targets[:, 0], targets[:, 1]] = np.arange(50, dtype=np.int32)
+        spare_index = np.full((20, 20), -1, dtype=np.int32)
+        spare_index[spare[:, 0], spare[:, 1]] = np.arange(50, dtype=np.int32)
+        length = np.sum(np.abs(origins.astype(int) - targets))
+
+        # act
+        cursor = np.zeros(3, dtype=np.int64)
+        while not swap_chunk(origins, targets, spare, target_index, spare_index, 3, cursor, 7):
+            pass
+
+        # assert
+        assert cursor[2] > 0
+        assert np.sum(np.abs(origins.astype(int) - targets)) < length
+        assert {tuple(_) for _ in np.concatenate((origins, spare))} == {tuple(_) for _ in sites[np.r_[:50, 100:150]]}
+        assert {tuple(_) for _ in targets} == {tuple(_) for _ in sites[50:100]}
+        assert np.array_equal(target_index[targets[:, 0], targets[:, 1]], np.arange(50))
+        assert np.array_equal(spare_index[spare[:, 0], spare[:, 1]], np.arange(50))
+
+    def test_nearest_distances(self):
+        # assemble
+        sources = np.random.default_rng(0).random((13, 17)) < 0.1
+        grid = np.argwhere(np.ones(sources.shape, dtype=bool))
+
+        # act
+        distances = nearest_distances(sources)
+
+        # assert
+        reference = np.min(np.abs(grid[:, None] - np.argwhere(sources)[None]).sum(axis=2), axis=1)
+        assert np.array_equal(distances.ravel(), reference)
+
+
+class TestTetris:
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    @pytest.mark.parametrize("size", RECT_SIZES)
+    def test_sequential(self, seed, size):
+        # assemble
+        rng = np.random.default_rng(seed)
+        start = rng.random((20, 20)) < 0.5
+        sample = Sample((20, 20))
+        sample.add_rect(origin=(4, 3), size=size)
+
+        # act
+        strat = Tetris(start=Lattice(np.copy(start)), target=Lattice(sample.value))
+        plan, end_state = strat.run()
+
+        # assert, every move fills an empty site along a free row or column, no atom is discarded twice
+        assert strat.report["fallback"] == 0
+        array = np.copy(start)
+        for move in plan:
+            assert array[tuple(move.origin)]
+            array[tuple(move.origin)] = 0
+            if move.discard:
+                continue
+            assert np.count_nonzero(move.origin == move.target) == 1
+            low, high = np.minimum(move.origin, move.target), np.maximum(move.origin, move.target)
+            assert not np.any(array[low[0]:high[0] + 1, low[1]:high[1] + 1])
+            array[tuple(move.target)] = 1
+        assert np.array_equal(array, sample.value)
+        assert end_state == Lattice(sample.value)
+        assert strat.report["discard-moves"] == np.count_nonzero(start) - np.count_nonzero(sample.value)
+
+    def test_fallback(self):
+        # assemble, all atoms in one row cannot fill a column
+        start = np.zeros((10, 10), dtype=bool)
+        start[0, :] = True
+        sample = Sample((10, 10))
+        sample.add_rect(origin=(2, 2), size=(3, 1))
+
+        # act
+        strat = Tetris(start=Lattice(start), target=Lattice(sample.value))
+        plan, end_state = strat.run()
+
+        # assert
+        assert strat.report["fallback"] == 1
+        assert end_state == Lattice(sample.value)
@@ -0,0 +1,81 @@
+"""
+
+"""
+
+import pytest
+import numpy as np
+from copy import deepcopy
+from uas import Lattice, Simulator
+from uas.helper import Sample, export_animation
+from uas.helper.plot import plot_lattice
+from uas.helper.video import frame_steps, render_frame, colormap
+
+
+class FakeWriter:
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    def write(self, frame):
+        self.frames.append(np.copy(frame))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def simulator():
+    start_state = Lattice(np.load(f"./data/sample_15_15.npy"))
+    sample = Sample((15, 15))
+    sample.add_rect(origin=(2, 2), size=(10, 10))
+    from uas.strategy import French
+    plan, end_state = French(start=deepcopy(start_state), target=Lattice(sample.value)).run()
+    simulator = Simulator(lattice=start_state, plan=plan, keyframe_interval=16)
+    simulator.parse_plan()
+    return simulator
+
+
+class TestVideo:
+    def test_frame_steps(self):
+        # assemble
+        times = np.array((10., 20., 25., 60.))
+
+        # act
+        steps = frame_steps(times, frame_interval=10.)
+
+        # assert
+        assert np.array_equal(steps, (-1, 0, 1, 2, 2, 2, 3))
+        assert np.array_equal(frame_steps(times), np.arange(4))
+
+    def test_one_frame_per_step(self, simulator):
+        # act
+        writer = FakeWriter()
+        n_frames = export_animation(simulator.state, writer=writer, n_threads=3)
+
+        # assert
+        assert writer.closed
+        assert n_frames == len(writer.frames) == len(simulator.state)
+        assert all(frame.dtype == np.uint8 and frame.shape[2] == 3 for frame in writer.frames)
+        assert all(frame.shape[0] % 2 == 0 and frame.shape[1] % 2 == 0 for frame in writer.frames)
+        # frames arrive in order
+        lut = colormap()
+        for step in (0, len(simulator.state) // 2, len(simulator.state) - 1):
+            assert np.array_equal(writer.frames[step], render_frame(simulator.state, step, lut))
+
+    def test_decimation(self, simulator):
+        # assemble
+        times = simulator.state.times
+        frame_interval = float(times[-1]) / 10
+
+        # act
+        writer = FakeWriter()
+        n_frames = export_animation(simulator.state, writer=writer, frame_interval=frame_interval, n_threads=2)
+
+        # assert
+        assert n_frames == len(writer.frames) == 11
+        lut = colormap()
+        assert np.array_equal(writer.frames[-1], render_frame(simulator.state, len(simulator.state) - 1, lut))
+        first = plot_lattice(Lattice(simulator.state.keyframes[0].unpack()))
+        assert np.array_equal(writer.frames[0][:first.shape[0], :first.shape[1]],
+                              lut[(np.clip(first, 0, 1) * 255).astype(np.uint8)])
+        assert np.array_equal(writer.frames[0], render_frame(simulator.state, None, lut))